@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy of the single precision assembly (dtype='float32') and of the mixed-precision refinement (refine=True)
+compared to double precision, e.g.
+
+    python benchmarks/accuracy_report.py --output accuracy.json
+
+For every reference case of the regression tests (tests/reference_data, simplewing), the AIC matrices are calculated
+in double precision, in single precision and with refine=True (the explicit Qjj is then inverted in double precision,
+the refinement of a single precision factorization is only used for few downwash vectors, see
+linalg.Factorization) and compared with the stored reference matrices. The maximum absolute error max|Q - Q_ref| and the
+maximum relative error, which is the maximum absolute error relative to the largest entry max|Q_ref|, are listed per
+case. There is no stored reference for the circulation matrices (VLM.calc_Gamma()), they are compared with the result
+in double precision.
+"""
+import argparse
+import json
+import os
+import pickle
+
+import numpy as np
+
+from panelaero import DLM, VLM
+
+REFERENCE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'reference_data')
+
+# (case, reference file, function(aerogrid, dtype, refine) returning the matrix)
+CASES = [('VLM Qjj Ma=0.0', 'simplewing_VLM_Ma00.pickle',
+          lambda aerogrid, dtype, refine: VLM.calc_Qjj(aerogrid, Ma=0.0, dtype=dtype, refine=refine)[0]),
+         ('VLM Qjj Ma=0.3', 'simplewing_VLM_Ma03.pickle',
+          lambda aerogrid, dtype, refine: VLM.calc_Qjj(aerogrid, Ma=0.3, dtype=dtype, refine=refine)[0]),
+         ('VLM Gamma Ma=0.3', None,
+          lambda aerogrid, dtype, refine: None if refine else VLM.calc_Gamma(aerogrid, Ma=0.3, dtype=dtype)[0]),
+         ]
+for Ma, name in [(0.0, 'Ma00'), (0.3, 'Ma03')]:
+    for method, suffix in [('parabolic', ''), ('quartic', '_quartic')]:
+        CASES.append(('DLM Qjj Ma={} k=0.2 {}'.format(Ma, method), 'simplewing_DLM_{}_k02{}.pickle'.format(name, suffix),
+                      lambda aerogrid, dtype, refine, Ma=Ma, method=method:
+                      DLM.calc_Qjj(aerogrid, Ma=Ma, k=0.2, method=method, dtype=dtype, refine=refine)))
+
+# (name, dtype, refine)
+PRECISIONS = [('float64', 'float64', False), ('float32', 'float32', False), ('float32 refine', 'float64', True)]
+
+
+def load(filename):
+    with open(os.path.join(REFERENCE_DATA, filename), 'rb') as fid:
+        return pickle.load(fid)
+
+
+def calc_errors(M, reference):
+    error = np.abs(np.asarray(M, dtype=reference.dtype) - reference).max()
+    return float(error), float(error / np.abs(reference).max())
+
+
+def run():
+    aerogrid = load('simplewing_aerogrid.pickle')
+    results = []
+    for case, filename, function in CASES:
+        reference = None if filename is None else load(filename)
+        if isinstance(reference, tuple):
+            # Qjj and Bjj of the VLM
+            reference = reference[0]
+        for precision, dtype, refine in PRECISIONS:
+            M = function(aerogrid, dtype, refine)
+            if M is None:
+                continue
+            if reference is None:
+                # the result in double precision is the reference
+                reference = M
+            max_abs, max_rel = calc_errors(M, reference)
+            results.append({'case': case, 'precision': precision, 'dtype': M.dtype.name,
+                            'max_abs_error': max_abs, 'max_rel_error': max_rel})
+            print('{:32s} {:15s} {:10s} {:10.2e} {:10.2e}'.format(case, precision, M.dtype.name, max_abs, max_rel))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy of single precision and mixed-precision refinement.')
+    parser.add_argument('--output', help='optional JSON file for the results')
+    args = parser.parse_args()
+    print('{:32s} {:15s} {:10s} {:>10s} {:>10s}'.format('case', 'precision', 'dtype', 'max abs', 'max rel'))
+    results = run()
+    if args.output is not None:
+        with open(args.output, 'w') as fid:
+            json.dump({'numpy': np.__version__, 'results': results}, fid, indent=1)
+        print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare two result files of run_benchmarks.py, e.g. of two commits:
+
+    python benchmarks/compare.py before.json after.json
+
+Prints the ratios after / before of the run time and of the peak memory for all cases found in both files and flags
+the cases which are slower or need more memory than the threshold.
+"""
+import argparse
+import json
+
+
+def load(filename):
+    with open(filename, 'r') as fid:
+        data = json.load(fid)
+    return data['metadata'], {(r['configuration'], r['n'], r['case']): r for r in data['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two result files of run_benchmarks.py.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio above which a case is flagged')
+    args = parser.parse_args()
+    metadata_before, before = load(args.before)
+    metadata_after, after = load(args.after)
+    print('before: commit {}, {}'.format(metadata_before['commit'], metadata_before['date']))
+    print('after:  commit {}, {}'.format(metadata_after['commit'], metadata_after['date']))
+    print('{:10s} {:>6s}  {:35s} {:>8s} {:>8s}'.format('', 'n', 'case', 'time', 'memory'))
+    n_flagged = 0
+    for key in sorted(set(before) & set(after)):
+        time_ratio = after[key]['time'] / max(before[key]['time'], 1e-12)
+        memory_ratio = after[key]['peak_memory'] / max(before[key]['peak_memory'], 1)
+        flagged = time_ratio > args.threshold or memory_ratio > args.threshold
+        n_flagged += flagged
+        print('{:10s} {:6d}  {:35s} {:8.2f} {:8.2f} {}'.format(*key, time_ratio, memory_ratio, '<--' if flagged else ''))
+    print('{} of {} cases above the threshold {}'.format(n_flagged, len(set(before) & set(after)), args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic aerogrids for the benchmarks, see build_aerogrid(). The configurations are built from CAERO1-like cards with
+the reader of the package (caero.build_panels() and caero.calc_aerogrid()), all panels are defined from left to right:
+- wing: planar, swept and tapered wing
+- dihedral: the wing with 5 deg dihedral
+- winglet: the wing with vertical winglets at both tips
+- ttail: the wing with a vertical tail and a horizontal tail on top of the vertical tail (T-tail)
+"""
+import numpy as np
+
+from panelaero import caero
+
+CONFIGURATIONS = ['wing', 'dihedral', 'winglet', 'ttail']
+
+# Wing: half span, root chord, tip chord, sweep of the leading edge (x offset at the tip)
+SPAN = 10.0
+ROOT_CHORD = 3.0
+TIP_CHORD = 1.2
+SWEEP = 3.0
+
+
+def build_aerogrid(configuration, n):
+    # The aerogrid of the configuration with approximately n panels.
+    surfaces = calc_surfaces(configuration)
+    area = sum(surface['area'] for surface in surfaces)
+    cards = []
+    for i, surface in enumerate(surfaces):
+        # boxes of approximately equal size and aspect ratio on all surfaces
+        n_surface = n * surface['area'] / area
+        span = np.linalg.norm(surface['X4'] - surface['X1'])
+        chord = 0.5 * (surface['length12'] + surface['length43'])
+        n_span = max(1, int(round((n_surface * span / chord) ** 0.5)))
+        n_chord = max(1, int(round(n_surface / n_span)))
+        cards.append({'EID': 1000000 * (i + 1), 'CP': 0, 'n_span': n_span, 'n_chord': n_chord,
+                      'X1': surface['X1'], 'X4': surface['X4'],
+                      'length12': surface['length12'], 'length43': surface['length43']})
+    grids, panels = caero.build_panels(cards)
+    return caero.calc_aerogrid(grids, panels)
+
+
+def calc_surfaces(configuration):
+    # The trapezoidal surfaces (X1, X4, length12, length43 like the CAERO1 card) of the configuration.
+    if configuration not in CONFIGURATIONS:
+        raise ValueError('Unknown configuration {}, use one of {}.'.format(configuration, CONFIGURATIONS))
+    z_tip = SPAN * np.tan(np.radians(5.0)) if configuration == 'dihedral' else 0.0
+    left_tip = np.array([SWEEP, -SPAN, z_tip])
+    root = np.array([0.0, 0.0, 0.0])
+    right_tip = np.array([SWEEP, SPAN, z_tip])
+    surfaces = [surface(left_tip, root, TIP_CHORD, ROOT_CHORD),
+                surface(root, right_tip, ROOT_CHORD, TIP_CHORD)]
+    if configuration == 'winglet':
+        height = 0.15 * SPAN
+        offset = np.array([0.3, 0.0, height])
+        surfaces += [surface(left_tip + offset, left_tip, 0.6 * TIP_CHORD, TIP_CHORD),
+                     surface(right_tip, right_tip + offset, TIP_CHORD, 0.6 * TIP_CHORD)]
+    elif configuration == 'ttail':
+        # vertical tail from the fuselage to the horizontal tail
+        fin_root = np.array([2.5 * SPAN, 0.0, 0.0])
+        fin_tip = np.array([2.5 * SPAN + 1.5, 0.0, 0.3 * SPAN])
+        surfaces += [surface(fin_root, fin_tip, 0.3 * SPAN, 0.15 * SPAN),
+                     surface(fin_tip + [0.0, -0.35 * SPAN, 0.0], fin_tip, 0.1 * SPAN, 0.15 * SPAN),
+                     surface(fin_tip, fin_tip + [0.0, 0.35 * SPAN, 0.0], 0.15 * SPAN, 0.1 * SPAN)]
+    return surfaces
+
+
+def surface(X1, X4, length12, length43):
+    span = np.linalg.norm((X4 - X1)[1:])
+    return {'X1': np.asarray(X1, dtype=float), 'X4': np.asarray(X4, dtype=float),
+            'length12': length12, 'length43': length43, 'area': 0.5 * (length12 + length43) * span}
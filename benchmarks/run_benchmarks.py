@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the VLM and the DLM on synthetic aerogrids (see geometry.py), e.g.
+
+    python benchmarks/run_benchmarks.py --sizes 100 1000 5000 --output results.json
+
+For every configuration and size, the run time (best of --repeat runs) and the peak memory (allocations traced with
+tracemalloc, which includes the numpy arrays, in a separate run) of the following cases are measured:
+- VLM.calc_induced_velocities(), VLM.calc_Qjj() and VLM.calc_Qjjs() (three Mach numbers)
+- DLM.calc_Ajj() with the parabolic and the quartic method
+- the approximations of the integrals of the kernel function for n x n points (limited to MAX_INTEGRAL_POINTS)
+- the inversion of Ajj (linalg.invert()), assembled before the measurement
+Memory allocated inside the compiled functions of the Numba backend is not traced, only the arrays returned to Python.
+The results are written as JSON, use compare.py to compare two result files, e.g. of two commits.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+import geometry
+from panelaero import DLM, VLM, linalg
+
+MA = 0.3
+K = 0.2
+# Maximum number of points for the integral approximations
+MAX_INTEGRAL_POINTS = 2 ** 22
+
+
+def measure(function, repeat):
+    # Best run time of function() in seconds and peak memory in bytes. The run for the memory comes first and
+    # includes the compilation of the Numba functions, if any.
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times), peak
+
+
+def benchmark_cases(aerogrid):
+    # Yields (case, function) for the aerogrid
+    yield 'VLM.calc_induced_velocities', lambda: VLM.calc_induced_velocities(aerogrid, MA)
+    yield 'VLM.calc_Qjj', lambda: VLM.calc_Qjj(aerogrid, MA)
+    yield 'VLM.calc_Qjjs', lambda: VLM.calc_Qjjs(aerogrid, [0.0, MA, 0.7])
+    for method in ['parabolic', 'quartic']:
+        yield 'DLM.calc_Ajj {}'.format(method), lambda method=method: DLM.calc_Ajj(aerogrid, MA, K, method=method)
+    rng = np.random.default_rng(0)
+    size = min(aerogrid['n'] ** 2, MAX_INTEGRAL_POINTS)
+    u1 = rng.random(size) ** 3.0 * 60.0
+    k1 = rng.random(size) ** 2.0 * 60.0
+    for name in ['laschka', 'desmarais', 'watkins', 'tabulated']:
+        approximation = getattr(DLM, name + '_approximation')
+        if name == 'tabulated':
+            # the table is calculated once per process, which is not part of the benchmark
+            approximation(u1[:1], k1[:1])
+        yield 'DLM.{}_approximation'.format(name), lambda approximation=approximation: approximation(u1, k1)
+    Ajj = next(DLM.calc_Ajjs(aerogrid, [MA], [K]))[2]
+    yield 'linalg.invert', lambda: linalg.invert(Ajj)
+
+
+def run(configurations, sizes, repeat):
+    results = []
+    for configuration in configurations:
+        for size in sizes:
+            aerogrid = geometry.build_aerogrid(configuration, size)
+            for case, function in benchmark_cases(aerogrid):
+                run_time, peak_memory = measure(function, repeat)
+                results.append({'configuration': configuration, 'n': aerogrid['n'], 'case': case,
+                                'time': run_time, 'peak_memory': peak_memory})
+                print('{:10s} n = {:6d}  {:35s} {:10.4f} s {:10.1f} MB'.format(
+                    configuration, aerogrid['n'], case, run_time, peak_memory / 1e6))
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit,
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'DLM backend': DLM.BACKEND,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the VLM and the DLM on synthetic aerogrids.')
+    parser.add_argument('--configurations', nargs='+', default=geometry.CONFIGURATIONS,
+                        choices=geometry.CONFIGURATIONS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 500, 2000],
+                        help='approximate numbers of panels, up to about 20000 (each dense complex n x n matrix '
+                             'needs 6.4 GB for n = 20000)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs for the timing')
+    parser.add_argument('--backend', choices=['numpy', 'numba'], help='DLM backend, see DLM.BACKEND (default numpy)')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file for the results')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.backend is not None:
+        DLM.BACKEND = DLM.select_backend(args.backend)
+    results = {'metadata': metadata(), 'results': run(args.configurations, args.sizes, args.repeat)}
+    with open(args.output, 'w') as fid:
+        json.dump(results, fid, indent=1)
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,336 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import copy
+import collections
+import functools
 import logging
 import numpy as np
 
-from panelaero import VLM
+from panelaero import VLM, grid, jit, linalg, parallel
 
 # turn off warnings (divide by zero, multiply NaN, ...) as singularities are expected to occur
 np.seterr(all='ignore')
 
+# Number of elements (points along the bound vortex x frequencies x receiving x sending boxes) for which the kernel
+# function is evaluated at once. The evaluation involves many element-wise operations on temporary arrays, which is
+# considerably faster when these arrays fit into the cache, see calc_Drs().
+KERNEL_BLOCK_SIZE = 2 ** 14
 
-def calc_Qjj(aerogrid, Ma, k, method='parabolic'):
+# Tabulated integrals I1,2 of the Desmarais approximation, see integral_table(). The table covers
+# 0 <= u1 <= u1_max and 0 <= k1 <= k1_max, outside of this domain, the Desmarais approximation is evaluated.
+TABULATED_TOLERANCE = 1e-5
+TABULATED_DOMAIN = (50.0, 50.0)  # u1_max, k1_max
+TABULATED_SCALE = (4.0, 1.0)  # c_u, c_k, see integral_table()
+# The table is calculated only once per process.
+INTEGRAL_TABLE = {}
+
+# The normalwash matrices of calc_Ajj() are calculated with the numpy implementation, which is the reference. The
+# compiled backend in jit.py requires Numba and is selected with backend='numba' or by setting BACKEND to 'numba'.
+BACKEND = 'numpy'
+
+# Iterative solution of sweeps, see solve_Qjjs_iterative(): the preconditioner is re-factorized at the next point
+# when more than REFACTORIZE_ITERATIONS GMRES iterations were needed, the initial guess is projected onto the
+# solutions of the last RECYCLE_POINTS points (warm start).
+REFACTORIZE_ITERATIONS = 20
+RECYCLE_POINTS = 8
+
+
+def calc_Qjj(aerogrid, Ma, k, method='parabolic', xz_symmetry=False, dtype='float64', refine=False, n_threads=None,
+             backend=None):
+    # xz_symmetry = optional, False, True / 'symmetric' or 'antisymmetric', see VLM.calc_Qjj()
+    # dtype, refine = optional, single precision assembly and mixed-precision refinement, see VLM.calc_Qjj()
+    # n_threads = optional, the matrices are assembled on a pool of threads, see calc_Ajj()
+    # backend = optional, 'numpy' or 'numba', see calc_Ajj()
     # calc steady contributions using VLM
-    Ajj_VLM, _ = VLM.calc_Ajj(aerogrid=copy.deepcopy(aerogrid), Ma=Ma)
+    Ajj_VLM, _ = VLM.calc_Ajj(aerogrid=aerogrid, Ma=Ma, xz_symmetry=xz_symmetry, dtype=dtype,
+                              n_threads=n_threads)
     if k == 0.0:
         # no oscillatory / unsteady contributions at k=0.0
-        Ajj_DLM = np.zeros((aerogrid['n'], aerogrid['n']))
+        Ajj_DLM = np.zeros((aerogrid['n'], aerogrid['n']), dtype=dtype)
     else:
         # calc oscillatory / unsteady contributions using DLM
-        Ajj_DLM = calc_Ajj(aerogrid=copy.deepcopy(aerogrid), Ma=Ma, k=k, method=method)
+        Ajj_DLM = calc_Ajj(aerogrid=aerogrid, Ma=Ma, k=k, method=method, xz_symmetry=xz_symmetry,
+                           dtype=dtype, backend=backend, n_threads=n_threads)
     Ajj = Ajj_VLM + Ajj_DLM
-    Qjj = -np.linalg.inv(Ajj)
+    Qjj = linalg.invert(Ajj, refine)
     return Qjj
 
 
-def calc_Qjjs(aerogrid, Ma, k, xz_symmetry=False):
-    # allocate memory
-    Qjj = np.zeros((len(Ma), len(k), aerogrid['n'], aerogrid['n']), dtype='complex')  # dim: Ma,k,n,n
-    # Consideration of XZ symmetry like in VLM.
-    if xz_symmetry:
-        n = aerogrid['n']
-        aerogrid = VLM.mirror_aerogrid_xz(aerogrid)
+def calc_Ajj_block(aerogrid, Ma, k, rows, cols, method='parabolic', xz_symmetry=False, dtype='float64', backend=None):
+    # The block Ajj[rows][:, cols] of the AIC matrix (steady VLM plus DLM part, see calc_Ajjs()) for the index
+    # arrays rows and cols, without assembling the whole matrix.
+    Ajj_VLM, _ = VLM.calc_Ajj_block(aerogrid, Ma, rows, cols, xz_symmetry, dtype)
+    Ajj = Ajj_VLM.astype(np.result_type(Ajj_VLM, 'complex64'))
+    if k == 0.0:
+        return Ajj
+    receiving = VLM.select_panels(aerogrid, rows)
+    sending = VLM.select_panels(aerogrid, cols)
+    Ajj += calc_Drs_panels(receiving, sending, Ma, k, method, dtype, backend)
+    sign = VLM.symmetry_sign(xz_symmetry)
+    if sign is not None:
+        Ajj += sign * calc_Drs_panels(receiving, VLM.mirror_xz(sending), Ma, k, method, dtype, backend)
+    return Ajj
+
+
+def calc_Drs_panels(aerogrid, sending, Ma, k, method='parabolic', dtype='float64', backend=None):
+    # The normalwash matrix of calc_Ajj() for the receiving points of the aerogrid and the sending boxes of a second
+    # grid with the selected backend.
+    if select_backend(backend, method) == 'numba':
+        check_backend_dtype(dtype)
+        return jit.calc_Drs(aerogrid, sending, Ma, k, method, dtype)
+    return calc_Drs(calc_geometry_panels(aerogrid, sending, method, dtype), float(Ma), k, method)
+
+
+def update_Qjj(aerogrid, previous_aerogrid, Ma, k, panels, Qjj, method='parabolic', xz_symmetry=False, dtype='float64'):
+    # Update Qjj of calc_Qjj() for the previous_aerogrid after the panels (index array or boolean mask) were
+    # modified, only the rows and columns of the modified panels are calculated, see VLM.update_Qjj().
+    U, V = calc_Ajj_update(aerogrid, previous_aerogrid, Ma, k, panels, method, xz_symmetry, dtype)
+    return linalg.update_inverse(Qjj, U, V)
+
+
+def update_Qjj_factorization(aerogrid, previous_aerogrid, Ma, k, panels, factorization, method='parabolic',
+                             xz_symmetry=False, dtype='float64'):
+    # Same as update_Qjj() for the result of calc_Qjj_factorization(), see linalg.Factorization.update().
+    U, V = calc_Ajj_update(aerogrid, previous_aerogrid, Ma, k, panels, method, xz_symmetry, dtype)
+    return factorization.update(U, V)
+
+
+def calc_Ajj_update(aerogrid, previous_aerogrid, Ma, k, panels, method='parabolic', xz_symmetry=False, dtype='float64'):
+    # The change of Ajj as low rank update Ajj + U.dot(V), see VLM.calc_Ajj_update().
+    everything = np.arange(aerogrid['n'])
+    panels = everything[panels]
+    delta = [calc_Ajj_block(aerogrid, Ma, k, rows, cols, method, xz_symmetry, dtype)
+             - calc_Ajj_block(previous_aerogrid, Ma, k, rows, cols, method, xz_symmetry, dtype)
+             for rows, cols in [(panels, everything), (everything, panels)]]
+    return linalg.low_rank_update(panels, *delta)
+
+
+def calc_Qjjs(aerogrid, Ma, k, xz_symmetry=False, method='parabolic', n_workers=None, cache=None, out=None,
+              dtype='float64', refine=False, n_threads=None, backend=None):
+    # xz_symmetry = optional, False, True / 'symmetric' or 'antisymmetric', the AIC matrices are assembled
+    #               directly for the right hand side like in the VLM, see VLM.calc_Qjj()
+    # n_workers = optional number of worker processes, the points of the Ma x k grid are then distributed to
+    #             a process pool, see parallel.run()
+    # cache = optional cache.AICCache, the results are read from the cache if available and stored otherwise
+    # out = optional caller-supplied target (dim: Ma,k,n,n) for the results, e.g. a numpy.memmap or a chunked dataset,
+    #       each matrix is written and flushed as soon as it is computed, see VLM.write_result(), with n_workers, a
+    #       numpy.memmap is written by the worker processes directly
+    # dtype, refine = optional, single precision assembly and mixed-precision refinement, see VLM.calc_Qjj()
+    # n_threads = optional, the matrices of one point are assembled on a pool of threads (without n_workers)
+    # backend = optional, 'numpy' or 'numba', see calc_Ajj()
+    if cache is not None:
+        key = cache.key('DLM.calc_Qjjs', aerogrid, Ma=Ma, k=k, xz_symmetry=VLM.symmetry_sign(xz_symmetry),
+                        method=method, dtype=np.dtype(dtype).name, refine=refine,
+                        backend=select_backend(backend, method))
+        Qjj = cache.load(key)
+        if Qjj is None:
+            Qjj = calc_Qjjs(aerogrid, Ma, k, xz_symmetry, method, n_workers, out=out, dtype=dtype, refine=refine,
+                            n_threads=n_threads, backend=backend)
+            cache.store(key, [Qjj])
+            return Qjj
+        return VLM.write_results(Qjj, None if out is None else [out])[0]
+
+    n = aerogrid['n']
+    # complex counterpart of the dtype, with refinement, Qjj is returned in double precision
+    dtype_Qjj = np.result_type(dtype, 'complex128' if refine else 'complex64')
+    if n_workers is not None and n_workers > 1:
+        items = [(im, ik) for im in range(len(Ma)) for ik in range(len(k))]
+        parameters = {'Ma': list(Ma), 'k': list(k), 'xz_symmetry': xz_symmetry, 'method': method, 'dtype': dtype,
+                      'refine': refine, 'backend': select_backend(backend, method)}
+        Qjj = parallel.run(calc_Qjjs_task, items, aerogrid, [((len(Ma), len(k), n, n), dtype_Qjj, out)],
+                           n_workers, parameters)
+        return VLM.write_results(Qjj, None if out is None else [out])[0]
+
+    if out is None:
+        # allocate memory
+        Qjj = np.zeros((len(Ma), len(k), n, n), dtype=dtype_Qjj)  # dim: Ma,k,n,n
+    else:
+        Qjj = out
+    # When writing to an external target, the frequencies are evaluated one by one to keep the peak memory low.
+    for im, ik, Ajj in calc_Ajjs(aerogrid, Ma, k, method, xz_symmetry, batched=out is None, dtype=dtype,
+                                 n_threads=n_threads, backend=backend):
+        VLM.write_result(Qjj, (im, ik), solve_Qjj(Ajj, refine))
+        # release Ajj before the next one is assembled
+        del Ajj
+    return Qjj
+
+
+def iter_Qjjs(aerogrid, Ma, k, xz_symmetry=False, method='parabolic', dtype='float64', refine=False, n_threads=None,
+              backend=None):
+    # Generator variant of calc_Qjjs(), yields (Ma, k, Qjj) for one point of the Ma x k grid after the other, so
+    # that each matrix can be processed or written and then dropped instead of allocating the whole 4-D array.
+    # To keep the peak memory low, the frequencies are evaluated one by one without storing the geometry.
+    # n_threads = optional, the matrices of one point are assembled on a pool of threads, see calc_Ajj()
+    for im, ik, Ajj in calc_Ajjs(aerogrid, Ma, k, method, xz_symmetry, batched=False, dtype=dtype,
+                                 n_threads=n_threads, backend=backend):
+        yield Ma[im], k[ik], solve_Qjj(Ajj, refine)
+
+
+def calc_Ajjs(aerogrid, Ma, k, method='parabolic', xz_symmetry=False, batched=True, dtype='float64', n_threads=None,
+              backend=None):
+    # Yields (im, ik, Ajj) for all points of the Ma x k grid.
+    # batched = evaluate all frequencies of one Mach number in one pass (faster, but the DLM contributions of all
+    #           frequencies are kept in memory) or one frequency after the other
+    # The geometry is independent from the Mach number and the frequency and is calculated only once. When the
+    # frequencies are evaluated one after the other, the n x n arrays of the geometry are not stored but calculated
+    # per block of rows, like VLM.calc_Qjjs() with max_memory, so that the peak memory is about one Ajj.
+    # backend = optional, 'numpy' or 'numba', the compiled backend calculates the geometry on the fly, see calc_Ajj()
+    backend = select_backend(backend, method)
+    geometry_VLM = VLM.calc_geometry(aerogrid, xz_symmetry, dtype) if batched else None
+    geometry_DLM = calc_geometry(aerogrid, method, xz_symmetry, dtype, blockwise=not batched) \
+        if backend == 'numpy' else None
 
     # loop over mach number and freq.
     for im, Ma_i in enumerate(Ma):
         # calc steady contributions using VLM
-        Ajj_VLM, _ = VLM.calc_Ajj(aerogrid=copy.deepcopy(aerogrid), Ma=Ma_i)
+        Ajj_VLM, _ = VLM.calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, geometry=geometry_VLM, xz_symmetry=xz_symmetry,
+                                  dtype=dtype, n_threads=n_threads)
+        # calc oscillatory / unsteady contributions using DLM, all frequencies are evaluated in one pass
+        k_unsteady = [k_i for k_i in k if k_i != 0.0]
+        if batched and k_unsteady:
+            Ajj_DLM = dict(zip(k_unsteady, calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, k=np.array(k_unsteady), method=method,
+                                                    geometry=geometry_DLM, xz_symmetry=xz_symmetry, dtype=dtype,
+                                                    backend=backend, n_threads=n_threads)))
         for ik, k_i in enumerate(k):
             if k_i == 0.0:
-                # no oscillatory / unsteady contributions at k=0.0
-                Ajj_DLM = np.zeros((aerogrid['n'], aerogrid['n']))
+                # no oscillatory / unsteady contributions at k=0.0, the Ajj_VLM is copied as it is re-used
+                yield im, ik, Ajj_VLM.astype(np.result_type(Ajj_VLM, 'complex64'))
+            elif batched:
+                yield im, ik, Ajj_VLM + Ajj_DLM[k_i]
             else:
-                # calc oscillatory / unsteady contributions using DLM
-                Ajj_DLM = calc_Ajj(aerogrid=copy.deepcopy(aerogrid), Ma=Ma_i, k=k_i, method='parabolic')
-            Ajj = Ajj_VLM + Ajj_DLM
-            Ajj_inv = -np.linalg.inv(Ajj)
-            if xz_symmetry:
-                Qjj[im, ik] = Ajj_inv[0:n, 0:n] - Ajj_inv[n:2 * n, 0:n]
-            else:
-                Qjj[im, ik] = Ajj_inv
-    return Qjj
+                yield im, ik, Ajj_VLM + calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, k=k_i, method=method, geometry=geometry_DLM,
+                                                 xz_symmetry=xz_symmetry, dtype=dtype, backend=backend,
+                                                 n_threads=n_threads)
 
 
-def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
-    # Calculates one unsteady AIC matrix (Qjj = -Ajj^-1) at given Mach number and frequency
+def calc_Qjj_factorization(aerogrid, Ma, k, method='parabolic', xz_symmetry=False, dtype='float64', refine=False):
+    # Same as calc_Qjj(), but returns a factorization of Ajj, see linalg.Factorization.
+    # Use factorization.solve(wj) to apply Qjj to downwash vectors, factorization.Qjj forms the full matrix.
+    Ajj = next(calc_Ajjs(aerogrid, [Ma], [k], method, xz_symmetry, dtype=dtype))[2]
+    return linalg.Factorization(Ajj, overwrite=True, refine=refine)
+
+
+def solve_Qjjs(aerogrid, Ma, k, wj, xz_symmetry=False, method='parabolic', dtype='float64', refine=False):
+    # Sweep over Mach numbers and frequencies like calc_Qjjs(), but instead of the full Qjj matrices, only
+    # the pressure coefficients Qjj.dot(wj) for the downwash wj (n x m, one downwash per column) are returned.
+    wj = np.asarray(wj)
+    cp = np.zeros((len(Ma), len(k)) + wj.shape, dtype='complex')  # dim: Ma,k,n,m
+    for im, ik, Ajj in calc_Ajjs(aerogrid, Ma, k, method, xz_symmetry, dtype=dtype):
+        cp[im, ik] = linalg.Factorization(Ajj, overwrite=True, refine=refine).solve(wj)
+    return cp
+
+
+def calc_Qhhs(aerogrid, Ma, k, left, right, xz_symmetry=False, method='parabolic', dtype='float64', refine=False):
+    """
+    Sweep over Mach numbers and frequencies like calc_Qjjs(), but only the generalized aerodynamic forces
+    Qhh = left.dot(Qjj).dot(right) are returned (dim: Ma,k,m,m), e.g. with left = PHIjh.T.dot(Sjk) and
+    right = Djk.dot(PHIjh). Qjj is never formed, the modal downwash right is solved for with a factorization of Ajj,
+    the frequencies are evaluated one by one. The memory is then independent of the number of points of the sweep.
+    left = matrix (m_left x n)
+    right = matrix (n x m_right) or a function right(k), which returns the (frequency dependent) downwash for the
+            reduced frequency k, e.g. Djk1 + 1j * k * Djk2
+    """
+    left = np.asarray(left)
+    m_right = (right(k[0]) if callable(right) else np.asarray(right)).shape[1]
+    Qhh = np.zeros((len(Ma), len(k), left.shape[0], m_right), dtype='complex')  # dim: Ma,k,m,m
+    for im, ik, Ajj in calc_Ajjs(aerogrid, Ma, k, method, xz_symmetry, batched=False, dtype=dtype):
+        wj = right(k[ik]) if callable(right) else right
+        Qhh[im, ik] = left.dot(linalg.Factorization(Ajj, overwrite=True, refine=refine).solve(wj))
+    return Qhh
+
+
+def solve_Qjjs_iterative(aerogrid, Ma, k, wj, xz_symmetry=False, method='parabolic', dtype='float64', tolerance=1e-8,
+                         recycle_points=RECYCLE_POINTS):
+    """
+    Same as solve_Qjjs(), but the systems are solved with GMRES (linalg.gmres) instead of a new LU factorization
+    for every point of the sweep. This is much faster for sweeps over many frequencies, as neighbouring points have
+    similar Ajj:
+    - The LU factorization of Ajj at the first frequency of each Mach number (the steady VLM part for k=0.0) is
+      used as preconditioner, it is only re-factorized when the number of iterations exceeds REFACTORIZE_ITERATIONS.
+    - Warm start: the initial guess is the projection with the minimum residual onto the solutions of the previous
+      points (recycle_points, see linalg.recycled_guess()), which includes the solution at the previous frequency.
+      Only the initial guess is improved, the Krylov subspaces are not carried over (no deflation).
+    tolerance = relative residual of the solutions
+    Returns the pressure coefficients cp (dim: Ma,k,n,m) and a dictionary with the numbers of GMRES iterations and
+    the relative residuals (dim: Ma,k,m).
+    """
+    wj = np.asarray(wj)
+    cp = np.zeros((len(Ma), len(k)) + wj.shape, dtype='complex')  # dim: Ma,k,n,m
+    info = {'iterations': np.zeros((len(Ma), len(k)) + wj.shape[1:], dtype=int),
+            'residuals': np.zeros((len(Ma), len(k)) + wj.shape[1:])}
+    factorization = None
+    # only the solutions of the last recycle_points points are kept
+    solutions = collections.deque(maxlen=recycle_points)
+    for im, ik, Ajj in calc_Ajjs(aerogrid, Ma, k, method, xz_symmetry, dtype=dtype):
+        if ik == 0 or factorization is None:
+            factorization = linalg.Factorization(Ajj)
+        recycle = np.hstack(solutions) if solutions else None
+        x, info_i = linalg.gmres(Ajj.dot, wj, tol=tolerance, preconditioner=factorization.solve_Ajj,
+                                 recycle=recycle)
+        cp[im, ik] = -x
+        info['iterations'][im, ik] = np.reshape(info_i['iterations'], wj.shape[1:])
+        info['residuals'][im, ik] = np.reshape(info_i['residuals'], wj.shape[1:])
+        logging.info('Ma = {}, k = {}: {} GMRES iterations, relative residual {:.2e}'.format(
+            Ma[im], k[ik], np.max(info_i['iterations']), np.max(info_i['residuals'])))
+        if np.max(info_i['iterations']) > REFACTORIZE_ITERATIONS:
+            factorization = None
+        solutions.append(x.reshape(x.shape[0], -1))
+    return cp, info
+
+
+def solve_Qjj(Ajj, refine=False):
+    return linalg.invert(Ajj, refine)
+
+
+def calc_Qjjs_task(state, item):
+    # Calculates one point (Ma, k) of calc_Qjjs() on a worker process and writes the result to the shared output.
+    im, ik = item
+    aerogrid = state['aerogrid']
+    parameters = state['parameters']
+    cache = state['cache']
+    Ma_i = parameters['Ma'][im]
+    k_i = parameters['k'][ik]
+    xz_symmetry = parameters['xz_symmetry']
+    dtype = parameters['dtype']
+    # The geometry is calculated only once per worker, the steady contributions only once per Mach number.
+    if 'geometry_DLM' not in cache:
+        cache['geometry_VLM'] = VLM.calc_geometry(aerogrid, xz_symmetry, dtype)
+        cache['geometry_DLM'] = calc_geometry(aerogrid, parameters['method'], xz_symmetry, dtype) \
+            if parameters['backend'] == 'numpy' else None
+    if cache.get('Ma') != Ma_i:
+        cache['Ajj_VLM'], _ = VLM.calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, geometry=cache['geometry_VLM'],
+                                           xz_symmetry=xz_symmetry, dtype=dtype)
+        cache['Ma'] = Ma_i
+    if k_i == 0.0:
+        # no oscillatory / unsteady contributions at k=0.0
+        Ajj = cache['Ajj_VLM']
+    else:
+        Ajj = cache['Ajj_VLM'] + calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, k=k_i, method=parameters['method'],
+                                          geometry=cache['geometry_DLM'], xz_symmetry=xz_symmetry, dtype=dtype,
+                                          backend=parameters['backend'])
+    VLM.write_result(state['outputs'][0], (im, ik), solve_Qjj(Ajj, parameters['refine']))
+
+
+def calc_geometry(aerogrid, method='parabolic', xz_symmetry=False, dtype='float64', blockwise=False):
+    # Calculates the quantities of calc_Ajj() which depend only on the geometry, but not on the Mach number and
+    # frequency, so that they can be re-used for all Ma and k. Four n x n arrays are stored, see calc_geometry_panels().
+    # With xz_symmetry, the same quantities for the mirrored sending panels are stored in addition.
+    # dtype = optional, 'float32' to evaluate the kernel in single precision
+    # blockwise = optional, only the quantities per box are stored and the n x n arrays are calculated per block of
+    #             receiving boxes for every evaluation, e.g. to keep the peak memory low
+    geometry = calc_geometry_panels(aerogrid, aerogrid, method, dtype, blockwise)
+    if VLM.symmetry_sign(xz_symmetry) is not None:
+        geometry['mirror'] = calc_geometry_panels(aerogrid, VLM.mirror_xz(aerogrid), method, dtype, blockwise)
+    return geometry
+
+
+def calc_geometry_panels(aerogrid, sending, method='parabolic', dtype='float64', blockwise=False):
+    # Same as calc_geometry() for the receiving points of the aerogrid and the sending boxes of a second grid.
+    # Only the coordinates of the receiving points relative to the sending boxes are stored as n x n arrays (see
+    # calc_coordinates()), the quantities of the sending boxes (e, tanLambda, chord, ...) are stored per box (1-D)
+    # and broadcast along the receiving points. All other terms are derived per block of receiving boxes in
+    # calc_geometry_block(). With blockwise, the relative coordinates are also calculated per block, see
+    # slice_geometry().
     #
     #                   l_2
     #             4 o---------o 3
@@ -66,42 +342,72 @@ def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
     #         |
     #        z.--- x
     #
-    # M = Mach number
-    # k = omega/U, the "classical" definition, not Nastran definition!
     # Nomencalture with receiving (r), minus (-e), plus (e), sending (s/0) point and semiwidth e following Rodden 1968
-    Pr = aerogrid['offset_j']  # receiving (r)
-    Pm = aerogrid['offset_P1']  # minus (-e)
-    Pp = aerogrid['offset_P3']  # plus (e)
-    Ps = aerogrid['offset_l']  # sending (s/0)
-    e = np.absolute(np.repeat(np.array(0.5 * ((Pp[:, 2] - Pm[:, 2]) ** 2.0 + (Pp[:, 1] - Pm[:, 1]) ** 2.0) ** 0.5, ndmin=2),
-                              aerogrid['n'], axis=0))  # semiwidth
-    e2 = e ** 2.0
-    e3 = e ** 3.0
-    e4 = e ** 4.0
-    chord = np.repeat(np.array(aerogrid['l'], ndmin=2), aerogrid['n'], axis=0)
+    # semiwidth, dihedral and sweep angle of the sending boxes, calculated from minus (-e) and plus (e) point
+    quantities = grid.panel_quantities(sending, dtype)
+    e = quantities['e']  # semiwidth
+    check_orientation(aerogrid)
+
+    geometry = {'method': method,
+                # the points and dihedral angles of the receiving (r) and sending (s/0) boxes, see calc_coordinates()
+                'boxes': {'Pr': np.asarray(aerogrid['offset_j'], dtype=dtype),
+                          'gamma_r': grid.panel_quantities(aerogrid, dtype)['gamma'],
+                          'Ps': np.asarray(sending['offset_l'], dtype=dtype),
+                          'sinGamma': quantities['sinGamma'],
+                          'cosGamma': quantities['cosGamma'],
+                          'gamma': quantities['gamma'],
+                          },
+                # per sending box
+                'tanLambda': quantities['tanLambda'],
+                'e': e,
+                'e2': e ** 2.0,
+                'e3': e ** 3.0,
+                'e4': e ** 4.0,
+                'chord': np.asarray(sending['l'], dtype=dtype),
+                }
+    if not blockwise:
+        geometry.update(calc_coordinates(geometry['boxes'], slice(None)))
+    if method not in ['parabolic', 'quartic', 'tabulated']:
+        logging.error('Method {} not implemented!'.format(method))
+    return geometry
 
-    # Catch panels which are not defined from left to right and issue a warning.
-    # Not sure with purely vertical panels though (bottom to top vs. top to bottom)...
-    if np.any(aerogrid['N'][:, 2] < 0.0):
-        logging.warning('Detected upside down / flipped aerodynamic panels! \n'
-                        'User action: Always define panels from left to right.')
 
+def calc_coordinates(boxes, rows):
+    # The coordinates of the receiving boxes rows relative to the sending boxes of calc_geometry_panels().
+    Pr = boxes['Pr'][rows]  # receiving (r)
+    Ps = boxes['Ps']  # sending (s/0)
     # cartesian coordinates of receiving points relative to sending points
     xsr = np.array(Pr[:, 0], ndmin=2).T - np.array(Ps[:, 0], ndmin=2)
     ysr = np.array(Pr[:, 1], ndmin=2).T - np.array(Ps[:, 1], ndmin=2)
     zsr = np.array(Pr[:, 2], ndmin=2).T - np.array(Ps[:, 2], ndmin=2)
 
     # dihedral angle gamma = arctan(dz/dy) and sweep angle lambda = arctan(dx/dy)
-    sinGamma = (Pp[:, 2] - Pm[:, 2]) / (2.0 * e)
-    cosGamma = (Pp[:, 1] - Pm[:, 1]) / (2.0 * e)
-    tanLambda = (Pp[:, 0] - Pm[:, 0]) / (2.0 * e)
-    gamma = np.arcsin(sinGamma)
+    sinGamma = boxes['sinGamma']
+    cosGamma = boxes['cosGamma']
     # relative dihedral angle between receiving point and sending boxes
-    gamma_sr = np.array(gamma, ndmin=2) - np.array(gamma, ndmin=2).T
+    gamma_sr = np.array(boxes['gamma'], ndmin=2) - np.array(boxes['gamma_r'][rows], ndmin=2).T
 
     # local coordinates of receiving point relative to sending point
     ybar = ysr * cosGamma + zsr * sinGamma
     zbar = zsr * cosGamma - ysr * sinGamma
+    return {'xsr': xsr,
+            'ybar': ybar,
+            'zbar': zbar,
+            'gamma_sr': gamma_sr,
+            }
+
+
+def calc_geometry_block(geometry):
+    # All terms of calc_Drs_block() which depend only on the geometry, for one block of receiving boxes of the
+    # geometry of calc_geometry_panels(). The quantities per sending box are broadcast to the shape of the block
+    # (views, no copies), the conditions and the terms F are calculated only for the block.
+    shape = geometry['xsr'].shape
+    block = {key: np.broadcast_to(geometry[key], shape) for key in ['tanLambda', 'e', 'e2', 'e3', 'e4', 'chord']}
+    ybar = geometry['ybar']
+    zbar = geometry['zbar']
+    e = block['e']
+    e2 = block['e2']
+    dtype = e.dtype
 
     # pre-calculate some values which will be used a couple of times
     ybar2 = ybar ** 2.0
@@ -119,18 +425,33 @@ def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
     ir = (np.abs(ratio) > 0.3) & (np.abs(zbar) / e > 0.001)
     # check that all conditions are captured: np.all(i0 + ia + ir) == True
 
-    alpha = np.zeros(e.shape)
+    alpha = np.zeros(shape, dtype=dtype)
     funny_series = 0.0
     for n in range(2, 8):
         funny_series += (-1.0) ** n / (2.0 * n - 1.0) * ratio[ia] ** (2.0 * n - 4.0)
     # Rodden 1971, eq 33, Rodden 1972, eq 31b and Rodden 1998, eq 25
     alpha[ia] = 4.0 * e[ia] ** 4.0 / (ybar2[ia] + zbar2[ia] - e2[ia]) ** 2.0 * funny_series
 
-    if method == 'parabolic':
+    block.update({'xsr': geometry['xsr'],
+                  'ybar': ybar,
+                  'zbar': zbar,
+                  'gamma_sr': geometry['gamma_sr'],
+                  'ybar2': ybar2,
+                  'ybar4': ybar4,
+                  'zbar2': zbar2,
+                  'zbar4': zbar4,
+                  'ratio': ratio,
+                  'L': L,
+                  # Condition 1 and 2 of the "nonplanar" part, Rodden 1971 eq 40+41 and Rodden 1998 eq 33+34
+                  'ib': (np.abs(1.0 / ratio) <= 0.1) & (np.abs(zbar) / e > 0.001),
+                  'ic': (np.abs(1.0 / ratio) > 0.1) & (np.abs(zbar) / e > 0.001),
+                  })
+
+    if geometry['method'] == 'parabolic':
         # Rodden et at. 1971 and 1972
 
         # Initial values
-        Fparabolic = np.zeros(e.shape)
+        Fparabolic = np.zeros(shape, dtype=dtype)
         # Condition 1, planar
         Fparabolic[i0] = 2.0 * e[i0] / (ybar2[i0] - e2[i0])  # OK, idf1.f
         # Condition 2, co-planar / close-by
@@ -142,57 +463,13 @@ def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
         # Extra Condition found in Nastran idf2.f, line 26
         # Fparabolic[np.abs(1.0/ratio) <= 0.0001] = 0.0
 
-        # call the kernel function with Laschka approximation
-        P1m, P2m = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, -e, k, Ma, method='Laschka')
-        P1p, P2p = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, +e, k, Ma, method='Laschka')
-        P1s, P2s = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, 0, k, Ma, method='Laschka')
-
-        # define terms used in the parabolic approximation, Nastran incro.f
-        A1 = (P1m - 2.0 * P1s + P1p) / (2.0 * e2)  # Rodden 1971, eq 28
-        B1 = (P1p - P1m) / (2.0 * e)  # Rodden 1971, eq 29
-        C1 = P1s  # Rodden 1971, eq 30
-
-        A2 = (P2m - 2.0 * P2s + P2p) / (2.0 * e2)  # Rodden 1971, eq 37
-        B2 = (P2p - P2m) / (2.0 * e)  # Rodden 1971, eq 38
-        C2 = P2s  # Rodden 1971, eq 39
-
-        # The "planar" part
-        # -----------------
-        #  normalwash matrix, Rodden 1971, eq 34
-        D1rs = chord / (np.pi * 8.0) \
-            * (((ybar2 - zbar2) * A1 + ybar * B1 + C1) * Fparabolic
-                + (0.5 * B1 + ybar * A1) * np.log(((ybar - e) ** 2.0 + zbar2) / ((ybar + e) ** 2.0 + zbar2))
-                + 2.0 * e * A1)  # Checked with Nastran idf1.f & incro.f
-
-        # The "nonplanar" part
-        # --------------------
-        D2rs = np.zeros(e.shape, dtype='complex')
-
-        # Condition 1, similar to above but with different boundary, Rodden 1971 eq 40
-        ib = (np.abs(1.0 / ratio) <= 0.1) & (np.abs(zbar) / e > 0.001)
-        D2rs[ib] = chord[ib] / (16.0 * np.pi * zbar2[ib]) \
-            * (((ybar2[ib] + zbar2[ib]) * A2[ib] + ybar[ib] * B2[ib] + C2[ib]) * Fparabolic[ib]
-                + 1.0 / ((ybar[ib] + e[ib]) ** 2.0 + zbar2[ib])
-                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] + (ybar2[ib] - zbar2[ib]) * e[ib])
-                   * A2[ib] + (ybar2[ib] + zbar2[ib] + ybar[ib] * e[ib]) * B2[ib] + (ybar[ib] + e[ib]) * C2[ib])
-                - 1.0 / ((ybar[ib] - e[ib]) ** 2.0 + zbar2[ib])
-                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] - (ybar2[ib] - zbar2[ib]) * e[ib])
-                   * A2[ib] + (ybar2[ib] + zbar2[ib] - ybar[ib] * e[ib]) * B2[ib] + (ybar[ib] - e[ib]) * C2[ib])
-               )  # Checked with Nastran idf2.f
-
-        # Condition 2, Rodden 1971 eq 41
-        ic = (np.abs(1.0 / ratio) > 0.1) & (np.abs(zbar) / e > 0.001)
-        # reconstruct alpha from eq 32, NOT eq 33!
+        # reconstruct alpha from eq 32, NOT eq 33! This is used in Condition 2 of the "nonplanar" part.
         alpha[i0] = ((2.0 * e2[i0]) / (ybar2[i0] - e2[i0])) ** 2.0  # Nastran idf2.f, line 75
         alpha[ir] = (1.0 - Fparabolic[ir] * (ybar2[ir] + zbar2[ir] - e2[ir]) / (2.0 * e[ir])) / zbar2[ir] * e2[ir]
+        block['Fparabolic'] = Fparabolic
+        block['alpha'] = alpha
 
-        D2rs[ic] = chord[ic] * e[ic] / (8.0 * np.pi * (ybar2[ic] + zbar2[ic] - e2[ic])) \
-            * ((2.0 * (ybar2[ic] + zbar2[ic] + e2[ic]) * (e2[ic] * A2[ic] + C2[ic]) + 4.0 * ybar[ic] * e2[ic] * B2[ic])
-                / (((ybar[ic] + e[ic]) ** 2.0 + zbar2[ic]) * ((ybar[ic] - e[ic]) ** 2.0 + zbar2[ic]))
-                - alpha[ic] / e2[ic] * ((ybar2[ic] + zbar2[ic]) * A2[ic] + ybar[ic] * B2[ic] + C2[ic])
-               )  # Checked with Nastran idf2.f
-
-    elif method == 'quartic':
+    elif geometry['method'] in ['quartic', 'tabulated']:
         # Rodden et al. 1998
         # Why chooses Rodden in 1972 and 1998 a more complicated formulation with d1,2?
         # Only to place the tangens into the right quadrant? --> Is there no arctan2 in Fortran?!?
@@ -200,8 +477,8 @@ def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
 
         # Note that there is a difference and/or mistake (?) in eq. 23 in Roddel et al. 1998
         # compared to eq. 30b in Roddel et al. 1972. The following values appear to be correct:
-        d1 = np.zeros(e.shape)
-        d2 = np.zeros(e.shape)
+        d1 = np.zeros(shape, dtype=dtype)
+        d2 = np.zeros(shape, dtype=dtype)
         i1 = (ybar2 + zbar2 - e2) > 0.0
         d1[i1] = 1.0
         d2[i1] = 0.0
@@ -213,27 +490,222 @@ def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
         d2[i3] = 1.0
 
         # Rodden 1998, eq 24 and 25
-        epsilon = np.zeros(e.shape)
+        epsilon = np.zeros(shape, dtype=dtype)
         epsilon[i0] = 2.0 * e[i0] / (ybar2[i0] - e2[i0])
         epsilon[ia] = alpha[ia]  # Rodden 1998, eq 25
         epsilon[ir] = e2[ir] / zbar2[ir] * (1.0 - 1.0 / ratio[ir] * np.arctan(ratio[ir]))  # Rodden 1998, eq 24
         iar = ia + ir
         # Initial values
-        Fquartic = np.zeros(e.shape)
+        Fquartic = np.zeros(shape, dtype=dtype)
         # Rodden 1998, eq. 22 without terms including z because z==0
         Fquartic[i0] = d1[i0] * 2.0 * e[i0] / (ybar2[i0] - e2[i0])
         # Rodden 1998, eq. 22
         Fquartic[iar] = d1[iar] * 2.0 * e[iar] / (ybar2[iar] + zbar2[iar] - e2[iar]) \
             * (1.0 - epsilon[iar] * zbar2[iar] / e2[iar]) + d2[iar] * np.pi / np.abs(zbar[iar])
         # check: np.allclose(Fparabolic, Fquartic)
+        block['d1'] = d1
+        block['d2'] = d2
+        block['epsilon'] = epsilon
+        block['Fquartic'] = Fquartic
+    return block
 
-        # Rodden 1998
-        # call the kernel function with Desmarais approximation
-        P1m, P2m = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, -e, k, Ma, method='Desmarais')
-        P1mh, P2mh = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, -e / 2.0, k, Ma, method='Desmarais')
-        P1p, P2p = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, +e, k, Ma, method='Desmarais')
-        P1ph, P2ph = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, +e / 2.0, k, Ma, method='Desmarais')
-        P1s, P2s = kernelfunction(xsr, ybar, zbar, gamma_sr, tanLambda, 0.0, k, Ma, method='Desmarais')
+
+def check_orientation(aerogrid):
+    # Catch panels which are not defined from left to right and issue a warning.
+    # Not sure with purely vertical panels though (bottom to top vs. top to bottom)...
+    if np.any(aerogrid['N'][:, 2] < 0.0):
+        logging.warning('Detected upside down / flipped aerodynamic panels! \n'
+                        'User action: Always define panels from left to right.')
+
+
+def select_backend(backend=None, method=None):
+    # The backend of calc_Ajj(), 'numpy' or 'numba', by default BACKEND. The table of the method 'tabulated' is only
+    # implemented in numpy.
+    backend = BACKEND if backend is None else backend
+    if backend == 'numba' and jit.numba is None:
+        logging.warning('Numba is not installed, using the numpy implementation of the DLM.')
+        backend = 'numpy'
+    elif backend == 'numba' and method == 'tabulated':
+        logging.warning('Method tabulated is not implemented in the compiled backend, using the numpy implementation '
+                        'of the DLM.')
+        backend = 'numpy'
+    return backend
+
+
+def check_backend_dtype(dtype):
+    # The compiled backend always evaluates the kernel in double precision, only the result is stored with the dtype.
+    if np.dtype(dtype) != np.float64:
+        logging.warning('The compiled backend evaluates the DLM in double precision, the dtype {} is only used for '
+                        'the result.'.format(np.dtype(dtype).name))
+
+
+def calc_Ajj(aerogrid, Ma, k, method='parabolic', geometry=None, xz_symmetry=False, dtype='float64', backend=None,
+             n_threads=None):
+    # Calculates one unsteady AIC matrix (Qjj = -Ajj^-1) at given Mach number and frequency
+    #
+    # M = Mach number
+    # k = omega/U, the "classical" definition, not Nastran definition!
+    # method = 'parabolic' (Rodden 1971, Laschka approximation), 'quartic' (Rodden 1998, Desmarais approximation) or
+    #          'tabulated' (quartic, with the Desmarais approximation interpolated from a table, see integral_table())
+    #     k may also be a vector of (non-zero) reduced frequencies, then the kernel function is evaluated for all
+    #     frequencies in one pass and the AIC matrices are returned along a new, first axis (dim: k,n,n).
+    # geometry = optional, the pre-calculated geometry from calc_geometry(), e.g. to re-use it for many Ma and k,
+    #            without, the geometry is calculated per block of receiving boxes
+    # xz_symmetry = optional, False, True / 'symmetric' or 'antisymmetric', the influence of the mirrored
+    #               sending boxes is included, see VLM.calc_Qjj()
+    # dtype = optional, 'float32' to assemble the matrix in single precision (complex64), a given geometry is
+    #         used with its own dtype
+    # backend = optional, 'numpy' or 'numba', see BACKEND. The compiled backend calculates the geometry on the fly,
+    #           a given geometry is not used, and evaluates the kernel in double precision.
+    # n_threads = optional, the blocks of receiving boxes are assembled on a pool of threads, see calc_Drs(). The
+    #             compiled backend uses n_threads threads of Numba.
+    sign = VLM.symmetry_sign(xz_symmetry)
+    # a Python float does not promote single precision arrays
+    Ma = float(Ma)
+    if select_backend(backend, method) == 'numba':
+        check_orientation(aerogrid)
+        if geometry is not None:
+            logging.warning('The compiled backend calculates the geometry on the fly, the given geometry is not used.')
+            dtype = geometry['e'].dtype
+        check_backend_dtype(dtype)
+        Drs = jit.calc_Drs(aerogrid, aerogrid, Ma, k, method, dtype, n_threads)
+        if sign is not None:
+            Drs += sign * jit.calc_Drs(aerogrid, VLM.mirror_xz(aerogrid), Ma, k, method, dtype, n_threads)
+        return Drs
+    if geometry is None:
+        # the geometry is used only once and is calculated per block of receiving boxes
+        geometry = calc_geometry(aerogrid, method, xz_symmetry, dtype, blockwise=True)
+    elif geometry['method'] != method:
+        logging.warning('Geometry was calculated for method {}, re-calculating it for method {}.'.format(
+            geometry['method'], method))
+        geometry = calc_geometry(aerogrid, method, xz_symmetry, geometry['e'].dtype, blockwise='xsr' not in geometry)
+    Drs = calc_Drs(geometry, Ma, k, method, n_threads)
+    if sign is not None:
+        geometry_mirror = geometry.get('mirror')
+        if geometry_mirror is None:
+            geometry_mirror = calc_geometry_panels(aerogrid, VLM.mirror_xz(aerogrid), method, geometry['e'].dtype,
+                                                   blockwise=True)
+        Drs += sign * calc_Drs(geometry_mirror, Ma, k, method, n_threads)
+    return Drs
+
+
+def calc_Drs(geometry, Ma, k, method='parabolic', n_threads=None):
+    # The normalwash matrix of calc_Ajj() for a given geometry from calc_geometry_panels().
+    # The matrix is assembled in blocks of receiving boxes with KERNEL_BLOCK_SIZE elements, the results are identical.
+    # With n_threads, the blocks are assembled on a pool of threads, see parallel.run_threads().
+    n_r, n_s = geometry['boxes']['Pr'].shape[0], geometry['e'].shape[0]
+    n_points = {'parabolic': 3, 'quartic': 5, 'tabulated': 5}.get(method, 1)
+    n_rows = max(1, KERNEL_BLOCK_SIZE // (n_s * n_points * np.size(k)))
+    Drs = np.empty(np.shape(k) + (n_r, n_s), dtype=np.result_type(geometry['e'], 'complex64'))
+    if method == 'tabulated':
+        # calculate the table before the threads are started
+        integral_table()
+    parallel.run_threads(functools.partial(calc_Drs_rows, Drs, geometry, Ma, k, method),
+                         [slice(i, min(i + n_rows, n_r)) for i in range(0, n_r, n_rows)], n_threads)
+    return Drs
+
+
+def calc_Drs_rows(Drs, geometry, Ma, k, method, rows):
+    # Assemble one block of receiving boxes of calc_Drs() and write it into Drs.
+    Drs[..., rows, :] = calc_Drs_block(slice_geometry(geometry, rows), Ma, k, method)
+
+
+def slice_geometry(geometry, rows):
+    # Select a block of receiving boxes from the geometry of calc_geometry_panels() (views, no copies). For a
+    # blockwise geometry, the relative coordinates are calculated for the block.
+    block = {key: value[rows] if isinstance(value, np.ndarray) and value.ndim == 2 else value
+             for key, value in geometry.items() if key not in ['mirror', 'boxes']}
+    if 'xsr' not in geometry:
+        block.update(calc_coordinates(geometry['boxes'], rows))
+    return block
+
+
+def calc_Drs_block(geometry, Ma, k, method='parabolic'):
+    # The normalwash matrix of calc_Drs() for one block of receiving boxes.
+    geometry = calc_geometry_block(geometry)
+    xsr = geometry['xsr']
+    ybar = geometry['ybar']
+    zbar = geometry['zbar']
+    gamma_sr = geometry['gamma_sr']
+    tanLambda = geometry['tanLambda']
+    e = geometry['e']
+    e2 = geometry['e2']
+    e3 = geometry['e3']
+    e4 = geometry['e4']
+    chord = geometry['chord']
+    ybar2 = geometry['ybar2']
+    ybar4 = geometry['ybar4']
+    zbar2 = geometry['zbar2']
+    zbar4 = geometry['zbar4']
+    ratio = geometry['ratio']
+    L = geometry['L']
+    ib = geometry['ib']
+    ic = geometry['ic']
+
+    if method == 'parabolic':
+        # Rodden et at. 1971 and 1972
+        Fparabolic = geometry['Fparabolic']
+        alpha = geometry['alpha']
+
+        # call the kernel function with Laschka approximation, all three points in one pass
+        P1, P2 = kernelfunction_offsets(xsr, ybar, zbar, gamma_sr, tanLambda, e, [-1.0, 1.0, 0.0], k, Ma,
+                                        method='Laschka')
+        P1m, P1p, P1s = [P1[..., i, :, :] for i in range(3)]
+        P2m, P2p, P2s = [P2[..., i, :, :] for i in range(3)]
+
+        # define terms used in the parabolic approximation, Nastran incro.f
+        A1 = (P1m - 2.0 * P1s + P1p) / (2.0 * e2)  # Rodden 1971, eq 28
+        B1 = (P1p - P1m) / (2.0 * e)  # Rodden 1971, eq 29
+        C1 = P1s  # Rodden 1971, eq 30
+
+        A2 = (P2m - 2.0 * P2s + P2p) / (2.0 * e2)  # Rodden 1971, eq 37
+        B2 = (P2p - P2m) / (2.0 * e)  # Rodden 1971, eq 38
+        C2 = P2s  # Rodden 1971, eq 39
+
+        # The "planar" part
+        # -----------------
+        #  normalwash matrix, Rodden 1971, eq 34
+        D1rs = chord / (np.pi * 8.0) \
+            * (((ybar2 - zbar2) * A1 + ybar * B1 + C1) * Fparabolic
+                + (0.5 * B1 + ybar * A1) * L
+                + 2.0 * e * A1)  # Checked with Nastran idf1.f & incro.f
+
+        # The "nonplanar" part
+        # --------------------
+        D2rs = np.zeros(A2.shape, dtype=A2.dtype)
+
+        # Condition 1, similar to above but with different boundary, Rodden 1971 eq 40
+        D2rs[..., ib] = chord[ib] / (16.0 * np.pi * zbar2[ib]) \
+            * (((ybar2[ib] + zbar2[ib]) * A2[..., ib] + ybar[ib] * B2[..., ib] + C2[..., ib]) * Fparabolic[ib]
+                + 1.0 / ((ybar[ib] + e[ib]) ** 2.0 + zbar2[ib])
+                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] + (ybar2[ib] - zbar2[ib]) * e[ib])
+                   * A2[..., ib] + (ybar2[ib] + zbar2[ib] + ybar[ib] * e[ib]) * B2[..., ib] + (ybar[ib] + e[ib]) * C2[..., ib])
+                - 1.0 / ((ybar[ib] - e[ib]) ** 2.0 + zbar2[ib])
+                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] - (ybar2[ib] - zbar2[ib]) * e[ib])
+                   * A2[..., ib] + (ybar2[ib] + zbar2[ib] - ybar[ib] * e[ib]) * B2[..., ib] + (ybar[ib] - e[ib]) * C2[..., ib])
+               )  # Checked with Nastran idf2.f
+
+        # Condition 2, Rodden 1971 eq 41
+        # alpha is reconstructed from eq 32, NOT eq 33, see calc_geometry_block()
+        D2rs[..., ic] = chord[ic] * e[ic] / (8.0 * np.pi * (ybar2[ic] + zbar2[ic] - e2[ic])) \
+            * ((2.0 * (ybar2[ic] + zbar2[ic] + e2[ic]) * (e2[ic] * A2[..., ic] + C2[..., ic])
+                + 4.0 * ybar[ic] * e2[ic] * B2[..., ic])
+                / (((ybar[ic] + e[ic]) ** 2.0 + zbar2[ic]) * ((ybar[ic] - e[ic]) ** 2.0 + zbar2[ic]))
+                - alpha[ic] / e2[ic] * ((ybar2[ic] + zbar2[ic]) * A2[..., ic] + ybar[ic] * B2[..., ic] + C2[..., ic])
+               )  # Checked with Nastran idf2.f
+
+    elif method in ['quartic', 'tabulated']:
+        # Rodden et al. 1998
+        d1 = geometry['d1']
+        d2 = geometry['d2']
+        epsilon = geometry['epsilon']
+        Fquartic = geometry['Fquartic']
+
+        # call the kernel function with Desmarais approximation (or the tabulated values), all five points in one pass
+        P1, P2 = kernelfunction_offsets(xsr, ybar, zbar, gamma_sr, tanLambda, e, [-1.0, -0.5, 1.0, 0.5, 0.0], k, Ma,
+                                        method='Desmarais' if method == 'quartic' else 'tabulated')
+        P1m, P1mh, P1p, P1ph, P1s = [P1[..., i, :, :] for i in range(5)]
+        P2m, P2mh, P2p, P2ph, P2s = [P2[..., i, :, :] for i in range(5)]
 
         # define terms used in the quartic approximation
         A1 = -1.0 / (6.0 * e2) * (P1m - 16.0 * P1mh + 30.0 * P1s - 16.0 * P1ph + P1p)  # Rodden 1998, eq 15
@@ -259,60 +731,58 @@ def calc_Ajj(aerogrid, Ma, k, method='parabolic'):
                )
         # The "nonplanar" part
         # --------------------
-        D2rs = np.zeros(e.shape, dtype='complex')
+        D2rs = np.zeros(A2.shape, dtype=A2.dtype)
 
         # Condition 1, similar to above but with different boundary, Rodden 1998 eq 33
-        ib = (np.abs(1.0 / ratio) <= 0.1) & (np.abs(zbar) / e > 0.001)
-        D2rs[ib] = chord[ib] / (16.0 * np.pi * zbar2[ib]) \
+        D2rs[..., ib] = chord[ib] / (16.0 * np.pi * zbar2[ib]) \
             * (Fquartic[ib]
-                * ((ybar2[ib] + zbar2[ib]) * A2[ib]
-                    + ybar[ib] * B2[ib]
-                    + C2[ib]
-                    + ybar[ib] * (ybar2[ib] + 3.0 * zbar2[ib]) * D2[ib]
-                    + (ybar4[ib] + 6.0 * ybar2[ib] * zbar2[ib] - 3.0 * zbar4[ib]) * E2[ib]
+                * ((ybar2[ib] + zbar2[ib]) * A2[..., ib]
+                    + ybar[ib] * B2[..., ib]
+                    + C2[..., ib]
+                    + ybar[ib] * (ybar2[ib] + 3.0 * zbar2[ib]) * D2[..., ib]
+                    + (ybar4[ib] + 6.0 * ybar2[ib] * zbar2[ib] - 3.0 * zbar4[ib]) * E2[..., ib]
                    )
                 + 1.0 / ((ybar[ib] + e[ib]) ** 2.0 + zbar2[ib])
-                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] + (ybar2[ib] - zbar2[ib]) * e[ib]) * A2[ib]
-                    + (ybar2[ib] + zbar2[ib] + ybar[ib] * e[ib]) * B2[ib]
-                    + (ybar[ib] + e[ib]) * C2[ib]
-                    + (ybar4[ib] - zbar4[ib] + (ybar2[ib] - 3.0 * zbar2[ib]) * ybar[ib] * e[ib]) * D2[ib]
+                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] + (ybar2[ib] - zbar2[ib]) * e[ib]) * A2[..., ib]
+                    + (ybar2[ib] + zbar2[ib] + ybar[ib] * e[ib]) * B2[..., ib]
+                    + (ybar[ib] + e[ib]) * C2[..., ib]
+                    + (ybar4[ib] - zbar4[ib] + (ybar2[ib] - 3.0 * zbar2[ib]) * ybar[ib] * e[ib]) * D2[..., ib]
                     + ((ybar4[ib] - 2.0 * ybar2[ib] * zbar2[ib] - 3.0 * zbar4[ib]) * ybar[ib]
-                       + (ybar4[ib] - 6.0 * ybar2[ib] * zbar2[ib] + zbar4[ib]) * e[ib]) * E2[ib]
+                       + (ybar4[ib] - 6.0 * ybar2[ib] * zbar2[ib] + zbar4[ib]) * e[ib]) * E2[..., ib]
                    )
                 - 1.0 / ((ybar[ib] - e[ib]) ** 2.0 + zbar2[ib])
-                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] - (ybar2[ib] - zbar2[ib]) * e[ib]) * A2[ib]
-                    + (ybar2[ib] + zbar2[ib] - ybar[ib] * e[ib]) * B2[ib]
-                    + (ybar[ib] - e[ib]) * C2[ib]
-                    + (ybar4[ib] - zbar4[ib] - (ybar2[ib] - 3.0 * zbar2[ib]) * ybar[ib] * e[ib]) * D2[ib]
+                * (((ybar2[ib] + zbar2[ib]) * ybar[ib] - (ybar2[ib] - zbar2[ib]) * e[ib]) * A2[..., ib]
+                    + (ybar2[ib] + zbar2[ib] - ybar[ib] * e[ib]) * B2[..., ib]
+                    + (ybar[ib] - e[ib]) * C2[..., ib]
+                    + (ybar4[ib] - zbar4[ib] - (ybar2[ib] - 3.0 * zbar2[ib]) * ybar[ib] * e[ib]) * D2[..., ib]
                     + ((ybar4[ib] - 2.0 * ybar2[ib] * zbar2[ib] - 3.0 * zbar4[ib]) * ybar[ib]
-                       - (ybar4[ib] - 6.0 * ybar2[ib] * zbar2[ib] + zbar4[ib]) * e[ib]) * E2[ib]
+                       - (ybar4[ib] - 6.0 * ybar2[ib] * zbar2[ib] + zbar4[ib]) * e[ib]) * E2[..., ib]
                    )
-                + (zbar2[ib] * L[ib]) * D2[ib]
-                + 4.0 * zbar2[ib] * (e[ib] + ybar[ib] * L[ib]) * E2[ib]
+                + (zbar2[ib] * L[ib]) * D2[..., ib]
+                + 4.0 * zbar2[ib] * (e[ib] + ybar[ib] * L[ib]) * E2[..., ib]
                )
 
         # Condition 2, Rodden 1998 eq 34
-        ic = (np.abs(1.0 / ratio) > 0.1) & (np.abs(zbar) / e > 0.001)
-        D2rs[ic] = chord[ic] * e[ic] / (8.0 * np.pi * (ybar2[ic] + zbar2[ic] - e2[ic])) \
+        D2rs[..., ic] = chord[ic] * e[ic] / (8.0 * np.pi * (ybar2[ic] + zbar2[ic] - e2[ic])) \
             * (1.0 / (((ybar[ic] + e[ic]) ** 2.0 + zbar2[ic]) * ((ybar[ic] - e[ic]) ** 2.0 + zbar2[ic]))
-                * (2.0 * (ybar2[ic] + zbar2[ic] + e2[ic]) * (e2[ic] * A2[ic] + C2[ic])
-                    + 4.0 * ybar[ic] * e2[ic] * B2[ic]
+                * (2.0 * (ybar2[ic] + zbar2[ic] + e2[ic]) * (e2[ic] * A2[..., ic] + C2[..., ic])
+                    + 4.0 * ybar[ic] * e2[ic] * B2[..., ic]
                     + 2.0 * ybar[ic] * (ybar4[ic] - 2.0 * e2[ic] * ybar2[ic] + 2.0 * ybar2[ic] * zbar2[ic] + 3.0 * e4[ic]
-                                        + 2.0 * e2[ic] * zbar2[ic] + zbar4[ic]) * D2[ic]
+                                        + 2.0 * e2[ic] * zbar2[ic] + zbar4[ic]) * D2[..., ic]
                     + 2.0 * (3.0 * ybar[ic] ** 6.0 - 7.0 * e2[ic] * ybar4[ic] + 5.0 * ybar4[ic] * zbar2[ic]
                              + 6.0 * e4[ic] * ybar2[ic] + 6.0 * e2[ic] * ybar2[ic] * zbar2[ic]
                              - 3.0 * e2[ic] * zbar4[ic] - zbar[ic] ** 6.0 + ybar2[ic] * zbar4[ic]
-                             - 2.0 * e4[ic] * zbar2[ic]) * E2[ic]
+                             - 2.0 * e4[ic] * zbar2[ic]) * E2[..., ic]
                    )
                 - (d1[ic] * epsilon[ic] + e2[ic] / zbar2[ic] * (1.0 - d1[ic] - d2[ic] * np.pi / ratio[ic])) / e2[ic]
-                * ((ybar2[ic] + zbar2[ic]) * A2[ic]
-                    + ybar[ic] * B2[ic]
-                    + C2[ic]
-                    + ybar[ic] * (ybar2[ic] + 3.0 * zbar2[ic]) * D2[ic]
-                    + (ybar4[ic] + 6.0 * ybar2[ic] * zbar2[ic] - 3.0 * zbar4[ic]) * E2[ic]
+                * ((ybar2[ic] + zbar2[ic]) * A2[..., ic]
+                    + ybar[ic] * B2[..., ic]
+                    + C2[..., ic]
+                    + ybar[ic] * (ybar2[ic] + 3.0 * zbar2[ic]) * D2[..., ic]
+                    + (ybar4[ic] + 6.0 * ybar2[ic] * zbar2[ic] - 3.0 * zbar4[ic]) * E2[..., ic]
                    )
                ) \
-            + chord[ic] / (8.0 * np.pi) * (D2[ic] / 2.0 * L[ic] + 2.0 * (e[ic] + ybar[ic] * L[ic]) * E2[ic])
+            + chord[ic] / (8.0 * np.pi) * (D2[..., ic] / 2.0 * L[ic] + 2.0 * (e[ic] + ybar[ic] * L[ic]) * E2[..., ic])
     else:
         logging.error('Method {} not implemented!'.format(method))
 
@@ -332,80 +802,165 @@ def kernelfunction(xbar, ybar, zbar, gamma_sr, tanLambda, ebar, k, M, method='La
     # steady contribution will be added later from the VLM.
     # Note: Rodden has the habit of leaving out some brackets in his formulas. This
     # applies to eq 11, 7 and 8 where it is not clear which parts belong to the denominator.
+    #
+    # The calculation is split into the frequency independent part, which only depends on the
+    # geometry and the Mach number, and the frequency dependent part. The reduced frequency k
+    # may also be a vector, then all frequencies are evaluated at once along a new, first axis.
+    kernel = kernelfunction_precompute(xbar, ybar, zbar, gamma_sr, tanLambda, ebar, M, method)
+    return kernelfunction_evaluate(kernel, k)
+
+
+def kernelfunction_offsets(xbar, ybar, zbar, gamma_sr, tanLambda, e, factors, k, M, method='Laschka'):
+    # Same as kernelfunction(), but for several points along the bound vortex, ebar = factor * e, which are
+    # evaluated in one pass along a new offset axis (dim: (k,) offset, n, n). The terms which don't depend on ebar,
+    # e.g. the direction cosines and the phase exp(-j*k*xbar), are shared and the kernel is evaluated with one
+    # partition into u1 >= 0 and u1 < 0 for all points.
+    # The semiwidth e is the same for all receiving points (per sending box, see calc_geometry_panels()), so ebar is
+    # formed from one row only.
+    ebar = np.asarray(factors, dtype=e.dtype).reshape(-1, 1, 1) * np.atleast_2d(e)[:1]
+    return kernelfunction(xbar, ybar, zbar, gamma_sr, tanLambda, ebar, k, M, method)
 
+
+def kernelfunction_precompute(xbar, ybar, zbar, gamma_sr, tanLambda, ebar, M, method='Laschka'):
+    # All parts of the kernel function that do not depend on the reduced frequency k.
+    # ebar may have additional leading axes (e.g. for several points along the bound vortex), see kernelfunction_offsets()
+    etan = ebar * tanLambda
+    xe = xbar - etan
     r1 = ((ybar - ebar) ** 2.0 + zbar ** 2.0) ** 0.5  # Rodden 1971, eq 4
     beta2 = 1.0 - (M ** 2.0)  # Rodden 1971, eq 9
-    R = ((xbar - ebar * tanLambda) ** 2.0 + beta2 * r1 ** 2.0) ** 0.5  # Rodden 1971, eq 10
-    u1 = (M * R - xbar + ebar * tanLambda) / (beta2 * r1)  # Rodden 1971, eq 11
+    R = (xe ** 2.0 + beta2 * r1 ** 2.0) ** 0.5  # Rodden 1971, eq 10
+    u1 = (M * R - xe) / (beta2 * r1)  # Rodden 1971, eq 11
+    cosGamma = np.cos(gamma_sr)
+    sinGamma = np.sin(gamma_sr)
+
+    kernel = {'method': method,
+              'r1': r1,
+              'u1': u1,
+              # the phase exp(-j*k*(xbar - ebar*tanLambda)) is split into exp(-j*k*xbar) * exp(j*k*ebar*tanLambda)
+              'xbar': xbar,
+              'etan': etan,
+              # direction cosine matrices
+              'T1': cosGamma,  # Rodden 1971, eq 5
+              'T2': zbar * (zbar * cosGamma + (ybar - ebar) * sinGamma),  # Rodden 1971, eq 21a
+              # This is the analytical solution for K1,2 at k=0.0, Rodden 1971, eq 15+16
+              'K10': -1.0 - xe / R,
+              'K20': 2.0 + xe * (2.0 + beta2 * r1 ** 2.0 / R ** 2.0) / R,
+              # Frequency independent factors in the formulation of K1,2 by Landahl, Rodden 1971, eq 7+8
+              'K1_1': M * r1 / R / (1 + u1 ** 2.0) ** 0.5,
+              'K2_1': (M ** 2.0) * (r1 ** 2.0) / (R ** 2.0) / (1.0 + u1 ** 2.0) ** 0.5,
+              'K2_2': M * r1 * ((1.0 + u1 ** 2.0) * beta2 * r1 ** 2.0 / R ** 2.0 + 2.0 + M * r1 * u1 / R)
+              / R / (1.0 + u1 ** 2.0) ** 1.5,
+              # Resolve the singularity arising when r1 = 0
+              'ir0xpos': (r1 == 0) & (xbar >= 0.0),
+              'ir0xneg': (r1 == 0) & (xbar < 0.0),
+              # The exponential terms of the integral approximations
+              'integrals': precompute_integrals12(u1, method),
+              }
+    return kernel
+
+
+def kernelfunction_evaluate(kernel, k):
+    # All parts of the kernel function that depend on the reduced frequency k, see kernelfunction().
+    r1 = kernel['r1']
+    u1 = kernel['u1']
+    # Add new axes so that a vector of reduced frequencies is evaluated along the first axis.
+    k = np.asarray(k, dtype=r1.dtype)
+    k = k.reshape(k.shape + (1,) * r1.ndim)
     k1 = k * r1  # Rodden 1971, eq 12 with k = w/U
     j = 1j  # imaginary number
     ejku = np.exp(-j * k1 * u1)  # pre-multiplication
 
-    # direction cosine matrices
-    T1 = np.cos(gamma_sr)  # Rodden 1971, eq 5
-    T2 = zbar * (zbar * np.cos(gamma_sr) + (ybar - ebar) * np.sin(gamma_sr))  # Rodden 1971, eq 21a: T2_new = T2_old*r1^2
-
     # Approximation of intergrals I1,2, Rodden 1971, eq 13+14
-    I1, I2 = get_integrals12(u1, k1, method)
+    I1, I2 = get_integrals12(u1, k1, kernel['method'], kernel['integrals'])
 
     # Formulation of K1,2 by Landahl, Rodden 1971, eq 7+8
-    K1 = -I1 - ejku * M * r1 / R / (1 + u1 ** 2.0) ** 0.5
-    K2 = 3.0 * I2 + j * k1 * ejku * (M ** 2.0) * (r1 ** 2.0) / (R ** 2.0) / (1.0 + u1 ** 2.0) ** 0.5 \
-        + ejku * M * r1 * ((1.0 + u1 ** 2.0) * beta2 * r1 ** 2.0 / R ** 2.0 + 2.0 + M * r1 * u1 / R) \
-        / R / (1.0 + u1 ** 2.0) ** 1.5
-
-    # This is the analytical solution for K1,2 at k=0.0, Rodden 1971, eq 15+16
-    K10 = -1.0 - (xbar - ebar * tanLambda) / R
-    K20 = 2.0 + (xbar - ebar * tanLambda) * (2.0 + beta2 * r1 ** 2.0 / R ** 2.0) / R
+    K1 = -I1 - ejku * kernel['K1_1']
+    K2 = 3.0 * I2 + j * k1 * ejku * kernel['K2_1'] + ejku * kernel['K2_2']
 
     # Resolve the singularity arising when r1 = 0
-    ir0xpos = (r1 == 0) & (xbar >= 0.0)
-    ir0xneg = (r1 == 0) & (xbar < 0.0)
-    K1[ir0xpos] = -2.0
-    K2[ir0xpos] = +4.0
-    K1[ir0xneg] = 0.0
-    K2[ir0xneg] = 0.0
+    K1[..., kernel['ir0xpos']] = -2.0
+    K2[..., kernel['ir0xpos']] = +4.0
+    K1[..., kernel['ir0xneg']] = 0.0
+    K2[..., kernel['ir0xneg']] = 0.0
 
+    phase = np.exp(-j * k * kernel['xbar']) * np.exp(j * k * kernel['etan'])
     # Rodden 1971, eq 27b, check: -K1*np.exp(-j*k*xbar)*T1
-    P1 = -(K1 * np.exp(-j * k * (xbar - ebar * tanLambda)) - K10) * T1
+    P1 = -(K1 * phase - kernel['K10']) * kernel['T1']
     # Rodden 1971, eq 36b, check: -K2*np.exp(-j*k*xbar)*T2/r1**2.0
-    P2 = -(K2 * np.exp(-j * k * (xbar - ebar * tanLambda)) - K20) * T2
+    P2 = -(K2 * phase - kernel['K20']) * kernel['T2']
 
     return P1, P2
 
 
-def get_integrals12(u1, k1, method='Laschka'):
+def precompute_integrals12(u1, method='Laschka'):
+    # Frequency independent parts of get_integrals12()
+    ipos = u1 >= 0.0
+    ineg = u1 < 0.0
+    return {'ipos': ipos,
+            'ineg': ineg,
+            'pos': integral_exponentials(u1[ipos], method),
+            'neg': integral_exponentials(-u1[ineg], method),
+            'zero': integral_exponentials(u1.dtype.type(0.0), method),
+            }
+
 
-    I1 = np.zeros(u1.shape, dtype='complex')
-    I2 = np.zeros(u1.shape, dtype='complex')
+def get_integrals12(u1, k1, method='Laschka', precomputed=None):
+    # k1 may have additional leading axes (e.g. for several frequencies), u1 is broadcasted.
+    if precomputed is None:
+        precomputed = precompute_integrals12(u1, method)
+    ipos = precomputed['ipos']
+    ineg = precomputed['ineg']
+    k1 = np.broadcast_to(k1, k1.shape[:k1.ndim - u1.ndim] + u1.shape)
 
-    ipos = u1 >= 0.0
-    I1[ipos], I2[ipos] = integral_approximations(u1[ipos], k1[ipos], method)
+    I1 = np.zeros(k1.shape, dtype=np.result_type(u1, 'complex64'))
+    I2 = np.zeros(k1.shape, dtype=np.result_type(u1, 'complex64'))
 
-    ineg = u1 < 0.0
-    I10, I20 = integral_approximations(0.0 * u1[ineg], k1[ineg], method)
-    I1n, I2n = integral_approximations(-u1[ineg], k1[ineg], method)
-    I1[ineg] = 2.0 * I10.real - I1n.real + 1j * I1n.imag  # Rodden 1971, eq A.5
-    I2[ineg] = 2.0 * I20.real - I2n.real + 1j * I2n.imag  # Rodden 1971, eq A.9
+    I1[..., ipos], I2[..., ipos] = integral_approximations(u1[ipos], k1[..., ipos], method, precomputed['pos'])
+
+    I10, I20 = integral_approximations(0.0 * u1[ineg], k1[..., ineg], method, precomputed['zero'])
+    I1n, I2n = integral_approximations(-u1[ineg], k1[..., ineg], method, precomputed['neg'])
+    I1[..., ineg] = 2.0 * I10.real - I1n.real + 1j * I1n.imag  # Rodden 1971, eq A.5
+    I2[..., ineg] = 2.0 * I20.real - I2n.real + 1j * I2n.imag  # Rodden 1971, eq A.9
     return I1, I2
 
 
-def integral_approximations(u1, k1, method='Laschka'):
+def integral_approximations(u1, k1, method='Laschka', exponentials=None):
+    # exponentials = optional, the frequency independent terms from integral_exponentials()
     if method == 'Laschka':
         logging.debug('Using Laschka approximation in DLM')
-        I1, I2 = laschka_approximation(u1, k1)
+        I1, I2 = laschka_approximation(u1, k1, exponentials)
     elif method == 'Desmarais':
         logging.debug('Using Desmarais approximation in DLM')
-        I1, I2 = desmarais_approximation(u1, k1)
+        I1, I2 = desmarais_approximation(u1, k1, exponentials)
     elif method == 'Watkins':
         logging.warning('Using Watkins (not preferred!) approximation in DLM.')
         I1, I2 = watkins_approximation(u1, k1)
+    elif method == 'tabulated':
+        logging.debug('Using tabulated Desmarais approximation in DLM')
+        I1, I2 = tabulated_approximation(u1, k1, exponentials)
     else:
         logging.error('Method {} not implemented!'.format(method))
     return I1, I2
 
 
-def desmarais_approximation(u1, k1):
+def integral_exponentials(u1, method='Laschka'):
+    # The exponential terms exp(-n*c*u1) of the Laschka and Desmarais approximations don't depend
+    # on the frequency and can be calculated in advance. Note that the exponential terms of the
+    # Watkins approximation are frequency dependent.
+    if method == 'Laschka':
+        c = 0.372
+        return [np.exp(-(n * c) * u1) for n in range(1, 12)]
+    elif method == 'Desmarais':
+        m = 1.0
+        b = 0.009054814793
+        return [np.exp(-((2.0 ** (n / m)) * b) * u1) for n in range(1, 13)]
+    elif method == 'tabulated':
+        # not exponentials, but the position of u1 in the table
+        return table_position(u1, 0)
+    return None
+
+
+def desmarais_approximation(u1, k1, exponentials=None):
     # Adapted formulas from laschka_approximation
     a12 = [0.000319759140, -0.000055461471, 0.002726074362, 0.005749551566,
            0.031455895072, 0.106031126212, 0.406838011567, 0.798112357155,
@@ -414,15 +969,9 @@ def desmarais_approximation(u1, k1):
     b = 0.009054814793
     j = 1j
     ejku = np.exp(-j * k1 * u1)  # pre-multiplication
-    I0 = 0.0
-    J0 = 0.0
-    for n, a in zip(range(1, 13), a12):
-        nm = n / m
-        nmbk = (2.0 ** nm) ** 2.0 * b ** 2.0 + k1 ** 2.0
-        I0 += a * np.exp(-(2.0 ** nm) * b * u1) / nmbk * ((2.0 ** nm) * b - j * k1)
-        J0 += a * np.exp(-(2.0 ** nm) * b * u1) / nmbk ** 2.0 \
-            * ((2.0 ** nm) ** 2.0 * b ** 2.0 - k1 ** 2.0 + (2.0 ** nm) * b * u1 * nmbk
-               - j * k1 * (2.0 * (2.0 ** nm) * b + u1 * nmbk))
+    if exponentials is None:
+        exponentials = integral_exponentials(u1, 'Desmarais')
+    I0, J0 = exponential_series(u1, k1, a12, [(2.0 ** (n / m)) * b for n in range(1, 13)], exponentials)
     # I1 as in Rodden 1971, eq A.1
     I1 = (1.0 - u1 / (1.0 + u1 ** 2.0) ** 0.5 - 1j * k1 * I0) * ejku
     # I2 as in Rodden 1971, eq A.6,
@@ -431,7 +980,7 @@ def desmarais_approximation(u1, k1):
     return I1, I2
 
 
-def laschka_approximation(u1, k1):
+def laschka_approximation(u1, k1, exponentials=None):
     # Approximate integral I0, Rodden 1971, eq A.4
     # Approximate integral J0, Rodden 1971, eq A.8
     # These are the coefficients in exponential approximation of u/(1+u**2.0)**0.5
@@ -441,13 +990,9 @@ def laschka_approximation(u1, k1):
     c = 0.372
     j = 1j
     ejku = np.exp(-j * k1 * u1)  # pre-multiplication
-    I0 = 0.0
-    J0 = 0.0
-    for n, a in zip(range(1, 12), a11):
-        nck = n ** 2.0 * c ** 2.0 + k1 ** 2.0
-        I0 += a * np.exp(-n * c * u1) / nck * (n * c - j * k1)
-        J0 += a * np.exp(-n * c * u1) / nck ** 2.0 * (n ** 2.0 * c ** 2.0 - k1 ** 2.0 + n * c * u1 * nck
-                                                      - j * k1 * (2.0 * n * c + u1 * nck))
+    if exponentials is None:
+        exponentials = integral_exponentials(u1, 'Laschka')
+    I0, J0 = exponential_series(u1, k1, a11, [n * c for n in range(1, 12)], exponentials)
     # I1 as in Rodden 1971, eq A.1
     I1 = (1.0 - u1 / (1.0 + u1 ** 2.0) ** 0.5 - 1j * k1 * I0) * ejku
     # I2 as in Rodden 1971, eq A.6,
@@ -458,6 +1003,109 @@ def laschka_approximation(u1, k1):
     return I1, I2
 
 
+def integral_table():
+    # Tables of A1 = I1*exp(j*k1*u1) and A2 = I2*exp(j*k1*u1) of the Desmarais approximation. In contrast to I0 and
+    # J0, which are multiplied with k1 and k1**2 in eq A.1 and A.6, A1 and A2 are bounded and smooth. The tables use
+    # the coordinates x = u1/(c_u+u1) and y = k1/(c_k+k1), which resolve small values of u1 and k1 with more points.
+    # The number of grid points is doubled until the error of the bilinear interpolation, checked against the
+    # Desmarais approximation at the midpoints between all grid points, is below TABULATED_TOLERANCE.
+    # The tables are stored in single precision, which adds an error of less than 1e-7.
+    if INTEGRAL_TABLE:
+        return INTEGRAL_TABLE
+    n = [257, 257]
+    while True:
+        x, y = [np.linspace(0.0, limit / (c + limit), n_i) for limit, c, n_i in zip(TABULATED_DOMAIN, TABULATED_SCALE, n)]
+        A = tabulated_values(x[:, None], y[None, :])
+        # errors at the midpoints in u1 direction, in k1 direction and at the centers of the cells
+        xm = 0.5 * (x[:-1] + x[1:])
+        ym = 0.5 * (y[:-1] + y[1:])
+        errors = [max(np.abs(0.5 * (a[:-1] + a[1:]) - b).max()
+                      for a, b in zip(A, tabulated_values(xm[:, None], y[None, :]))),
+                  max(np.abs(0.5 * (a[:, :-1] + a[:, 1:]) - b).max()
+                      for a, b in zip(A, tabulated_values(x[:, None], ym[None, :]))),
+                  max(np.abs(0.25 * (a[:-1, :-1] + a[1:, :-1] + a[:-1, 1:] + a[1:, 1:]) - b).max()
+                      for a, b in zip(A, tabulated_values(xm[:, None], ym[None, :])))]
+        if max(errors) <= TABULATED_TOLERANCE or max(n) > 4096:
+            break
+        # refine in the direction(s) with the larger error
+        for i in range(2):
+            if errors[i] > 0.5 * TABULATED_TOLERANCE or errors[i] >= errors[1 - i]:
+                n[i] = 2 * n[i] - 1
+    if max(errors) > TABULATED_TOLERANCE:
+        logging.warning('Tabulated integrals do not meet the tolerance of {}, the error is {}.'.format(
+            TABULATED_TOLERANCE, max(errors)))
+    logging.debug('Tabulated integrals with {} x {} points, the error is {}.'.format(n[0], n[1], max(errors)))
+    INTEGRAL_TABLE.update({'x_max': x[-1], 'y_max': y[-1], 'shape': tuple(n), 'error': max(errors),
+                           'A1': A[0].astype('complex64').ravel(), 'A2': A[1].astype('complex64').ravel()})
+    return INTEGRAL_TABLE
+
+
+def tabulated_values(x, y):
+    # A1 and A2 of integral_table() at the coordinates x = u1/(c_u+u1) and y = k1/(c_k+k1)
+    u1, k1 = np.broadcast_arrays(TABULATED_SCALE[0] * x / (1.0 - x), TABULATED_SCALE[1] * y / (1.0 - y))
+    I1, I2 = desmarais_approximation(u1, k1)
+    ejku = np.exp(1j * k1 * u1)
+    return I1 * ejku, I2 * ejku
+
+
+def table_position(u, axis):
+    # Index of the grid point left of u (u1 for axis=0, k1 for axis=1), the weight for linear interpolation and
+    # whether u is inside of the table.
+    table = integral_table()
+    n = table['shape'][axis]
+    limit = [table['x_max'], table['y_max']][axis]
+    inside = u <= TABULATED_DOMAIN[axis]
+    # values outside (including inf and nan) are placed at the origin and evaluated separately
+    position = np.where(inside, u / (TABULATED_SCALE[axis] + u), 0.0) * ((n - 1) / limit)
+    index = np.minimum(position.astype(np.intp), n - 2)
+    return index, position - index, inside
+
+
+def tabulated_approximation(u1, k1, position=None):
+    # Bilinear interpolation of I1,2 of the Desmarais approximation from integral_table(),
+    # position = optional, the frequency independent table_position() of u1
+    table = integral_table()
+    if position is None:
+        position = table_position(u1, 0)
+    iu, wu, inside_u = position
+    ik, wk, inside_k = table_position(k1, 1)
+    n_k = table['shape'][1]
+    index = iu * n_k + ik
+    I12 = []
+    for A in [table['A1'], table['A2']]:
+        I12.append((1.0 - wu) * ((1.0 - wk) * A.take(index) + wk * A.take(index + 1))
+                   + wu * ((1.0 - wk) * A.take(index + n_k) + wk * A.take(index + n_k + 1)))
+    ejku = np.exp(-1j * k1 * u1)
+    I1, I2 = [(I * ejku).astype(np.result_type(u1, 'complex64'), copy=False) for I in I12]
+    # outside of the table
+    outside = ~(inside_u & inside_k)
+    if np.any(outside):
+        u1_outside = np.broadcast_to(u1, outside.shape)[outside]
+        I1[outside], I2[outside] = desmarais_approximation(u1_outside, np.broadcast_to(k1, outside.shape)[outside])
+    return I1, I2
+
+
+def exponential_series(u1, k1, coefficients, exponents, exponentials):
+    # Approximate integrals I0 and J0 as a sum of exponential terms a*exp(-s*u1), Rodden 1971, eq A.4 and A.8,
+    # with the frequency independent exponentials exp(-s*u1) given. The real and imaginary parts are summed
+    # separately, which avoids most of the (expensive) complex valued arithmetic on large arrays.
+    k1k1 = k1 ** 2.0
+    I0_real = 0.0
+    I0_imag = 0.0
+    J0_real = 0.0
+    J0_imag = 0.0
+    for a, s, exp_su in zip(coefficients, exponents, exponentials):
+        nck = s ** 2.0 + k1k1
+        w = a * exp_su / nck
+        I0_real += w * s
+        I0_imag -= w * k1
+        w /= nck
+        unck = u1 * nck
+        J0_real += w * (s ** 2.0 - k1k1 + s * unck)
+        J0_imag -= w * k1 * (2.0 * s + unck)
+    return I0_real + 1j * I0_imag, J0_real + 1j * J0_imag
+
+
 def watkins_approximation(u1, k1):
     # This is the old/original approximation of integrals I1,2 as in Rodden 1968, page 3.
     # The following code is take from the previous Matlab implementation of the DLM,
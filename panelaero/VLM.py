@@ -1,10 +1,22 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8 -*-
-import copy
+import functools
 import numpy as np
 
+from panelaero import grid, linalg, parallel
 
-def calc_induced_velocities(aerogrid, Ma):
+
+# Approximate number of temporary arrays (each of size n_rows x n) that are alive at the same time during the
+# assembly of one block of receiving panels. This is used to translate a memory budget into a number of rows.
+N_TEMPORARIES = 40
+
+# Number of elements (receiving x sending panels) of one block of rows. The matrices are assembled block by block,
+# which is considerably faster when the temporary arrays of one block fit into the cache, see row_blocks().
+BLOCK_SIZE = 2 ** 14
+
+
+def calc_induced_velocities(aerogrid, Ma, max_memory=None, geometry=None, xz_symmetry=False, dtype='float64',
+                            n_threads=None):
     #
     #                   l_2
     #             4 o---------o 3
@@ -15,38 +27,166 @@ def calc_induced_velocities(aerogrid, Ma):
     #         y         l_1
     #         |
     #        z.--- x
+    #
+    # The matrices are assembled in cache-sized blocks of receiving panels (rows), see row_blocks().
+    # max_memory = optional memory budget in bytes for the temporary arrays. If given, the blocks are limited so
+    # that the peak memory is the output plus approximately max_memory.
+    # geometry = optional, Mach number independent quantities from calc_geometry(), which are re-used when given.
+    # xz_symmetry = optional, False, True / 'symmetric' or 'antisymmetric', the influence of the mirrored panels
+    # is included, see calc_Qjj().
+    # dtype = optional, 'float32' to assemble the matrices in single precision, see calc_Qjj().
+    # n_threads = optional, the blocks are assembled on a pool of threads, see parallel.run_threads().
 
     # define downwash location (3/4 chord and half span of the aero panel)
-    P0 = aerogrid['offset_j']
     # define vortex location points
-    P1 = aerogrid['offset_P1']
-    P3 = aerogrid['offset_P3']
     # P2 = mid-point between P1 and P3, not used
-    # normal vector part in vertical direction
-    n_hat_w = np.array(aerogrid['N'][:, 2], ndmin=2).T.repeat(aerogrid['n'], axis=1)
-    # normal vector part in lateral direction
-    n_hat_wl = np.array(aerogrid['N'][:, 1], ndmin=2).T.repeat(aerogrid['n'], axis=1)
+    P0, P1, P3 = scale_points(aerogrid, Ma, dtype)
+    N = np.asarray(aerogrid['N'], dtype=dtype)
+    sign = symmetry_sign(xz_symmetry)
+
+    n = aerogrid['n']
+    D1 = np.empty((n, n), dtype=dtype)
+    D2 = np.empty((n, n), dtype=dtype)
+    D3 = np.empty((n, n), dtype=dtype)
+    parallel.run_threads(functools.partial(calc_induced_velocities_rows, (D1, D2, D3), P0, P1, P3, N, geometry, sign),
+                         row_blocks(n, max_memory, np.dtype(dtype).itemsize), n_threads)
+    return D1, D2, D3
+
+
+def calc_induced_velocities_rows(outputs, P0, P1, P3, N, geometry, sign, rows):
+    # Assemble one block of rows and write it into the outputs, which are either D1, D2 and D3 (see
+    # calc_induced_velocities()) or the sums D1 + D2 + D3 and D2 + D3 (see calc_induced_velocities_sums()).
+    D1, D2, D3 = calc_induced_velocities_xz_symmetry_block(P0[rows], P1, P3, N[rows], slice_geometry(geometry, rows),
+                                                           sign)
+    if len(outputs) == 3:
+        outputs[0][rows], outputs[1][rows], outputs[2][rows] = D1, D2, D3
+    else:
+        outputs[0][rows] = D1 + D2 + D3
+        outputs[1][rows] = D2 + D3
 
+
+def scale_points(aerogrid, Ma, dtype='float64'):
     # divide x coordinates with beta
     # See Hedman 1965.
     # However, Hedman divides by beta^2 ... why??
-    beta = (1 - (Ma ** 2.0)) ** 0.5
-    P0[:, 0] = P0[:, 0] / beta
-    P1[:, 0] = P1[:, 0] / beta
-    P3[:, 0] = P3[:, 0] / beta
+    # The scaling is applied to copies of the points so that the aerogrid itself is not modified.
+    beta = (1 - (float(Ma) ** 2.0)) ** 0.5
+    points = []
+    for key in ['offset_j', 'offset_P1', 'offset_P3']:
+        P = np.array(aerogrid[key], dtype=dtype)
+        P[:, 0] = P[:, 0] / beta
+        points.append(P)
+    return points
+
+
+def row_blocks(n, max_memory=None, itemsize=8):
+    # Split the n receiving panels into blocks of rows with BLOCK_SIZE elements. With a memory budget, the blocks
+    # are reduced further (if necessary) such that the temporary arrays of one block fit into max_memory (in bytes).
+    n_rows = max(1, BLOCK_SIZE // n)
+    if max_memory is not None:
+        n_rows = max(1, min(n_rows, int(max_memory // (N_TEMPORARIES * n * itemsize))))
+    for i in range(0, n, n_rows):
+        yield slice(i, min(i + n_rows, n))
+
+
+def calc_geometry(aerogrid, xz_symmetry=False, dtype='float64'):
+    # The Prandtl-Glauert scaling only affects the x coordinates. All pairwise quantities that depend
+    # only on the y and z coordinates are the same for all Mach numbers and can be calculated once per
+    # aerogrid, e.g. for a sweep over Mach numbers. Note that this stores seven full n x n matrices.
+    # With xz_symmetry, the same quantities for the mirrored sending panels are stored in addition.
+    P0, P1, P3 = [np.asarray(aerogrid[key], dtype=dtype) for key in ['offset_j', 'offset_P1', 'offset_P3']]
+    geometry = calc_geometry_block(P0, P1, P3)
+    if symmetry_sign(xz_symmetry) is not None:
+        P1_mirror, P3_mirror = mirror_points(P1, P3)
+        geometry['mirror'] = calc_geometry_block(P0, P1_mirror, P3_mirror)
+    return geometry
+
+
+def calc_geometry_block(P0, P1, P3):
+    # See Katz & Plotkin, Chapter 10.4.5, y and z components of r1 and r2
+    r1y = np.array(P0[:, 1], ndmin=2).T - np.array(P1[:, 1], ndmin=2)
+    r1z = np.array(P0[:, 2], ndmin=2).T - np.array(P1[:, 2], ndmin=2)
+    r2y = np.array(P0[:, 1], ndmin=2).T - np.array(P3[:, 1], ndmin=2)
+    r2z = np.array(P0[:, 2], ndmin=2).T - np.array(P3[:, 2], ndmin=2)
+    geometry = {'r1y': r1y,
+                'r1z': r1z,
+                'r2y': r2y,
+                'r2z': r2z,
+                # x component of r1 x r2
+                'r1Xr2_x': r1y * r2z - r1z * r2y,
+                # distances to the inner and outer semi-infinite vortex lines, see Katz & Plotkin, Chapter 10.4.7
+                'd2': (r1y ** 2.0 + r1z ** 2.0) ** 0.5,
+                'd3': (r2y ** 2.0 + r2z ** 2.0) ** 0.5,
+                }
+    return geometry
+
+
+def slice_geometry(geometry, rows):
+    # Select a block of receiving panels from the pre-calculated geometry (views, no copies).
+    if geometry is None:
+        return None
+    return {key: slice_geometry(value, rows) if key == 'mirror' else value[rows] for key, value in geometry.items()}
+
+
+def symmetry_sign(xz_symmetry):
+    # Sign of the influence of the mirrored (left hand side) panels onto the right hand side, see calc_Qjj().
+    # None means that there is no symmetry.
+    if xz_symmetry is None or xz_symmetry is False:
+        return None
+    elif xz_symmetry is True or xz_symmetry == 'symmetric':
+        return 1.0
+    elif xz_symmetry == 'antisymmetric':
+        return -1.0
+    raise ValueError('Unknown xz_symmetry {}, use False, True / \'symmetric\' or \'antisymmetric\'.'.format(xz_symmetry))
+
+
+def mirror_points(P1, P3):
+    # Mirror the corner points P1 and P3 at the xz-plane (y -> -y), returns copies. The points are swapped so
+    # that the mirrored panels are defined from left to right, see mirror_xz().
+    P1_mirror = np.array(P3)
+    P1_mirror[:, 1] = -P1_mirror[:, 1]
+    P3_mirror = np.array(P1)
+    P3_mirror[:, 1] = -P3_mirror[:, 1]
+    return P1_mirror, P3_mirror
+
+
+def calc_induced_velocities_xz_symmetry_block(P0, P1, P3, N, geometry=None, sign=None):
+    # Same as calc_induced_velocities_block(), plus the influence of the mirrored sending panels multiplied with
+    # sign (None = no symmetry).
+    D1, D2, D3 = calc_induced_velocities_block(P0, P1, P3, N, geometry)
+    if sign is not None:
+        geometry_mirror = None if geometry is None else geometry.get('mirror')
+        P1_mirror, P3_mirror = mirror_points(P1, P3)
+        D1_mirror, D2_mirror, D3_mirror = calc_induced_velocities_block(P0, P1_mirror, P3_mirror, N, geometry_mirror)
+        D1 += sign * D1_mirror
+        D2 += sign * D2_mirror
+        D3 += sign * D3_mirror
+    return D1, D2, D3
+
+
+def calc_induced_velocities_block(P0, P1, P3, N, geometry=None):
+    # Induced velocities at the receiving points P0 (one row per receiving panel with normal vectors N)
+    # due to the horseshoe vortices from P1 to P3 (one column per sending panel).
+    # The x coordinates are expected to be scaled with beta already.
+    if geometry is None:
+        geometry = calc_geometry_block(P0, P1, P3)
+    r1y = geometry['r1y']
+    r1z = geometry['r1z']
+    r2y = geometry['r2y']
+    r2z = geometry['r2z']
+
+    # normal vector part in vertical direction
+    n_hat_w = np.array(N[:, 2], ndmin=2).T
+    # normal vector part in lateral direction
+    n_hat_wl = np.array(N[:, 1], ndmin=2).T
 
     # See Katz & Plotkin, Chapter 10.4.5
     # get r1,r2,r0
     r1x = np.array(P0[:, 0], ndmin=2).T - np.array(P1[:, 0], ndmin=2)
-    r1y = np.array(P0[:, 1], ndmin=2).T - np.array(P1[:, 1], ndmin=2)
-    r1z = np.array(P0[:, 2], ndmin=2).T - np.array(P1[:, 2], ndmin=2)
-
     r2x = np.array(P0[:, 0], ndmin=2).T - np.array(P3[:, 0], ndmin=2)
-    r2y = np.array(P0[:, 1], ndmin=2).T - np.array(P3[:, 1], ndmin=2)
-    r2z = np.array(P0[:, 2], ndmin=2).T - np.array(P3[:, 2], ndmin=2)
 
     # Step 1
-    r1Xr2_x = r1y * r2z - r1z * r2y
+    r1Xr2_x = geometry['r1Xr2_x']
     r1Xr2_y = -r1x * r2z + r1z * r2x  # Plus-Zeichen Abweichung zu Katz & Plotkin ??
     r1Xr2_z = r1x * r2y - r1y * r2x
     mod_r1Xr2 = (r1Xr2_x ** 2.0 + r1Xr2_y ** 2.0 + r1Xr2_z ** 2.0) ** 0.5
@@ -57,8 +197,7 @@ def calc_induced_velocities(aerogrid, Ma):
     r0r1 = (P3[:, 0] - P1[:, 0]) * r1x + (P3[:, 1] - P1[:, 1]) * r1y + (P3[:, 2] - P1[:, 2]) * r1z
     r0r2 = (P3[:, 0] - P1[:, 0]) * r2x + (P3[:, 1] - P1[:, 1]) * r2y + (P3[:, 2] - P1[:, 2]) * r2z
     # Step 5
-    gamma = np.ones((aerogrid['n'], aerogrid['n']))
-    D1_base = gamma / 4.0 / np.pi / mod_r1Xr2 ** 2.0 * (r0r1 / r1 - r0r2 / r2)
+    D1_base = 1.0 / 4.0 / np.pi / mod_r1Xr2 ** 2.0 * (r0r1 / r1 - r0r2 / r2)
     D1_v = r1Xr2_y * D1_base
     D1_w = r1Xr2_z * D1_base
     # Step 3
@@ -83,7 +222,7 @@ def calc_induced_velocities(aerogrid, Ma):
 
     # See Katz & Plotkin, Chapter 10.4.7
     # induced velocity due to inner semi-infinite vortex line
-    d2 = (r1y ** 2.0 + r1z ** 2.0) ** 0.5
+    d2 = geometry['d2']
     cosBB1 = 1.0
     cosBB2 = -r1x / r1
     cosGamma = r1y / d2
@@ -100,7 +239,7 @@ def calc_induced_velocities(aerogrid, Ma):
     D2 = D2_w * n_hat_w + D2_v * n_hat_wl
 
     # induced velocity due to outer semi-infinite vortex line
-    d3 = (r2y ** 2.0 + r2z ** 2.0) ** 0.5
+    d3 = geometry['d3']
     cosBB1 = r2x / r2
     cosBB2 = -1.0
     cosGamma = -r2y / d3
@@ -119,96 +258,277 @@ def calc_induced_velocities(aerogrid, Ma):
     return D1, D2, D3
 
 
-def mirror_aerogrid_xz(aerogrid):
-    tmp = copy.deepcopy(aerogrid)
+def mirror_xz(aerogrid):
+    # The mirror image of the panels at the xz-plane (left hand side). The corner points P1 and P3 are swapped,
+    # so that the mirrored panels are defined from left to right, like all other panels.
+    # Only the arrays of the panels are used (see select_panels()), the unchanged arrays are shared with the
+    # aerogrid, the mirrored arrays are new, so that the aerogrid is neither copied nor modified.
+    # For a grid.Aerogrid, the mirror image is an Aerogrid as well and is calculated only once.
+    if isinstance(aerogrid, grid.Aerogrid):
+        return aerogrid.cached('mirror_xz', lambda: grid.Aerogrid(mirror_xz(dict(aerogrid))))
+    tmp = {key: aerogrid[key] for key in grid.PANEL_KEYS if key in aerogrid}
+    tmp['n'] = aerogrid['n']
     # mirror y-coord
-    tmp['offset_j'][:, 1] = -tmp['offset_j'][:, 1]
-    tmp['offset_k'][:, 1] = -tmp['offset_k'][:, 1]
-    tmp['offset_l'][:, 1] = -tmp['offset_l'][:, 1]
-    tmp['offset_P1'][:, 1] = -tmp['offset_P1'][:, 1]
-    tmp['offset_P3'][:, 1] = -tmp['offset_P3'][:, 1]
-    tmp['N'][:, 1] = -aerogrid['N'][:, 1]
-    tmp['N'][:, 2] = -aerogrid['N'][:, 2]
-    # assemble both grids
-    aerogrid_xzsym = {'offset_j': np.vstack((aerogrid['offset_j'], tmp['offset_j'])),
-                      'offset_k': np.vstack((aerogrid['offset_k'], tmp['offset_l'])),
-                      'offset_l': np.vstack((aerogrid['offset_k'], tmp['offset_l'])),
-                      'offset_P1': np.vstack((aerogrid['offset_P1'], tmp['offset_P1'])),
-                      'offset_P3': np.vstack((aerogrid['offset_P3'], tmp['offset_P3'])),
-                      'N': np.vstack((aerogrid['N'], tmp['N'])),
-                      'A': np.hstack((aerogrid['A'], tmp['A'])),
-                      'l': np.hstack((aerogrid['l'], tmp['l'])),
-                      'n': aerogrid['n'] * 2,
-                      }
-    return aerogrid_xzsym
-
-
-def calc_Ajj(aerogrid, Ma):
-    D1, D2, D3 = calc_induced_velocities(aerogrid, Ma)
-    # define area, chord length and spann of each panel
-    A = aerogrid['A']
-    chord = aerogrid['l']
-    span = A / chord
-    # total D
-    D = D1 + D2 + D3
-    Ajj = D * 0.5 * A / span
-    Bjj = (D2 + D3) * 0.5 * A / span
+    for key in ['offset_j', 'offset_k', 'offset_l', 'N']:
+        if key in aerogrid:
+            tmp[key] = np.asarray(aerogrid[key]) * [1.0, -1.0, 1.0]
+    tmp['offset_P1'], tmp['offset_P3'] = mirror_points(aerogrid['offset_P1'], aerogrid['offset_P3'])
+    return tmp
+
+
+def select_panels(aerogrid, index):
+    # The panels index (index array or boolean mask) of the aerogrid as a new aerogrid.
+    panels = {key: aerogrid[key][index] for key in grid.PANEL_KEYS if key in aerogrid}
+    panels['n'] = panels['offset_j'].shape[0]
+    return panels
+
+
+def calc_induced_velocities_sums(aerogrid, Ma, max_memory=None, geometry=None, xz_symmetry=False, dtype='float64',
+                                 n_threads=None):
+    # Same as calc_induced_velocities(), but returns only the sums D1 + D2 + D3 and D2 + D3, which is
+    # all that is needed for the AIC matrices. Using blocks of receiving panels, the full D1, D2 and D3
+    # matrices are never stored and the results are identical to the summation of the full matrices.
+    n = aerogrid['n']
+    P0, P1, P3 = scale_points(aerogrid, Ma, dtype)
+    N = np.asarray(aerogrid['N'], dtype=dtype)
+    sign = symmetry_sign(xz_symmetry)
+
+    D = np.empty((n, n), dtype=dtype)
+    D23 = np.empty((n, n), dtype=dtype)
+    parallel.run_threads(functools.partial(calc_induced_velocities_rows, (D, D23), P0, P1, P3, N, geometry, sign),
+                         row_blocks(n, max_memory, np.dtype(dtype).itemsize), n_threads)
+    return D, D23
+
+
+def calc_Ajj(aerogrid, Ma, max_memory=None, geometry=None, xz_symmetry=False, dtype='float64', n_threads=None):
+    # define area and spann of each panel
+    A = np.asarray(aerogrid['A'], dtype=dtype)
+    span = grid.panel_quantities(aerogrid, dtype)['span']
+    # Assemble block by block and scale in-place, this avoids any further full-size temporaries.
+    Ajj, Bjj = calc_induced_velocities_sums(aerogrid, Ma, max_memory, geometry, xz_symmetry, dtype, n_threads)
+    for M in [Ajj, Bjj]:
+        M *= 0.5
+        M *= A
+        M /= span
     return Ajj, Bjj
 
 
-def calc_Qjj(aerogrid, Ma, xz_symmetry=False):
+def calc_Ajj_block(aerogrid, Ma, rows, cols, xz_symmetry=False, dtype='float64'):
+    # The blocks Ajj[rows][:, cols] and Bjj[rows][:, cols] of calc_Ajj() for the index arrays rows and cols,
+    # without assembling the whole matrices.
+    P0, P1, P3 = scale_points({'offset_j': aerogrid['offset_j'][rows], 'offset_P1': aerogrid['offset_P1'][cols],
+                               'offset_P3': aerogrid['offset_P3'][cols]}, Ma, dtype)
+    N = np.asarray(aerogrid['N'][rows], dtype=dtype)
+    D1, D2, D3 = calc_induced_velocities_xz_symmetry_block(P0, P1, P3, N, sign=symmetry_sign(xz_symmetry))
+    # see calc_Ajj(), the span (see grid.panel_quantities()) is only needed for the sending panels
+    A = np.asarray(aerogrid['A'][cols], dtype=dtype)
+    span = A / np.asarray(aerogrid['l'][cols], dtype=dtype)
+    scale = 0.5 * A / span
+    return (D1 + D2 + D3) * scale, (D2 + D3) * scale
+
+
+def calc_Ajj_update(aerogrid, previous_aerogrid, Ma, panels, Bjj, xz_symmetry=False, dtype='float64'):
+    # The change of Ajj from the previous_aerogrid to the aerogrid, where only the panels (index array or boolean
+    # mask) were modified, as low rank update Ajj + U.dot(V) (see linalg.low_rank_update()), and the updated Bjj.
+    # Only the rows and columns of the modified panels are calculated.
+    everything = np.arange(aerogrid['n'])
+    panels = everything[panels]
+    Ajj_rows, Bjj_rows = calc_Ajj_block(aerogrid, Ma, panels, everything, xz_symmetry, dtype)
+    Ajj_cols, Bjj_cols = calc_Ajj_block(aerogrid, Ma, everything, panels, xz_symmetry, dtype)
+    Ajj_rows_previous, _ = calc_Ajj_block(previous_aerogrid, Ma, panels, everything, xz_symmetry, dtype)
+    Ajj_cols_previous, _ = calc_Ajj_block(previous_aerogrid, Ma, everything, panels, xz_symmetry, dtype)
+    U, V = linalg.low_rank_update(panels, Ajj_rows - Ajj_rows_previous, Ajj_cols - Ajj_cols_previous)
+    Bjj = np.array(Bjj)
+    Bjj[panels] = Bjj_rows
+    Bjj[:, panels] = Bjj_cols
+    return U, V, Bjj
+
+
+def update_Qjj(aerogrid, previous_aerogrid, Ma, panels, Qjj, Bjj, xz_symmetry=False, dtype='float64'):
+    """
+    Update the result Qjj, Bjj of calc_Qjj() for the previous_aerogrid after some panels were modified, e.g. a
+    deflected control surface. Instead of O(n**2) assembly and O(n**3) inversion, only the rows and columns of the
+    r modified panels are calculated and Qjj is updated with the Woodbury formula in O(n**2 r) operations,
+    see linalg.update_inverse(). The number and the order of the panels must not change.
+    panels = index array or boolean mask of the modified panels
+    """
+    U, V, Bjj = calc_Ajj_update(aerogrid, previous_aerogrid, Ma, panels, Bjj, xz_symmetry, dtype)
+    return linalg.update_inverse(Qjj, U, V), Bjj
+
+
+def update_Qjj_factorization(aerogrid, previous_aerogrid, Ma, panels, factorization, Bjj, xz_symmetry=False,
+                             dtype='float64'):
+    # Same as update_Qjj() for the result of calc_Qjj_factorization(), see linalg.Factorization.update().
+    U, V, Bjj = calc_Ajj_update(aerogrid, previous_aerogrid, Ma, panels, Bjj, xz_symmetry, dtype)
+    return factorization.update(U, V), Bjj
+
+
+def calc_Qjj(aerogrid, Ma, xz_symmetry=False, max_memory=None, dtype='float64', refine=False, n_threads=None):
     '''
     Symmetry about xz-plane:
-    Only the right hand side is give. The (missing) left hand side is created virtually using mirror_aerogrid_xz().
-    The AIC matrix is calculated for the whole system and can be partitioned into terms:
+    Only the right hand side is give. The (missing) left hand side is the mirror image, see mirror_xz().
+    The AIC matrix of the whole system can be partitioned into terms:
     AIC = |RR|LR|
           |RL|LL|
     with
     RR - influence of right side onto right side,
     LL - influence of left side onto left side,
-    RL and LR - influence from left side onto right side. Due to symmetry, both term are identical.
-    Then, for symmetric motions: AIC_sym  = RR - LR
-    And, for asymmetric motions: AIC_asym = RR + LR  ??? -> to be checked !!!
+    RL and LR - influence from left side onto right side. Due to symmetry, RR = LL and both RL and LR are identical.
+    Then, for symmetric motions: AIC_sym  = RR + LR (xz_symmetry=True or 'symmetric')
+    And, for asymmetric motions: AIC_asym = RR - LR (xz_symmetry='antisymmetric')
+    Both matrices are assembled directly for the n panels of the right hand side, without the whole system.
+
+    Memory and threads:
+    The matrices are assembled in cache-sized blocks of receiving panels, with max_memory (in bytes), the blocks are
+    limited to the memory budget, see calc_induced_velocities(). With n_threads, the blocks are assembled on a pool
+    of threads, see parallel.run_threads().
+
+    Precision:
+    With dtype='float32', the matrices are assembled and inverted in single precision, which halves memory and
+    bandwidth. The relative error of Qjj is then in the order of 1e-6. With refine=True, Qjj is returned in double
+    precision, inverted in double precision from the assembled Ajj (see linalg.invert()). The mixed-precision
+    iterative refinement of a single precision factorization is used for solutions with few downwash vectors, see
+    calc_Qjj_factorization() and linalg.Factorization.
     '''
-    if xz_symmetry:
-        n = aerogrid['n']
-        aerogrid = mirror_aerogrid_xz(aerogrid)
-
     # The function calc_Ajj() is Mach number dependent, which involves a scaling of the aerogrid in x-direction.
-    # To make sure that the geometrical scaling has no effect on the following calculations, a 'fresh' a copy of the aerogrid,
-    # created with copy.deepcopy(), is handed over.
-    Ajj, Bjj = calc_Ajj(aerogrid=copy.deepcopy(aerogrid), Ma=Ma)
-    Qjj = -np.linalg.inv(Ajj)
-    if xz_symmetry:
-        return Qjj[0:n, 0:n] - Qjj[n:2 * n, 0:n], Bjj[0:n, 0:n] - Bjj[n:2 * n, 0:n]
+    # The scaling is applied to copies of the points only (see scale_points()), the aerogrid is not modified.
+    Ajj, Bjj = calc_Ajj(aerogrid=aerogrid, Ma=Ma, max_memory=max_memory, xz_symmetry=xz_symmetry,
+                        dtype=dtype, n_threads=n_threads)
+    Qjj = linalg.invert(Ajj, refine)
     return Qjj, Bjj
 
 
-def calc_Qjjs(aerogrid, Ma, xz_symmetry=False):
-    Qjj = np.zeros((len(Ma), aerogrid['n'], aerogrid['n']))  # dim: Ma,n,n
-    Bjj = np.zeros((len(Ma), aerogrid['n'], aerogrid['n']))  # dim: Ma,n,n
-    for i, i_Ma in enumerate(Ma):
-        Qjj[i, :, :], Bjj[i, :, :] = calc_Qjj(aerogrid, i_Ma, xz_symmetry)
+def calc_Qjj_factorization(aerogrid, Ma, xz_symmetry=False, max_memory=None, dtype='float64', refine=False):
+    # Same as calc_Qjj(), but returns a factorization of Ajj instead of Qjj, see linalg.Factorization.
+    # Use factorization.solve(wj) to apply Qjj to downwash vectors, factorization.Qjj forms the full matrix.
+    Ajj, Bjj = calc_Ajj(aerogrid, Ma, max_memory, xz_symmetry=xz_symmetry, dtype=dtype)
+    return linalg.Factorization(Ajj, overwrite=True, refine=refine), Bjj
+
+
+def calc_Qjjs(aerogrid, Ma, xz_symmetry=False, max_memory=None, n_workers=None, cache=None, out=None,
+              dtype='float64', refine=False, n_threads=None):
+    # Sweep over Mach numbers. The Mach number independent geometry (the y and z dependent terms) is calculated
+    # only once, per Mach number only the x dependent terms are updated and the system is solved.
+    # With a memory budget, the geometry is not stored (this would require seven full n x n matrices).
+    # With n_workers, the Mach numbers are distributed to a pool of worker processes, see parallel.run().
+    # With a cache (cache.AICCache), the results are read from the cache if available and stored otherwise.
+    # With out = (Qjj, Bjj), the results are written into these caller-supplied targets (dim: Ma,n,n), see write_result().
+    # With n_workers, numpy.memmap targets are written by the worker processes directly.
+    # With dtype and refine, the precision is selected, see calc_Qjj().
+    # With n_threads, the matrices of one Mach number are assembled on a pool of threads (without n_workers).
+    if cache is not None:
+        key = cache.key('VLM.calc_Qjjs', aerogrid, Ma=Ma, xz_symmetry=symmetry_sign(xz_symmetry),
+                        dtype=np.dtype(dtype).name, refine=refine)
+        Qjj_Bjj = cache.load(key)
+        if Qjj_Bjj is None:
+            Qjj_Bjj = calc_Qjjs(aerogrid, Ma, xz_symmetry, max_memory, n_workers, out=out, dtype=dtype, refine=refine,
+                                n_threads=n_threads)
+            cache.store(key, Qjj_Bjj)
+            return Qjj_Bjj
+        return write_results(Qjj_Bjj, out)
+
+    n = aerogrid['n']
+    # With refinement, Qjj is returned in double precision.
+    dtype_Qjj = np.result_type(dtype, 'float64') if refine else dtype
+    if n_workers is not None and n_workers > 1:
+        parameters = {'Ma': list(Ma), 'xz_symmetry': xz_symmetry, 'max_memory': max_memory, 'dtype': dtype,
+                      'refine': refine}
+        Qjj, Bjj = (None, None) if out is None else out
+        Qjj_Bjj = parallel.run(calc_Qjjs_task, list(range(len(Ma))), aerogrid,
+                               [((len(Ma), n, n), dtype_Qjj, Qjj), ((len(Ma), n, n), dtype, Bjj)], n_workers, parameters)
+        return write_results(Qjj_Bjj, out)
+
+    if out is None:
+        Qjj = np.zeros((len(Ma), n, n), dtype=dtype_Qjj)  # dim: Ma,n,n
+        Bjj = np.zeros((len(Ma), n, n), dtype=dtype)  # dim: Ma,n,n
+    else:
+        Qjj, Bjj = out
+    for i, (_, Qjj_i, Bjj_i) in enumerate(iter_Qjjs(aerogrid, Ma, xz_symmetry, max_memory, dtype, refine, n_threads)):
+        write_result(Qjj, i, Qjj_i)
+        write_result(Bjj, i, Bjj_i)
     return Qjj, Bjj
 
 
-def calc_Gamma(aerogrid, Ma, xz_symmetry=False):
-    if xz_symmetry:
-        n = aerogrid['n']
-        aerogrid = mirror_aerogrid_xz(aerogrid)
-    D1, D2, D3 = calc_induced_velocities(aerogrid, Ma)
-    # total D
-    Gamma = -np.linalg.inv((D1 + D2 + D3))
-    Q_ind = D2 + D3
+def write_result(out, index, M):
+    # Write one result into the output, e.g. a numpy array, a numpy.memmap or a chunked dataset (one chunk per matrix).
+    # On-disk targets with a flush() method are flushed immediately, so that the matrix can be dropped from memory.
+    out[index] = M
+    if hasattr(out, 'flush'):
+        out.flush()
+
+
+def write_results(results, out=None):
+    # Copy complete results (e.g. from the cache or the worker processes) into the outputs, one matrix after the other.
+    # Results which already are the outputs (e.g. written by the worker processes) are skipped.
+    if out is None:
+        return tuple(results)
+    for result, target in zip(results, out):
+        if result is target:
+            continue
+        for index in range(result.shape[0]):
+            write_result(target, index, result[index])
+    return tuple(out)
+
 
-    if xz_symmetry:
-        return Gamma[0:n, 0:n] - Gamma[n:2 * n, 0:n], Q_ind[0:n, 0:n] - Q_ind[n:2 * n, 0:n]
+def iter_Qjjs(aerogrid, Ma, xz_symmetry=False, max_memory=None, dtype='float64', refine=False, n_threads=None):
+    # Generator variant of calc_Qjjs(), yields (Ma, Qjj, Bjj) for one Mach number after the other, so that the
+    # matrices can be processed or written and then dropped instead of allocating the results for all Mach numbers.
+    geometry = calc_geometry(aerogrid, xz_symmetry, dtype) if max_memory is None else None
+    for i_Ma in Ma:
+        Qjj, Bjj = solve_Qjj(aerogrid, i_Ma, xz_symmetry, max_memory, geometry, dtype, refine, n_threads)
+        yield i_Ma, Qjj, Bjj
+
+
+def solve_Qjj(aerogrid, Ma, xz_symmetry, max_memory, geometry, dtype='float64', refine=False, n_threads=None):
+    Ajj, Bjj = calc_Ajj(aerogrid, Ma, max_memory, geometry, xz_symmetry, dtype, n_threads)
+    Qjj = linalg.invert(Ajj, refine)
+    return Qjj, Bjj
+
+
+def calc_Qjjs_task(state, item):
+    # Calculates one Mach number of calc_Qjjs() on a worker process and writes the results to the shared outputs.
+    parameters = state['parameters']
+    if 'geometry' not in state['cache']:
+        # The geometry is calculated only once per worker.
+        state['cache']['geometry'] = calc_geometry(state['aerogrid'], parameters['xz_symmetry'], parameters['dtype']) \
+            if parameters['max_memory'] is None else None
+    Qjj, Bjj = solve_Qjj(state['aerogrid'], parameters['Ma'][item], parameters['xz_symmetry'],
+                         parameters['max_memory'], state['cache']['geometry'], parameters['dtype'], parameters['refine'])
+    write_result(state['outputs'][0], item, Qjj)
+    write_result(state['outputs'][1], item, Bjj)
+
+
+def calc_Gamma(aerogrid, Ma, xz_symmetry=False, max_memory=None, geometry=None, dtype='float64'):
+    # total D and the part induced by the semi-infinite vortex lines
+    # dtype = optional, 'float32' to assemble and invert D in single precision, see calc_Qjj()
+    D, Q_ind = calc_induced_velocities_sums(aerogrid, Ma, max_memory, geometry, xz_symmetry, dtype)
+    Gamma = -np.linalg.inv(D)
     return Gamma, Q_ind
 
 
-def calc_Gammas(aerogrid, Ma, xz_symmetry=False):
-    Gamma = np.zeros((len(Ma), aerogrid['n'], aerogrid['n']))  # dim: Ma,n,n
-    Q_ind = np.zeros((len(Ma), aerogrid['n'], aerogrid['n']))  # dim: Ma,n,n
-    for i, i_Ma in enumerate(Ma):
-        Gamma[i, :, :], Q_ind[i, :, :] = calc_Gamma(aerogrid, i_Ma, xz_symmetry)
+def calc_Gamma_factorization(aerogrid, Ma, xz_symmetry=False, max_memory=None, dtype='float64'):
+    # Same as calc_Gamma(), but returns a factorization of D instead of Gamma, see linalg.Factorization.
+    D, Q_ind = calc_induced_velocities_sums(aerogrid, Ma, max_memory, xz_symmetry=xz_symmetry, dtype=dtype)
+    return linalg.Factorization(D, overwrite=True), Q_ind
+
+
+def calc_Gammas(aerogrid, Ma, xz_symmetry=False, max_memory=None, out=None, dtype='float64'):
+    # Sweep over Mach numbers, see calc_Qjjs().
+    n = aerogrid['n']
+    if out is None:
+        Gamma = np.zeros((len(Ma), n, n), dtype=dtype)  # dim: Ma,n,n
+        Q_ind = np.zeros((len(Ma), n, n), dtype=dtype)  # dim: Ma,n,n
+    else:
+        Gamma, Q_ind = out
+    for i, (_, Gamma_i, Q_ind_i) in enumerate(iter_Gammas(aerogrid, Ma, xz_symmetry, max_memory, dtype)):
+        write_result(Gamma, i, Gamma_i)
+        write_result(Q_ind, i, Q_ind_i)
     return Gamma, Q_ind
+
+
+def iter_Gammas(aerogrid, Ma, xz_symmetry=False, max_memory=None, dtype='float64'):
+    # Generator variant of calc_Gammas(), yields (Ma, Gamma, Q_ind) for one Mach number after the other, see iter_Qjjs().
+    geometry = calc_geometry(aerogrid, xz_symmetry, dtype) if max_memory is None else None
+    for i_Ma in Ma:
+        Gamma, Q_ind = calc_Gamma(aerogrid, i_Ma, xz_symmetry, max_memory, geometry, dtype)
+        yield i_Ma, Gamma, Q_ind
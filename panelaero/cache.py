@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache for AIC matrices, e.g. to share the results of VLM.calc_Qjjs() and DLM.calc_Qjjs() between
+loads, trim and flutter jobs using the same aerogrid. The entries are addressed by a hash of the aerogrid arrays and
+all parameters that influence the result (Ma, k, method, symmetry, precision and the backend of the DLM, so that the
+results of the numpy and the Numba backend are not mixed). Entries are written to a temporary file first and then
+renamed, so several processes can share one cache directory. Temporary files left behind by killed processes are
+removed after STALE_AGE. If a size limit is given, the least recently used entries are removed.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+from panelaero import grid
+
+# Increase this number whenever the results of the AIC calculations change, this invalidates all existing entries.
+CACHE_VERSION = 2
+# Temporary files older than this (in seconds) are left behind by killed processes and are removed, see evict().
+STALE_AGE = 3600.0
+
+
+class AICCache():
+
+    def __init__(self, directory, max_size=None):
+        # directory = the cache directory, created if necessary
+        # max_size = optional size limit in bytes, the least recently used entries are removed when exceeded
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, function, aerogrid, **parameters):
+        # The hash of the function name, the relevant aerogrid arrays and the parameters, e.g. Ma=[...], k=[...].
+        h = hashlib.sha256()
+        h.update('{} {} {}'.format(CACHE_VERSION, function, grid.digest(aerogrid)).encode())
+        parameters = {key: np.asarray(value, dtype=float).tolist() if key in ['Ma', 'k'] else value
+                      for key, value in parameters.items()}
+        h.update(json.dumps(parameters, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        # Returns the list of arrays stored for the key or None if there is no (readable) entry.
+        filename = self.filename(key)
+        try:
+            with np.load(filename, allow_pickle=False) as data:
+                arrays = [data['arr_{}'.format(i)] for i in range(len(data.files))]
+            # Mark the entry as recently used.
+            os.utime(filename)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            logging.warning('Could not read AIC cache entry {}, it will be re-calculated.'.format(filename))
+            return None
+        logging.info('Read AICs from cache: {}'.format(filename))
+        return arrays
+
+    def store(self, key, arrays):
+        # Write to a temporary file in the same directory and rename it, which is atomic.
+        fd, tmp_filename = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fid:
+                np.savez(fid, *arrays)
+            os.replace(tmp_filename, self.filename(key))
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+        self.evict()
+
+    def evict(self):
+        # Remove stale temporary files and the least recently used entries until the size limit is met.
+        self.remove_stale()
+        if self.max_size is None:
+            return
+        entries = []
+        for filename in glob.glob(os.path.join(self.directory, '*.npz')):
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, filename in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def remove_stale(self, age=STALE_AGE):
+        # Remove the temporary files older than age, younger files may still be written by another process.
+        now = time.time()
+        for filename in glob.glob(os.path.join(self.directory, '*.tmp')):
+            try:
+                if now - os.stat(filename).st_mtime > age:
+                    os.remove(filename)
+                    logging.info('Removed stale temporary file from AIC cache: {}'.format(filename))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for filename in glob.glob(os.path.join(self.directory, '*.npz')):
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+        self.remove_stale()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reader for the CAERO1 (Nastran) and CAERO7 (ZAERO) cards and construction of the aerogrid, see build_aerogrid().
+The cards may be given in small field, large field or free field format. The corner points of the panels are
+generated for all boxes of a card at once, the panels are connected to the corner points by a sorted index of the
+grid IDs and all quantities of the aerogrid are calculated for all panels in one pass, so that the setup time is
+small compared to the AIC matrices. The panels of each card are equally spaced (AEFACT cards are not supported) and
+the coordinates are given in the basic coordinate system (CP is only stored, not applied).
+"""
+import logging
+
+import numpy as np
+
+# The grid IDs of the corner points of file i start at i * GRID_ID_OFFSET
+GRID_ID_OFFSET = 100000
+
+
+def build_aerogrid(filenames):
+    """
+    Read the CAERO1 and CAERO7 cards from one or more bulk data files and return the aerogrid (dictionary), with the
+    same items as built by the tutorials (doc/tutorials/helper_functions/build_aeromodel.py):
+    ID, l, A, N, offset_l, offset_k, offset_j, offset_P1, offset_P3, r, set_l, set_k, set_j, CD, CP, n, coord_desc,
+    cornerpoint_panels and cornerpoint_grids
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    grids = []
+    panels = []
+    for i_file, filename in enumerate(filenames):
+        grids_i, panels_i = build_panels(read_cards(filename), i_file * GRID_ID_OFFSET)
+        grids.append(grids_i)
+        panels.append(panels_i)
+    grids = {key: np.concatenate([grids_i[key] for grids_i in grids]) for key in ['ID', 'offset']}
+    panels = {key: np.concatenate([panels_i[key] for panels_i in panels]) for key in ['ID', 'CP', 'cornerpoints']}
+    return calc_aerogrid(grids, panels)
+
+
+def read_cards(filename):
+    # The CAERO1 and CAERO7 cards of the file as a list of dictionaries with the keys of build_panels().
+    cards = []
+    for name, fields in read_bulk_data(filename, ['CAERO1', 'CAERO7']):
+        if name == 'CAERO1':
+            # EID, PID, CP, NSPAN, NCHORD, LSPAN, LCHORD, IGID / X1, Y1, Z1, X12, X4, Y4, Z4, X43
+            card = {'EID': to_int(fields[0]), 'CP': to_int(fields[2]),
+                    'n_span': to_int(fields[3]), 'n_chord': to_int(fields[4]),
+                    'X1': to_float(fields[8:11]), 'length12': to_float(fields[11]),
+                    'X4': to_float(fields[12:15]), 'length43': to_float(fields[15])}
+        else:
+            # ZAERO uses three lines and the number of divisions instead of the number of boxes:
+            # WID, LABEL, ACOORD, NSPAN, NCHORD, ... / XRL, YRL, ZRL, RCH, ... / XTL, YTL, ZTL, TCH, ...
+            card = {'EID': to_int(fields[0]), 'CP': to_int(fields[2]),
+                    'n_span': to_int(fields[3]) - 1, 'n_chord': to_int(fields[4]) - 1,
+                    'X1': to_float(fields[8:11]), 'length12': to_float(fields[11]),
+                    'X4': to_float(fields[16:19]), 'length43': to_float(fields[19])}
+        if card['n_span'] <= 0 or card['n_chord'] <= 0:
+            raise ValueError('{} {}: only equally spaced boxes are supported, AEFACT cards are not supported by '
+                             'this reader.'.format(name, card['EID']))
+        cards.append(card)
+    logging.info('Read {} CAERO1 / CAERO7 cards from {}'.format(len(cards), filename))
+    return cards
+
+
+def read_bulk_data(filename, names):
+    # Yields (name, fields) for all cards with the given names, fields is the list of all data fields of the card
+    # (without the name and the continuation fields), eight fields per line in small field format.
+    name = None
+    fields = []
+    with open(filename, 'r') as fid:
+        for line in fid:
+            line = line.rstrip('\r\n')
+            if line.startswith('$') or not line.strip():
+                continue
+            first, data = split_line(line)
+            if first[:1] in ['+', '*', ''] or first.startswith(','):
+                # continuation line
+                if name is not None:
+                    fields += data
+                continue
+            if name is not None:
+                yield name, fields
+            name = first.rstrip('*').upper()
+            fields = data
+            if name not in names:
+                name = None
+    if name is not None:
+        yield name, fields
+
+
+def split_line(line):
+    # The first field (name or continuation) and the eight data fields of one line. With large field format
+    # (name with *), two lines with four data fields each correspond to one line in small field format.
+    if ',' in line:
+        fields = [field.strip() for field in line.split(',')]
+        return fields[0], (fields[1:9] + [''] * 8)[:8]
+    line = line.ljust(80)
+    first = line[:8].strip()
+    if first.endswith('*') or first == '*':
+        return first, [line[8 + 16 * i:24 + 16 * i].strip() for i in range(4)]
+    return first, [line[8 + 8 * i:16 + 8 * i].strip() for i in range(8)]
+
+
+def to_int(field, default=0):
+    field = field.strip()
+    return int(field) if field else default
+
+
+def to_float(fields, default=0.0):
+    # Nastran numbers, including the short exponent format, e.g. 1.5-3 = 1.5E-3, and the exponent D of double
+    # precision, e.g. 1.5D-3 = 1.5E-3
+    if isinstance(fields, list):
+        return np.array([to_float(field, default) for field in fields])
+    fields = fields.strip().upper().replace('D', 'E')
+    if not fields:
+        return default
+    try:
+        return float(fields)
+    except ValueError:
+        mantissa = fields[0] + fields[1:].replace('-', 'E-').replace('+', 'E+')
+        return float(mantissa)
+
+
+def build_panels(cards, first_grid_ID=0):
+    # The corner points (grids) and the panels of the cards, each with n_chord x n_span boxes, the grid IDs start
+    # at first_grid_ID and increase along the chord first, then along the span.
+    grid_IDs = []
+    offsets = []
+    panel_IDs = []
+    CPs = []
+    cornerpoints = []
+    grid_ID = first_grid_ID
+    for card in cards:
+        n_chord, n_span = card['n_chord'], card['n_span']
+        X1, X4 = card['X1'], card['X4']
+        # calculate LE, Root and Tip vectors [x,y,z]^T
+        LE = X4 - X1
+        Root = np.array([card['length12'], 0.0, 0.0])
+        Tip = np.array([card['length43'], 0.0, 0.0])
+        # assume equidistant spacing
+        d_chord = np.linspace(0.0, 1.0, n_chord + 1)[None, :, None]
+        d_span = np.linspace(0.0, 1.0, n_span + 1)[:, None, None]
+        # dim: span, chord, xyz
+        offsets.append((X1 + LE * d_span + (Root * (1.0 - d_span) + Tip * d_span) * d_chord).reshape(-1, 3))
+        grids_map = grid_ID + np.arange((n_span + 1) * (n_chord + 1)).reshape(n_span + 1, n_chord + 1)
+        grid_IDs.append(grids_map.ravel())
+        grid_ID += grids_map.size
+        # corner points 1 to 4 of the boxes, dim: span, chord
+        cornerpoints.append(np.stack([grids_map[:-1, :-1], grids_map[:-1, 1:], grids_map[1:, 1:],
+                                      grids_map[1:, :-1]], axis=-1).reshape(-1, 4))
+        panel_IDs.append(card['EID'] + np.arange(n_span * n_chord))
+        CPs.append(np.full(n_span * n_chord, card['CP']))
+    grids = {'ID': np.concatenate(grid_IDs or [np.zeros(0, dtype=int)]),
+             'offset': np.concatenate(offsets or [np.zeros((0, 3))])}
+    panels = {'ID': np.concatenate(panel_IDs or [np.zeros(0, dtype=int)]),
+              'CP': np.concatenate(CPs or [np.zeros(0, dtype=int)]),
+              'cornerpoints': np.concatenate(cornerpoints or [np.zeros((0, 4), dtype=int)])}
+    return grids, panels
+
+
+def find_grids(grid_IDs, IDs):
+    # Position of the IDs in the array of grid IDs, using a sorted index instead of a search per ID.
+    order = np.argsort(grid_IDs, kind='stable')
+    position = np.minimum(np.searchsorted(grid_IDs[order], IDs), order.size - 1)
+    index = order[position]
+    missing = grid_IDs[index] != IDs
+    if np.any(missing):
+        raise ValueError('Grid IDs {} not found.'.format(np.unique(IDs[missing])))
+    return index
+
+
+def calc_aerogrid(grids, panels):
+    #
+    #                   l_2
+    #             4 o---------o 3
+    #               |         |
+    #  u -->    b_1 | l  k  j | b_2
+    #               |         |
+    #             1 o---------o 2
+    #         y         l_1
+    #         |
+    #        z.--- x
+    #
+    index = find_grids(grids['ID'], panels['cornerpoints'])
+    P1, P2, P3, P4 = [grids['offset'][index[:, i]] for i in range(4)]
+    l_1 = P2 - P1
+    l_2 = P3 - P4
+    b_1 = P4 - P1
+    l_m = (l_1 + l_2) / 2.0
+    b_m = (b_1 + (P3 - P2)) / 2.0
+    normal = np.cross(l_1, b_1)
+    n = panels['ID'].size
+    aerogrid = {'ID': panels['ID'],
+                'l': l_m[:, 0],  # length of panel
+                'A': np.linalg.norm(np.cross(l_m, b_m), axis=1),  # area of one panel
+                'N': normal / np.linalg.norm(normal, axis=1)[:, None],  # unit normal vector
+                'offset_l': P1 + 0.25 * l_m + 0.50 * b_1,  # 25% point l
+                'offset_k': P1 + 0.50 * l_m + 0.50 * b_1,  # 50% point k
+                'offset_j': P1 + 0.75 * l_m + 0.50 * b_1,  # 75% downwash control point j
+                'offset_P1': P1 + 0.25 * l_1,  # Vortex point at 25% chord, 0% span
+                'offset_P3': P4 + 0.25 * l_2,  # Vortex point at 25% chord, 100% span
+                'r': (P4 + 0.25 * l_2) - (P1 + 0.25 * l_1),  # vector P1 to P3, span of panel
+                'set_l': np.arange(n * 6).reshape((n, 6)),
+                'set_k': np.arange(n * 6).reshape((n, 6)),
+                'set_j': np.arange(n * 6).reshape((n, 6)),
+                'CD': panels['CP'],
+                'CP': panels['CP'],
+                'n': n,
+                'coord_desc': 'bodyfixed',
+                'cornerpoint_panels': panels['cornerpoints'],
+                'cornerpoint_grids': np.hstack((grids['ID'][:, None], grids['offset'])),
+                }
+    return aerogrid
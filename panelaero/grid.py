@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Array-backed aerogrid, see Aerogrid. The arrays of the panels used by the solvers are stored in one contiguous block
+of memory (one C-contiguous array per key, struct of arrays), are read-only and are accessed like the items of the
+plain dictionary, e.g. aerogrid['offset_j'], so that the Aerogrid can be used wherever a dictionary is accepted.
+Quantities derived from the panels (see panel_quantities()) are calculated only once per Aerogrid.
+"""
+from collections.abc import Mapping
+import hashlib
+
+import numpy as np
+
+# The arrays of the aerogrid which describe the panels and which are used by the solvers. All other items of the
+# aerogrid (e.g. the corner points or the set IDs) are ignored.
+PANEL_KEYS = ['offset_j', 'offset_k', 'offset_l', 'offset_P1', 'offset_P3', 'N', 'A', 'l']
+
+
+class Aerogrid(Mapping):
+    """
+    Immutable aerogrid, constructed from a dictionary (or any mapping) with the usual items of the aerogrid, e.g. as
+    built from the CAERO cards. The arrays of the panels (PANEL_KEYS) are copied into one block, all other items
+    (e.g. ID, set_j, cornerpoint_grids) are kept as read-only copies. Use select() for subsets of panels, which are
+    views into the same block for slices (zero-copy).
+    """
+    __slots__ = ('n', 'data', 'arrays', 'items_other', 'cache')
+
+    def __init__(self, aerogrid):
+        arrays = [np.asarray(aerogrid[key], dtype=float) for key in PANEL_KEYS]
+        data = np.empty(sum(array.size for array in arrays))
+        views = {}
+        offset = 0
+        for key, array in zip(PANEL_KEYS, arrays):
+            views[key] = data[offset:offset + array.size].reshape(array.shape)
+            views[key][...] = array
+            offset += array.size
+        items_other = {key: read_only(np.array(value)) if isinstance(value, np.ndarray) else value
+                       for key, value in aerogrid.items() if key not in views and key != 'n'}
+        self.initialize(int(aerogrid['n']), read_only(data), {key: read_only(view) for key, view in views.items()},
+                        items_other)
+
+    def initialize(self, n, data, arrays, items_other):
+        object.__setattr__(self, 'n', n)
+        object.__setattr__(self, 'data', data)
+        object.__setattr__(self, 'arrays', arrays)
+        object.__setattr__(self, 'items_other', items_other)
+        object.__setattr__(self, 'cache', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError('The Aerogrid is immutable.')
+
+    def __getitem__(self, key):
+        if key == 'n':
+            return self.n
+        if key in self.arrays:
+            return self.arrays[key]
+        return self.items_other[key]
+
+    def __iter__(self):
+        yield 'n'
+        yield from self.arrays
+        yield from self.items_other
+
+    def __len__(self):
+        return 1 + len(self.arrays) + len(self.items_other)
+
+    def __repr__(self):
+        return 'Aerogrid(n={})'.format(self.n)
+
+    def __getstate__(self):
+        return {'n': self.n, 'data': self.data, 'arrays': self.arrays, 'items_other': self.items_other}
+
+    def __setstate__(self, state):
+        self.initialize(state['n'], state['data'], state['arrays'], state['items_other'])
+
+    def select(self, index):
+        # The panels index (slice, index array or boolean mask) as a new Aerogrid, e.g. one component. For a slice,
+        # the arrays are views into the same block of memory.
+        items_other = {key: value[index] if isinstance(value, np.ndarray) and value.shape[:1] == (self.n,) else value
+                       for key, value in self.items_other.items()}
+        arrays = {key: value[index] for key, value in self.arrays.items()}
+        n = arrays['offset_j'].shape[0]
+        if not isinstance(index, slice):
+            return Aerogrid(dict(arrays, n=n, **items_other))
+        selected = Aerogrid.__new__(Aerogrid)
+        selected.initialize(n, self.data, arrays, items_other)
+        return selected
+
+    def cached(self, name, function):
+        # The result of function() is calculated only once and stored, the aerogrid itself does not change.
+        if name not in self.cache:
+            self.cache[name] = function()
+        return self.cache[name]
+
+
+def read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+def digest(aerogrid):
+    # Hash of the arrays of the panels (PANEL_KEYS), e.g. for the AIC cache. For an Aerogrid, the hash is calculated
+    # only once.
+    if isinstance(aerogrid, Aerogrid):
+        return aerogrid.cached('digest', lambda: calc_digest(aerogrid))
+    return calc_digest(aerogrid)
+
+
+def calc_digest(aerogrid):
+    h = hashlib.sha256()
+    for key in PANEL_KEYS:
+        array = np.ascontiguousarray(aerogrid[key], dtype=float)
+        h.update('{} {}'.format(key, array.shape).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+
+def panel_quantities(aerogrid, dtype='float64'):
+    """
+    Quantities of the single panels, which are used by the VLM and the DLM:
+    e = semiwidth of the bound vortex, sinGamma, cosGamma and gamma = dihedral angle, tanLambda = tangent of the sweep
+    angle of the bound vortex, see Rodden 1968, span = A / l.
+    For an Aerogrid, the quantities are calculated only once (per dtype).
+    """
+    if isinstance(aerogrid, Aerogrid):
+        return aerogrid.cached(('panel_quantities', np.dtype(dtype).name),
+                               lambda: calc_panel_quantities(aerogrid, dtype))
+    return calc_panel_quantities(aerogrid, dtype)
+
+
+def calc_panel_quantities(aerogrid, dtype='float64'):
+    Pm = np.asarray(aerogrid['offset_P1'], dtype=dtype)
+    Pp = np.asarray(aerogrid['offset_P3'], dtype=dtype)
+    e = np.absolute(0.5 * ((Pp[:, 2] - Pm[:, 2]) ** 2.0 + (Pp[:, 1] - Pm[:, 1]) ** 2.0) ** 0.5)
+    sinGamma = (Pp[:, 2] - Pm[:, 2]) / (2.0 * e)
+    quantities = {'e': e,
+                  'sinGamma': sinGamma,
+                  'cosGamma': (Pp[:, 1] - Pm[:, 1]) / (2.0 * e),
+                  'tanLambda': (Pp[:, 0] - Pm[:, 0]) / (2.0 * e),
+                  'gamma': np.arcsin(sinGamma),
+                  }
+    if 'A' in aerogrid and 'l' in aerogrid:
+        quantities['span'] = np.asarray(aerogrid['A'], dtype=dtype) / np.asarray(aerogrid['l'], dtype=dtype)
+    return {key: read_only(value) for key, value in quantities.items()}
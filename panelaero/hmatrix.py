@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hierarchical matrices (H-matrices) for the AIC matrices Ajj of the VLM and the DLM, see calc_Ajj_VLM() and
+calc_Ajj_DLM(). The panels are sorted into a tree of boxes (spatial ordering, see treecode.build_tree()). The
+interactions of well separated boxes are numerically of low rank and are stored as U.dot(V), which is found by
+adaptive cross approximation (ACA, Bebendorf 2000) from a few rows and columns of the block only, all other blocks
+are stored densely. Like for the treecode, the sending boxes are extended to infinity in x direction for the
+separation, because of the wake. Only the required entries are calculated, the full matrix is never formed, so
+that the memory is approximately proportional to n log(n) instead of n**2.
+The HMatrix provides the product with a vector (dot()) and the solution Qjj.dot(wj) = -Ajj^-1 wj (solve(), like
+linalg.Factorization) by GMRES, preconditioned with an incomplete LU factorization of the near field.
+"""
+import logging
+
+import numpy as np
+
+from panelaero import DLM, VLM, linalg, treecode
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+# Two boxes are well separated if the larger diameter is less than ETA times the distance between the boxes.
+ETA = 1.0
+# Maximum number of panels in the leaves of the tree
+LEAF_SIZE = 32
+# Drop tolerance and fill factor of the incomplete LU factorization of the near field (preconditioner). The fill
+# factor limits the memory of the factorization to the memory of the near field.
+ILU_DROP_TOLERANCE = 1e-3
+ILU_FILL_FACTOR = 1.0
+
+
+class HMatrix():
+    """
+    Hierarchical matrix of size n x n, assembled from the function entries(rows, cols), which returns the dense
+    block of the matrix for the index arrays rows and cols. The low rank blocks are approximated to the relative
+    tolerance (Frobenius norm of each block).
+    """
+
+    def __init__(self, entries, aerogrid, tolerance=1e-6, eta=ETA, leaf_size=LEAF_SIZE):
+        self.n = aerogrid['n']
+        self.tolerance = tolerance
+        P1 = np.asarray(aerogrid['offset_P1'], dtype=float)
+        P3 = np.asarray(aerogrid['offset_P3'], dtype=float)
+        P0 = np.asarray(aerogrid['offset_j'], dtype=float)
+        tree = treecode.build_tree(P0, np.minimum(np.minimum(P1, P3), P0), np.maximum(np.maximum(P1, P3), P0),
+                                   leaf_size)
+        self.dense = []
+        self.lowrank = []
+        for T, S, is_admissible in block_partition(tree, tree, eta):
+            if is_admissible:
+                U, V = aca(entries, T['index'], S['index'], tolerance)
+                if U is not None:
+                    self.lowrank.append((T['index'], S['index'], U, V))
+                    continue
+            self.dense.append((T['index'], S['index'], entries(T['index'], S['index'])))
+        self.dtype = np.result_type(*{B.dtype for _, _, B in self.dense})
+        self.factorization = self.factorize_near_field()
+        logging.info('H-matrix with {} dense and {} low rank blocks (average rank {:.1f}), {:.1%} of the dense '
+                     'matrix.'.format(len(self.dense), len(self.lowrank), self.average_rank,
+                                      self.size / self.n ** 2))
+
+    @property
+    def size(self):
+        # number of stored elements
+        return sum(B.size for _, _, B in self.dense) + sum(U.size + V.size for _, _, U, V in self.lowrank)
+
+    @property
+    def nbytes(self):
+        return self.size * np.dtype(self.dtype).itemsize
+
+    @property
+    def average_rank(self):
+        return np.mean([U.shape[1] for _, _, U, _ in self.lowrank]) if self.lowrank else 0.0
+
+    def dot(self, x):
+        # The product Ajj.dot(x), with x either a vector (n) or a matrix (n, m)
+        x = np.asarray(x)
+        y = np.zeros(x.shape, dtype=np.result_type(self.dtype, x))
+        for rows, cols, B in self.dense:
+            y[rows] += B.dot(x[cols])
+        for rows, cols, U, V in self.lowrank:
+            y[rows] += U.dot(V.dot(x[cols]))
+        return y
+
+    def toarray(self):
+        # Form the full matrix, e.g. for testing
+        return self.dot(np.eye(self.n, dtype=self.dtype))
+
+    def factorize_near_field(self):
+        # Incomplete LU factorization of the dense (near field) blocks, which is used as preconditioner. A complete
+        # factorization would need several times the memory of the H-matrix. Without SciPy, the diagonal blocks are
+        # inverted (block Jacobi), which needs more iterations.
+        if scipy is not None:
+            rows = np.concatenate([np.repeat(r, c.size) for r, c, _ in self.dense])
+            cols = np.concatenate([np.tile(c, r.size) for r, c, _ in self.dense])
+            values = np.concatenate([B.ravel() for _, _, B in self.dense])
+            near_field = scipy.sparse.csc_matrix((values, (rows, cols)), shape=(self.n, self.n))
+            return scipy.sparse.linalg.spilu(near_field, drop_tol=ILU_DROP_TOLERANCE, fill_factor=ILU_FILL_FACTOR)
+        logging.debug('SciPy not available, block Jacobi preconditioner for the H-matrix.')
+        return [(r, np.linalg.inv(B)) for r, c, B in self.dense if r is c]
+
+    def precondition(self, r):
+        if scipy is not None:
+            return self.factorization.solve(r)
+        x = np.zeros_like(r)
+        for index, inverse in self.factorization:
+            x[index] = inverse.dot(r[index])
+        return x
+
+    def solve_Ajj(self, rhs, tolerance=None):
+        # Solve Ajj x = rhs with GMRES for one or more right hand sides, by default to the tolerance of the
+        # H-matrix.
+        x, info = linalg.gmres(self.dot, rhs, tol=self.tolerance if tolerance is None else tolerance,
+                               preconditioner=self.precondition)
+        logging.info('H-matrix solution with {} GMRES iterations.'.format(info['iterations']))
+        return x
+
+    def solve(self, wj, tolerance=None):
+        """
+        Apply Qjj to the downwash wj, with wj either a vector (n) or a matrix with one downwash per column (n, m),
+        see linalg.Factorization.solve().
+        """
+        return -self.solve_Ajj(np.asarray(wj, dtype=self.dtype), tolerance)
+
+
+def calc_Ajj_VLM(aerogrid, Ma, xz_symmetry=False, tolerance=1e-6, eta=ETA, leaf_size=LEAF_SIZE):
+    # Ajj of VLM.calc_Ajj() as an H-matrix, use hmatrix.solve(wj) instead of Qjj.dot(wj).
+    def entries(rows, cols):
+        return VLM.calc_Ajj_block(aerogrid, Ma, rows, cols, xz_symmetry)[0]
+    return HMatrix(entries, aerogrid, tolerance, eta, leaf_size)
+
+
+def calc_Ajj_DLM(aerogrid, Ma, k, method='parabolic', xz_symmetry=False, tolerance=1e-6, eta=ETA,
+                 leaf_size=LEAF_SIZE, backend=None):
+    # Ajj of DLM.calc_Qjj() (steady part of the VLM plus the DLM part at the reduced frequency k) as an H-matrix,
+    # use hmatrix.solve(wj) instead of Qjj.dot(wj).
+    if k == 0.0:
+        return calc_Ajj_VLM(aerogrid, Ma, xz_symmetry, tolerance, eta, leaf_size)
+    DLM.check_orientation(aerogrid)
+    # the backend is selected only once, not for every block
+    backend = DLM.select_backend(backend, method)
+
+    def entries(rows, cols):
+        return DLM.calc_Ajj_block(aerogrid, Ma, k, rows, cols, method, xz_symmetry, backend=backend)
+    return HMatrix(entries, aerogrid, tolerance, eta, leaf_size)
+
+
+def block_partition(T, S, eta):
+    # Yields the pairs of boxes (T, S, admissible) of the block partition, the pairs which are not admissible
+    # are leaves of the tree.
+    stack = [(T, S)]
+    while stack:
+        T, S = stack.pop()
+        if admissible(T, S, eta):
+            yield T, S, True
+        elif not T['children'] and not S['children']:
+            yield T, S, False
+        elif not S['children'] or (T['children'] and T['index'].size >= S['index'].size):
+            stack += [(child, S) for child in T['children']]
+        else:
+            stack += [(T, child) for child in S['children']]
+
+
+def admissible(T, S, eta):
+    # The box of the sending panels is extended to infinity in x direction because of the wake.
+    hi = np.array([np.inf, S['hi'][1], S['hi'][2]])
+    gap = np.maximum(0.0, np.maximum(S['lo'] - T['hi'], T['lo'] - hi))
+    return max(treecode.diameter(T), treecode.diameter(S)) < eta * np.linalg.norm(gap)
+
+
+def aca(entries, rows, cols, tolerance):
+    # Adaptive cross approximation with partial pivoting, Bebendorf 2000. The block is approximated by U.dot(V)
+    # from single rows and columns, which are evaluated with entries(). Returns None, None if the rank is too
+    # high for a compression. The rank is reduced afterwards by a truncated SVD.
+    max_rank = min(rows.size, cols.size) // 2
+    U = []
+    V = []
+    norm2 = 0.0
+    unused = np.ones(rows.size, dtype=bool)
+    i = 0
+    while len(U) < max_rank:
+        unused[i] = False
+        row = entries(rows[i:i + 1], cols)[0]
+        for u, v in zip(U, V):
+            row = row - u[i] * v
+        j = np.argmax(np.abs(row))
+        if row[j] != 0.0:
+            v = row / row[j]
+            u = entries(rows, cols[j:j + 1])[:, 0]
+            for u_k, v_k in zip(U, V):
+                u = u - v_k[j] * u_k
+            # update of the Frobenius norm of the approximation
+            norm2 += np.sum([2.0 * np.real(np.vdot(u_k, u) * np.vdot(v_k, v)) for u_k, v_k in zip(U, V)]) \
+                + np.linalg.norm(u) ** 2.0 * np.linalg.norm(v) ** 2.0
+            U.append(u)
+            V.append(v)
+            if np.linalg.norm(u) * np.linalg.norm(v) <= tolerance * np.sqrt(norm2):
+                break
+            candidates = np.abs(u) * unused
+        else:
+            candidates = unused.astype(float)
+        if not candidates.any():
+            break
+        i = np.argmax(candidates)
+    else:
+        return None, None
+    if not U:
+        return np.zeros((rows.size, 0)), np.zeros((0, cols.size))
+    return recompress(np.array(U).T, np.array(V), tolerance)
+
+
+def recompress(U, V, tolerance):
+    # Truncated SVD of U.dot(V) via the QR decompositions of U and V.T
+    Q_U, R_U = np.linalg.qr(U)
+    Q_V, R_V = np.linalg.qr(V.T)
+    W, s, Zh = np.linalg.svd(R_U.dot(R_V.T))
+    rank = max(1, int(np.sum(s > tolerance * s[0])))
+    return Q_U.dot(W[:, :rank] * s[:rank]), Zh[:rank].dot(Q_V.T)
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional compiled backend for the DLM, which requires Numba and is selected with backend='numba', see DLM.BACKEND.
+For every pair of receiving point and sending box, the geometry, the kernel function at the points along the bound
+vortex and the normalwash D1rs + D2rs are calculated in one loop with the conditions evaluated per pair, so that no
+temporary n x n arrays are needed. The receiving points are distributed to the threads of Numba.
+The formulas are the same as in DLM.calc_geometry_panels(), DLM.calc_Drs() and DLM.kernelfunction(), which remain
+the reference implementation. The calculations are always done in double precision.
+"""
+import cmath
+import math
+
+import numpy as np
+
+from panelaero import grid
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def jit(**kwargs):
+    # Compile with Numba if available, division by zero results in inf / nan like in numpy.
+    if numba is None:
+        return lambda function: function
+    return numba.njit(cache=True, error_model='numpy', **kwargs)
+
+
+prange = range if numba is None else numba.prange
+
+# Coefficients and exponents of the Laschka and Desmarais approximations, see DLM.laschka_approximation() and
+# DLM.desmarais_approximation()
+LASCHKA = (np.array([+0.24186198, -2.7918027, +24.991079, -111.59196, +271.43549, -305.75288,
+                     -41.183630, +545.98537, -644.78155, +328.72755, -64.279511]),
+           np.array([n * 0.372 for n in range(1, 12)]))
+DESMARAIS = (np.array([0.000319759140, -0.000055461471, 0.002726074362, 0.005749551566,
+                       0.031455895072, 0.106031126212, 0.406838011567, 0.798112357155,
+                       -0.417749229098, 0.077480713894, -0.012677284771, 0.001787032960]),
+             np.array([(2.0 ** n) * 0.009054814793 for n in range(1, 13)]))
+
+# Points along the bound vortex, ebar = factor * e
+OFFSETS = {'parabolic': np.array([-1.0, 1.0, 0.0]),
+           'quartic': np.array([-1.0, -0.5, 1.0, 0.5, 0.0])}
+
+
+def calc_Drs(aerogrid, sending, Ma, k, method='parabolic', dtype='float64', n_threads=None):
+    # Same as DLM.calc_Drs() for the receiving points of the aerogrid and the sending boxes of a second grid.
+    # n_threads = optional number of threads, limited to the threads of Numba (NUMBA_NUM_THREADS)
+    # method = 'parabolic' or 'quartic', the method 'tabulated' is only available in numpy, see DLM.select_backend()
+    if method not in OFFSETS:
+        raise ValueError('Method {} is not implemented in the compiled backend, use one of {}.'.format(
+            method, list(OFFSETS)))
+    coefficients, exponents = LASCHKA if method == 'parabolic' else DESMARAIS
+    # The quantities per box, see DLM.calc_geometry_panels()
+    Pr = np.asarray(aerogrid['offset_j'], dtype=float)
+    Ps = np.asarray(sending['offset_l'], dtype=float)
+    chord = np.asarray(sending['l'], dtype=float)
+    quantities = grid.panel_quantities(sending)
+    e = quantities['e']
+    sinGamma = quantities['sinGamma']
+    cosGamma = quantities['cosGamma']
+    tanLambda = quantities['tanLambda']
+    gamma_s = quantities['gamma']
+    gamma_r = grid.panel_quantities(aerogrid)['gamma']
+
+    ks = np.atleast_1d(np.asarray(k, dtype=float))
+    Drs = np.empty((len(ks), Pr.shape[0], Ps.shape[0]), dtype=np.result_type(dtype, 'complex64'))
+    if numba is not None and n_threads is not None:
+        numba_threads = numba.get_num_threads()
+        numba.set_num_threads(max(1, min(n_threads, numba.config.NUMBA_NUM_THREADS)))
+    try:
+        calc_Drs_pairs(Pr, gamma_r, Ps, e, sinGamma, cosGamma, tanLambda, gamma_s, chord, ks, float(Ma),
+                       method == 'quartic', OFFSETS[method], coefficients, exponents, Drs)
+    finally:
+        if numba is not None and n_threads is not None:
+            numba.set_num_threads(numba_threads)
+    if np.ndim(k) == 0:
+        return Drs[0]
+    return Drs
+
+
+@jit(parallel=True)
+def calc_Drs_pairs(Pr, gamma_r, Ps, e_s, sinGamma, cosGamma, tanLambda, gamma_s, chord_s, ks, Ma, quartic,
+                   offsets, coefficients, exponents, Drs):
+    n_r = Pr.shape[0]
+    n_s = Ps.shape[0]
+    n_k = ks.shape[0]
+    for r in prange(n_r):
+        P1 = np.empty((offsets.shape[0], n_k), dtype=np.complex128)
+        P2 = np.empty((offsets.shape[0], n_k), dtype=np.complex128)
+        exponentials = np.empty((2, exponents.shape[0]))
+        exponentials[1] = 1.0
+        for s in range(n_s):
+            e = e_s[s]
+            chord = chord_s[s]
+            # cartesian coordinates of receiving points relative to sending points
+            xsr = Pr[r, 0] - Ps[s, 0]
+            ysr = Pr[r, 1] - Ps[s, 1]
+            zsr = Pr[r, 2] - Ps[s, 2]
+            # relative dihedral angle between receiving point and sending boxes
+            gamma_sr = gamma_s[s] - gamma_r[r]
+            cos_sr = math.cos(gamma_sr)
+            sin_sr = math.sin(gamma_sr)
+            # local coordinates of receiving point relative to sending point
+            ybar = ysr * cosGamma[s] + zsr * sinGamma[s]
+            zbar = zsr * cosGamma[s] - ysr * sinGamma[s]
+            for i in range(offsets.shape[0]):
+                kernelfunction(xsr, ybar, zbar, cos_sr, sin_sr, tanLambda[s], offsets[i] * e, ks, Ma,
+                               coefficients, exponents, quartic, exponentials, P1[i], P2[i])
+            if quartic:
+                normalwash_quartic(ybar, zbar, e, chord, P1, P2, Drs[:, r, s])
+            else:
+                normalwash_parabolic(ybar, zbar, e, chord, P1, P2, Drs[:, r, s])
+
+
+@jit()
+def conditions(ybar, zbar, e):
+    # The conditions of DLM.calc_geometry_panels() for one pair, alpha is Rodden 1971, eq 33.
+    ybar2 = ybar ** 2.0
+    zbar2 = zbar ** 2.0
+    e2 = e ** 2.0
+    ratio = 2.0 * e * abs(zbar) / (ybar2 + zbar2 - e2)
+    L = math.log(((ybar - e) ** 2.0 + zbar2) / ((ybar + e) ** 2.0 + zbar2))
+    nonplanar = abs(zbar) / e > 0.001
+    i0 = abs(zbar) / e <= 0.001
+    ia = abs(ratio) <= 0.3 and nonplanar
+    ir = abs(ratio) > 0.3 and nonplanar
+    alpha = 0.0
+    if ia:
+        funny_series = 0.0
+        for n in range(2, 8):
+            funny_series += (-1.0) ** n / (2.0 * n - 1.0) * ratio ** (2.0 * n - 4.0)
+        alpha = 4.0 * e ** 4.0 / (ybar2 + zbar2 - e2) ** 2.0 * funny_series
+    ib = abs(1.0 / ratio) <= 0.1 and nonplanar
+    ic = abs(1.0 / ratio) > 0.1 and nonplanar
+    return ratio, L, i0, ia, ir, ib, ic, alpha
+
+
+@jit()
+def kernelfunction(xbar, ybar, zbar, cos_sr, sin_sr, tanLambda, ebar, ks, M, coefficients, exponents, doubling,
+                   exponentials, P1, P2):
+    # The kernel function for one pair at one point along the bound vortex for all frequencies, see
+    # DLM.kernelfunction_precompute() and DLM.kernelfunction_evaluate().
+    # exponentials = work array for the frequency independent terms exp(-s*|u1|) and exp(-s*0) of the integral
+    #                approximations
+    xe = xbar - ebar * tanLambda
+    r1 = math.sqrt((ybar - ebar) ** 2.0 + zbar ** 2.0)  # Rodden 1971, eq 4
+    beta2 = 1.0 - (M ** 2.0)  # Rodden 1971, eq 9
+    R = math.sqrt(xe ** 2.0 + beta2 * r1 ** 2.0)  # Rodden 1971, eq 10
+    u1 = (M * R - xe) / (beta2 * r1)  # Rodden 1971, eq 11
+    # the square root (1+u1**2)**0.5 is used several times
+    root = math.sqrt(1.0 + u1 ** 2.0)
+    T1 = cos_sr  # Rodden 1971, eq 5
+    T2 = zbar * (zbar * cos_sr + (ybar - ebar) * sin_sr)  # Rodden 1971, eq 21a
+    K10 = -1.0 - xe / R  # Rodden 1971, eq 15
+    K20 = 2.0 + xe * (2.0 + beta2 * r1 ** 2.0 / R ** 2.0) / R  # Rodden 1971, eq 16
+    K1_1 = M * r1 / R / root
+    K2_1 = (M ** 2.0) * (r1 ** 2.0) / (R ** 2.0) / root
+    K2_2 = M * r1 * ((1.0 + u1 ** 2.0) * beta2 * r1 ** 2.0 / R ** 2.0 + 2.0 + M * r1 * u1 / R) \
+        / R / (root * root ** 2.0)
+    # The exponents are s_n = n*c (Laschka) or s_n = 2**n*b (Desmarais), so only one exponential is evaluated and the
+    # others are obtained by multiplication.
+    exponentials[0, 0] = math.exp(-exponents[0] * abs(u1))
+    for i in range(1, exponents.shape[0]):
+        if doubling:
+            exponentials[0, i] = exponentials[0, i - 1] ** 2.0
+        else:
+            exponentials[0, i] = exponentials[0, i - 1] * exponentials[0, 0]
+    for ik in range(ks.shape[0]):
+        k = ks[ik]
+        if r1 == 0.0:
+            # Resolve the singularity arising when r1 = 0
+            if xbar >= 0.0:
+                K1 = -2.0 + 0j
+                K2 = +4.0 + 0j
+            else:
+                K1 = 0j
+                K2 = 0j
+        else:
+            k1 = k * r1  # Rodden 1971, eq 12 with k = w/U
+            ejku = cmath.exp(-1j * k1 * u1)
+            I1, I2 = integrals12(u1, k1, ejku, root, coefficients, exponents, exponentials)
+            # Formulation of K1,2 by Landahl, Rodden 1971, eq 7+8
+            K1 = -I1 - ejku * K1_1
+            K2 = 3.0 * I2 + 1j * k1 * ejku * K2_1 + ejku * K2_2
+        phase = cmath.exp(-1j * k * xe)
+        P1[ik] = -(K1 * phase - K10) * T1  # Rodden 1971, eq 27b
+        P2[ik] = -(K2 * phase - K20) * T2  # Rodden 1971, eq 36b
+
+
+@jit()
+def integrals12(u1, k1, ejku, root, coefficients, exponents, exponentials):
+    # see DLM.get_integrals12(), with the exponentials exp(-s*|u1|) and exp(-s*0), ejku = exp(-j*k1*u1) and
+    # root = (1+u1**2)**0.5
+    if u1 >= 0.0:
+        return integral_approximation(u1, k1, ejku, root, coefficients, exponents, exponentials[0])
+    elif u1 < 0.0:
+        I10, I20 = integral_approximation(0.0, k1, 1.0 + 0j, 1.0, coefficients, exponents, exponentials[1])
+        I1n, I2n = integral_approximation(-u1, k1, ejku.conjugate(), root, coefficients, exponents, exponentials[0])
+        # Rodden 1971, eq A.5 and A.9
+        return complex(2.0 * I10.real - I1n.real, I1n.imag), complex(2.0 * I20.real - I2n.real, I2n.imag)
+    return 0j, 0j
+
+
+@jit()
+def integral_approximation(u1, k1, ejku, root, coefficients, exponents, exponentials):
+    # see DLM.laschka_approximation(), DLM.desmarais_approximation() and DLM.exponential_series()
+    I0 = 0j
+    J0 = 0j
+    for i in range(coefficients.shape[0]):
+        s = exponents[i]
+        nck = s ** 2.0 + k1 ** 2.0
+        inck = 1.0 / nck
+        w = coefficients[i] * exponentials[i] * inck
+        I0 += w * complex(s, -k1)
+        w *= inck
+        unck = u1 * nck
+        J0 += w * complex(s ** 2.0 - k1 ** 2.0 + s * unck, -k1 * (2.0 * s + unck))
+    # I1 as in Rodden 1971, eq A.1
+    I1 = (1.0 - u1 / root - 1j * k1 * I0) * ejku
+    # I2 as in Rodden 1971, eq A.6, divided by 3.0
+    I2 = ((2.0 + 1j * k1 * u1) * (1.0 - u1 / root) - u1 / (root * root ** 2.0)
+          - 1j * k1 * I0 + k1 ** 2.0 * J0) * ejku / 3.0
+    return I1, I2
+
+
+@jit()
+def normalwash_parabolic(ybar, zbar, e, chord, P1, P2, Drs):
+    # Rodden et al. 1971 and 1972, see DLM.calc_geometry_panels() and DLM.calc_Drs()
+    ratio, L, i0, ia, ir, ib, ic, alpha = conditions(ybar, zbar, e)
+    ybar2 = ybar ** 2.0
+    zbar2 = zbar ** 2.0
+    e2 = e ** 2.0
+    Fparabolic = 0.0
+    if i0:
+        Fparabolic = 2.0 * e / (ybar2 - e2)
+        alpha = ((2.0 * e2) / (ybar2 - e2)) ** 2.0
+    elif ia:
+        Fparabolic = 2.0 * e / (ybar2 + zbar2 - e2) * (1.0 - alpha * zbar2 / e2)
+    elif ir:
+        Fparabolic = 1.0 / abs(zbar) * math.atan2(2.0 * e * abs(zbar), (ybar2 + zbar2 - e2))
+        alpha = (1.0 - Fparabolic * (ybar2 + zbar2 - e2) / (2.0 * e)) / zbar2 * e2
+
+    for ik in range(Drs.shape[0]):
+        P1m, P1p, P1s = P1[0, ik], P1[1, ik], P1[2, ik]
+        P2m, P2p, P2s = P2[0, ik], P2[1, ik], P2[2, ik]
+        A1 = (P1m - 2.0 * P1s + P1p) / (2.0 * e2)  # Rodden 1971, eq 28
+        B1 = (P1p - P1m) / (2.0 * e)  # Rodden 1971, eq 29
+        C1 = P1s  # Rodden 1971, eq 30
+
+        A2 = (P2m - 2.0 * P2s + P2p) / (2.0 * e2)  # Rodden 1971, eq 37
+        B2 = (P2p - P2m) / (2.0 * e)  # Rodden 1971, eq 38
+        C2 = P2s  # Rodden 1971, eq 39
+
+        # The "planar" part, Rodden 1971, eq 34
+        D1rs = chord / (np.pi * 8.0) \
+            * (((ybar2 - zbar2) * A1 + ybar * B1 + C1) * Fparabolic
+                + (0.5 * B1 + ybar * A1) * L
+                + 2.0 * e * A1)
+
+        # The "nonplanar" part
+        D2rs = 0j
+        if ib:
+            # Condition 1, Rodden 1971 eq 40
+            D2rs = chord / (16.0 * np.pi * zbar2) \
+                * (((ybar2 + zbar2) * A2 + ybar * B2 + C2) * Fparabolic
+                    + 1.0 / ((ybar + e) ** 2.0 + zbar2)
+                    * (((ybar2 + zbar2) * ybar + (ybar2 - zbar2) * e)
+                       * A2 + (ybar2 + zbar2 + ybar * e) * B2 + (ybar + e) * C2)
+                    - 1.0 / ((ybar - e) ** 2.0 + zbar2)
+                    * (((ybar2 + zbar2) * ybar - (ybar2 - zbar2) * e)
+                       * A2 + (ybar2 + zbar2 - ybar * e) * B2 + (ybar - e) * C2)
+                   )
+        elif ic:
+            # Condition 2, Rodden 1971 eq 41
+            D2rs = chord * e / (8.0 * np.pi * (ybar2 + zbar2 - e2)) \
+                * ((2.0 * (ybar2 + zbar2 + e2) * (e2 * A2 + C2)
+                    + 4.0 * ybar * e2 * B2)
+                    / (((ybar + e) ** 2.0 + zbar2) * ((ybar - e) ** 2.0 + zbar2))
+                    - alpha / e2 * ((ybar2 + zbar2) * A2 + ybar * B2 + C2)
+                   )
+        Drs[ik] = D1rs + D2rs
+
+
+@jit()
+def normalwash_quartic(ybar, zbar, e, chord, P1, P2, Drs):
+    # Rodden et al. 1998, see DLM.calc_geometry_panels() and DLM.calc_Drs()
+    ratio, L, i0, ia, ir, ib, ic, alpha = conditions(ybar, zbar, e)
+    ybar2 = ybar ** 2.0
+    ybar4 = ybar2 ** 2.0
+    zbar2 = zbar ** 2.0
+    zbar4 = zbar2 ** 2.0
+    e2 = e ** 2.0
+    e3 = e2 * e
+    e4 = e2 ** 2.0
+    d1 = 0.0
+    d2 = 0.0
+    if (ybar2 + zbar2 - e2) > 0.0:
+        d1 = 1.0
+        d2 = 0.0
+    elif (ybar2 + zbar2 - e2) == 0.0:
+        d1 = 0.0
+        d2 = 0.5
+    elif (ybar2 + zbar2 - e2) < 0.0:
+        d1 = 1.0
+        d2 = 1.0
+    # Rodden 1998, eq 22, 24 and 25
+    epsilon = 0.0
+    Fquartic = 0.0
+    if i0:
+        epsilon = 2.0 * e / (ybar2 - e2)
+        Fquartic = d1 * 2.0 * e / (ybar2 - e2)
+    elif ia or ir:
+        if ia:
+            epsilon = alpha
+        else:
+            epsilon = e2 / zbar2 * (1.0 - 1.0 / ratio * math.atan(ratio))
+        Fquartic = d1 * 2.0 * e / (ybar2 + zbar2 - e2) * (1.0 - epsilon * zbar2 / e2) + d2 * np.pi / abs(zbar)
+
+    for ik in range(Drs.shape[0]):
+        P1m, P1mh, P1p, P1ph, P1s = P1[0, ik], P1[1, ik], P1[2, ik], P1[3, ik], P1[4, ik]
+        P2m, P2mh, P2p, P2ph, P2s = P2[0, ik], P2[1, ik], P2[2, ik], P2[3, ik], P2[4, ik]
+        A1 = -1.0 / (6.0 * e2) * (P1m - 16.0 * P1mh + 30.0 * P1s - 16.0 * P1ph + P1p)  # Rodden 1998, eq 15
+        B1 = +1.0 / (6.0 * e) * (P1m - 8.0 * P1mh + 8.0 * P1ph - P1p)  # Rodden 1998, eq 16
+        C1 = P1s  # Rodden 1998, eq 17
+        D1 = -2.0 / (3.0 * e3) * (P1m - 2.0 * P1mh + 2.0 * P1ph - P1p)  # Rodden 1998, eq 18
+        E1 = +2.0 / (3.0 * e4) * (P1m - 4.0 * P1mh + 6.0 * P1s - 4.0 * P1ph + P1p)  # Rodden 1998, eq 19
+
+        A2 = -1.0 / (6.0 * e2) * (P2m - 16.0 * P2mh + 30.0 * P2s - 16.0 * P2ph + P2p)  # Rodden 1998, eq 28
+        B2 = +1.0 / (6.0 * e) * (P2m - 8.0 * P2mh + 8.0 * P2ph - P2p)  # Rodden 1998, eq 29
+        C2 = P2s  # Rodden 1998, eq 30
+        D2 = -2.0 / (3.0 * e3) * (P2m - 2.0 * P2mh + 2.0 * P2ph - P2p)  # Rodden 1998, eq 31
+        E2 = +2.0 / (3.0 * e4) * (P2m - 4.0 * P2mh + 6.0 * P2s - 4.0 * P2ph + P2p)  # Rodden 1998, eq 32
+
+        # The "planar" part, Rodden 1998, eq 20
+        D1rs = chord / (np.pi * 8.0) \
+            * (((ybar2 - zbar2) * A1 + ybar * B1 + C1 + ybar * (ybar2 - 3.0 * zbar2) * D1
+                + (ybar4 - 6.0 * ybar2 * zbar2 + zbar4) * E1) * Fquartic
+                + (0.5 * B1 + ybar * A1 + 0.5 * (3.0 * ybar2 - zbar2) * D1 + 2.0 * ybar * (ybar2 - zbar2) * E1) * L
+                + 2.0 * e * (A1 + 2.0 * ybar * D1 + (3.0 * ybar2 - zbar2 + 1.0 / 3.0 * e2) * E1)
+               )
+
+        # The "nonplanar" part
+        D2rs = 0j
+        if ib:
+            # Condition 1, Rodden 1998 eq 33
+            D2rs = chord / (16.0 * np.pi * zbar2) \
+                * (Fquartic
+                    * ((ybar2 + zbar2) * A2
+                        + ybar * B2
+                        + C2
+                        + ybar * (ybar2 + 3.0 * zbar2) * D2
+                        + (ybar4 + 6.0 * ybar2 * zbar2 - 3.0 * zbar4) * E2
+                       )
+                    + 1.0 / ((ybar + e) ** 2.0 + zbar2)
+                    * (((ybar2 + zbar2) * ybar + (ybar2 - zbar2) * e) * A2
+                        + (ybar2 + zbar2 + ybar * e) * B2
+                        + (ybar + e) * C2
+                        + (ybar4 - zbar4 + (ybar2 - 3.0 * zbar2) * ybar * e) * D2
+                        + ((ybar4 - 2.0 * ybar2 * zbar2 - 3.0 * zbar4) * ybar
+                           + (ybar4 - 6.0 * ybar2 * zbar2 + zbar4) * e) * E2
+                       )
+                    - 1.0 / ((ybar - e) ** 2.0 + zbar2)
+                    * (((ybar2 + zbar2) * ybar - (ybar2 - zbar2) * e) * A2
+                        + (ybar2 + zbar2 - ybar * e) * B2
+                        + (ybar - e) * C2
+                        + (ybar4 - zbar4 - (ybar2 - 3.0 * zbar2) * ybar * e) * D2
+                        + ((ybar4 - 2.0 * ybar2 * zbar2 - 3.0 * zbar4) * ybar
+                           - (ybar4 - 6.0 * ybar2 * zbar2 + zbar4) * e) * E2
+                       )
+                    + (zbar2 * L) * D2
+                    + 4.0 * zbar2 * (e + ybar * L) * E2
+                   )
+        elif ic:
+            # Condition 2, Rodden 1998 eq 34
+            D2rs = chord * e / (8.0 * np.pi * (ybar2 + zbar2 - e2)) \
+                * (1.0 / (((ybar + e) ** 2.0 + zbar2) * ((ybar - e) ** 2.0 + zbar2))
+                    * (2.0 * (ybar2 + zbar2 + e2) * (e2 * A2 + C2)
+                        + 4.0 * ybar * e2 * B2
+                        + 2.0 * ybar * (ybar4 - 2.0 * e2 * ybar2 + 2.0 * ybar2 * zbar2 + 3.0 * e4
+                                        + 2.0 * e2 * zbar2 + zbar4) * D2
+                        + 2.0 * (3.0 * ybar4 * ybar2 - 7.0 * e2 * ybar4 + 5.0 * ybar4 * zbar2
+                                 + 6.0 * e4 * ybar2 + 6.0 * e2 * ybar2 * zbar2
+                                 - 3.0 * e2 * zbar4 - zbar4 * zbar2 + ybar2 * zbar4
+                                 - 2.0 * e4 * zbar2) * E2
+                       )
+                    - (d1 * epsilon + e2 / zbar2 * (1.0 - d1 - d2 * np.pi / ratio)) / e2
+                    * ((ybar2 + zbar2) * A2
+                        + ybar * B2
+                        + C2
+                        + ybar * (ybar2 + 3.0 * zbar2) * D2
+                        + (ybar4 + 6.0 * ybar2 * zbar2 - 3.0 * zbar4) * E2
+                       )
+                   ) \
+                + chord / (8.0 * np.pi) * (D2 / 2.0 * L + 2.0 * (e + ybar * L) * E2)
+        Drs[ik] = D1rs + D2rs
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import numpy as np
+
+try:
+    import scipy.linalg
+except ImportError:
+    scipy = None
+
+
+# Maximum number of steps of the iterative refinement
+MAX_REFINEMENT_STEPS = 10
+# The iterative refinement is used for at most MAX_REFINED_FRACTION * n right hand sides, each step costs two
+# O(n**2 m) products, for more right hand sides the solution in double precision is cheaper.
+MAX_REFINED_FRACTION = 1.0 / 32.0
+
+
+def invert(Ajj, refine=False):
+    # Qjj = -Ajj^-1. With refine=True, Qjj is returned in double precision, but it is inverted in double precision
+    # as well: the refinement of all n columns would cost several times the inversion, see Factorization.
+    if refine:
+        Ajj = np.asarray(Ajj, dtype=np.result_type(Ajj, 'float64'))
+    return -np.linalg.inv(Ajj)
+
+
+class Factorization():
+    """
+    Reusable factorization of an AIC matrix Ajj, so that Qjj = -Ajj^-1 can be applied to (many) downwash
+    vectors without forming Qjj explicitly. If SciPy is available, an LU factorization is used, otherwise
+    the system is solved with numpy for every call of solve(). Qjj is only formed when it is requested.
+
+    Mixed precision:
+    With refine=True, Ajj is factorized in single precision and the solutions are improved by iterative refinement,
+    with the residuals calculated in double precision. The results are returned in double precision and are accurate
+    to double precision with respect to the given Ajj. A single precision Ajj is converted to double precision once,
+    so that the residuals are always calculated in double precision (the errors of a single precision assembly
+    remain). What is saved is time: the O(n**3) factorization runs in single precision, each refinement step costs
+    O(n**2 m) for m right hand sides. Memory is not saved, Ajj is kept in double precision for the residuals in
+    addition to the single precision factors (about 1.5 times the double precision matrix). The refinement only pays
+    off for few right hand sides: for more than MAX_REFINED_FRACTION * n right hand sides and for Qjj, the system is
+    solved in double precision with the kept Ajj instead.
+    """
+
+    def __init__(self, Ajj, overwrite=False, refine=False):
+        # overwrite = Ajj is not needed anymore by the caller and may be overwritten by the factorization
+        self.n = Ajj.shape[0]
+        self.refine = refine
+        if refine:
+            # factorize the single precision counterpart (float32 / complex64), keep Ajj in double precision for the
+            # residuals
+            self.Ajj = np.asarray(Ajj, dtype=np.result_type(Ajj, 'float64'))
+            Ajj = Ajj.astype('complex64' if np.iscomplexobj(Ajj) else 'float32')
+            overwrite = True
+        else:
+            self.Ajj = None
+        self.dtype = Ajj.dtype
+        if scipy is not None:
+            self.lu = scipy.linalg.lu_factor(Ajj, overwrite_a=overwrite, check_finite=False)
+        else:
+            logging.debug('SciPy not available, no LU factorization of the AIC matrix.')
+            self.lu = None
+            self.Ajj_lu = Ajj
+
+    def solve_Ajj(self, rhs):
+        # Solve Ajj x = rhs for one or more right hand sides.
+        if self.lu is not None:
+            return scipy.linalg.lu_solve(self.lu, rhs, check_finite=False)
+        return np.linalg.solve(self.Ajj_lu, rhs)
+
+    def solve_Ajj_refined(self, rhs):
+        # Solve Ajj x = rhs with iterative refinement in double precision.
+        dtype = np.result_type(self.Ajj, rhs, 'float64')
+        rhs = rhs.astype(dtype)
+        x = self.solve_Ajj(rhs.astype(self.dtype)).astype(dtype)
+        for _ in range(MAX_REFINEMENT_STEPS):
+            residual = rhs - self.Ajj.dot(x)
+            dx = self.solve_Ajj(residual.astype(self.dtype))
+            x += dx
+            if np.max(np.abs(dx)) <= np.finfo(dtype).eps * np.max(np.abs(x)):
+                break
+        return x
+
+    def solve(self, wj):
+        """
+        Apply Qjj to the downwash wj, with wj either a vector (n) or a matrix with one downwash per column (n, m).
+        The result is the same as Qjj.dot(wj), but without forming Qjj.
+        """
+        wj = np.asarray(wj)
+        if self.refine:
+            if wj.ndim == 2 and wj.shape[1] > MAX_REFINED_FRACTION * self.n:
+                return -np.linalg.solve(self.Ajj, wj)
+            return -self.solve_Ajj_refined(wj)
+        return -self.solve_Ajj(wj)
+
+    @property
+    def Qjj(self):
+        # Form the full AIC matrix, only when explicitly requested.
+        if self.refine:
+            # the refinement of all n columns would cost several times the inversion in double precision
+            return -np.linalg.inv(self.Ajj)
+        return self.solve(np.eye(self.n, dtype=self.dtype))
+
+    def update(self, U, V):
+        # The factorization of Ajj + U.dot(V), see UpdatedFactorization.
+        return UpdatedFactorization(self, U, V)
+
+
+class UpdatedFactorization(Factorization):
+    """
+    Factorization of Ajj + U.dot(V) with a low rank update U (n, p), V (p, n) of a factorized Ajj, using the
+    Woodbury formula (Ajj + U V)^-1 = Ajj^-1 - Ajj^-1 U (I + V Ajj^-1 U)^-1 V Ajj^-1. Ajj^-1 U is calculated once,
+    each solution costs one solution with the factorization of Ajj plus O(n p) operations. Updates can be chained.
+    """
+
+    def __init__(self, factorization, U, V):
+        self.n = factorization.n
+        self.refine = False
+        self.factorization = factorization
+        # Ajj^-1 U and the capacitance matrix I + V Ajj^-1 U, using the refinement of the factorization (if any)
+        self.W = -factorization.solve(U)
+        self.V = V
+        self.capacitance = np.eye(V.shape[0]) + V.dot(self.W)
+        self.dtype = np.result_type(factorization.dtype, self.W)
+
+    def solve_Ajj(self, rhs):
+        x = -self.factorization.solve(rhs)
+        return x - self.W.dot(np.linalg.solve(self.capacitance, self.V.dot(x)))
+
+
+def low_rank_update(panels, delta_rows, delta_cols):
+    # The change of the rows (delta_rows, dim: r,n) and the columns (delta_cols, dim: n,r) of the panels (index
+    # array with r entries) of a matrix Ajj as low rank update Ajj + U.dot(V) with U (n, 2r) and V (2r, n). The
+    # elements in both the rows and the columns are taken from delta_rows.
+    n, r = delta_cols.shape
+    E = np.zeros((n, r))
+    E[panels, np.arange(r)] = 1.0
+    delta_cols = np.array(delta_cols)
+    delta_cols[panels] = 0.0
+    return np.hstack((E, delta_cols)), np.vstack((delta_rows, E.T))
+
+
+def update_inverse(Qjj, U, V):
+    # Qjj = -Ajj^-1 of the updated matrix Ajj + U.dot(V) from Qjj of Ajj with the Woodbury formula, which costs
+    # O(n**2 p) instead of O(n**3) operations for a new inversion, see UpdatedFactorization.
+    QU = Qjj.dot(U)
+    return Qjj + QU.dot(np.linalg.solve(np.eye(U.shape[1]) - V.dot(QU), V.dot(Qjj)))
+
+
+def gmres(matvec, b, x0=None, tol=1e-8, restart=50, maxiter=1000, preconditioner=None, recycle=None):
+    """
+    Solve A x = b with the restarted GMRES method, where A is only given by matvec(x) = A.dot(x). With a
+    preconditioner(r) ~ A^-1 r, the system is preconditioned from the right, so that the residuals are those of
+    the original system. b may be a vector (n) or a matrix (n, m). The columns are iterated simultaneously, each
+    with its own Krylov subspace, so that matvec() and preconditioner() are called with matrices (n, m), which is
+    much faster than one column after the other.
+    With recycle (n, p), e.g. the solutions of a similar system, the initial guess is improved by the minimum
+    residual over the span of these vectors before the iteration starts (warm start, the Krylov subspaces of earlier
+    solutions are not re-used), see recycled_guess().
+    Returns x and a dictionary with the number of iterations and the relative residual for each right hand side.
+    """
+    b = np.asarray(b)
+    if recycle is not None:
+        x0 = recycled_guess(matvec, b, x0, recycle)
+    if b.ndim == 1:
+        x, info = gmres(matvec, b[:, None], None if x0 is None else np.asarray(x0)[:, None], tol, restart, maxiter,
+                        preconditioner)
+        return x[:, 0], info
+    if preconditioner is None:
+        def preconditioner(r):
+            return r
+    n, m = b.shape
+    x = np.zeros(b.shape, dtype=np.result_type(b, 'float64')) if x0 is None else np.asarray(x0)
+    r = b - matvec(x)
+    # complex, if A, b or x0 are complex
+    dtype = np.result_type(r, x, 'float64')
+    x = x.astype(dtype)
+    beta = np.linalg.norm(r, axis=0)
+    norm_b = np.linalg.norm(b, axis=0)
+    norm_b[norm_b == 0.0] = 1.0
+    iterations = np.zeros(m, dtype=int)
+    while np.any(beta > tol * norm_b) and iterations.max() < maxiter:
+        # Arnoldi process with modified Gram-Schmidt, the least squares problem is solved with Givens rotations.
+        # Converged columns are not updated, their iterations are not counted.
+        active = beta > tol * norm_b
+        V = np.zeros((restart + 1, n, m), dtype=dtype)
+        Z = np.zeros((restart, n, m), dtype=dtype)
+        H = np.zeros((restart + 1, restart, m), dtype=dtype)
+        cs = np.zeros((restart, m), dtype=dtype)
+        sn = np.zeros((restart, m), dtype=dtype)
+        g = np.zeros((restart + 1, m), dtype=dtype)
+        g[0] = beta
+        V[0] = r / np.where(active, beta, 1.0)
+        # number of steps of each column in this cycle
+        steps = np.zeros(m, dtype=int)
+        for j in range(restart):
+            Z[j] = preconditioner(V[j])
+            w = matvec(Z[j])
+            for i in range(j + 1):
+                H[i, j] = np.sum(np.conj(V[i]) * w, axis=0)
+                w = w - H[i, j] * V[i]
+            H[j + 1, j] = np.linalg.norm(w, axis=0)
+            V[j + 1] = w / np.where(H[j + 1, j] != 0.0, H[j + 1, j], 1.0)
+            for i in range(j):
+                H[i, j], H[i + 1, j] = cs[i] * H[i, j] + sn[i] * H[i + 1, j], \
+                    -np.conj(sn[i]) * H[i, j] + cs[i] * H[i + 1, j]
+            denominator = np.sqrt(np.abs(H[j, j]) ** 2.0 + np.abs(H[j + 1, j]) ** 2.0)
+            denominator[denominator == 0.0] = 1.0
+            phase = np.where(H[j, j] != 0.0, H[j, j] / np.where(H[j, j] != 0.0, np.abs(H[j, j]), 1.0), 1.0)
+            cs[j] = np.abs(H[j, j]) / denominator
+            sn[j] = phase * np.conj(H[j + 1, j]) / denominator
+            H[j, j] = cs[j] * H[j, j] + sn[j] * H[j + 1, j]
+            H[j + 1, j] = 0.0
+            g[j + 1] = -np.conj(sn[j]) * g[j]
+            g[j] = cs[j] * g[j]
+            steps += active
+            iterations += active
+            active &= np.abs(g[j + 1]) > tol * norm_b
+            if not active.any() or iterations.max() >= maxiter:
+                break
+        for i in np.nonzero(steps)[0]:
+            y = np.linalg.solve(np.triu(H[:steps[i], :steps[i], i]), g[:steps[i], i])
+            x[:, i] += y.dot(Z[:steps[i], :, i])
+        r = b - matvec(x)
+        beta = np.linalg.norm(r, axis=0)
+    if np.any(beta > tol * norm_b):
+        logging.warning('GMRES did not converge within {} iterations, the relative residual is {}.'.format(
+            iterations.max(), np.max(beta / norm_b)))
+    return x, {'iterations': iterations.tolist(), 'residuals': (beta / norm_b).tolist()}
+
+
+def recycled_guess(matvec, b, x0, recycle):
+    # Minimize the residual b - A (x0 + U y) over y for the subspace U = recycle (n, p), for all columns of b at
+    # once. This costs p products with A (matvec must accept a matrix) and a small least squares problem.
+    U = np.asarray(recycle)
+    r = b if x0 is None else b - matvec(x0)
+    y = np.linalg.lstsq(matvec(U), r, rcond=None)[0]
+    return U.dot(y) if x0 is None else x0 + U.dot(y)
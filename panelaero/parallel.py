@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Distribute the points of an AIC sweep (e.g. the Ma x k grid of DLM.calc_Qjjs) to a pool of worker processes.
+The aerogrid and the output arrays are placed in shared memory, so that neither the aerogrid nor the resulting
+matrices are pickled for every task. Each worker writes its results directly into the shared output arrays, which are
+memory mapped files: either the caller's numpy.memmap or a temporary file in SHARED_DIRECTORY.
+Within one process, the blocks of rows of one AIC matrix can be assembled on a pool of threads, see run_threads().
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextvars
+import multiprocessing
+from multiprocessing import shared_memory
+import mmap
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from panelaero import grid
+
+# State of a worker process, filled by init_worker()
+WORKER_STATE = {}
+
+# Directory of the temporary output files, in memory (tmpfs) where available
+SHARED_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def create_shared_memory(nbytes):
+    return shared_memory.SharedMemory(create=True, size=max(1, int(nbytes)))
+
+
+def attach_shared_memory(name):
+    # Attach to an existing block of shared memory. The block is owned (and unlinked) by the parent process.
+    # Worker processes share the resource tracker of the parent process, so registering the same block again
+    # (in Python < 3.13) has no effect.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def share_aerogrid(aerogrid):
+    # Copy the relevant arrays of the aerogrid into one block of shared memory.
+    arrays = [np.asarray(aerogrid[key], dtype=float) for key in grid.PANEL_KEYS]
+    shm = create_shared_memory(sum(array.nbytes for array in arrays))
+    layout = []
+    offset = 0
+    for key, array in zip(grid.PANEL_KEYS, arrays):
+        np.ndarray(array.shape, dtype=float, buffer=shm.buf, offset=offset)[...] = array
+        layout.append((key, array.shape, offset))
+        offset += array.nbytes
+    return shm, {'name': shm.name, 'layout': layout, 'n': aerogrid['n']}
+
+
+def attach_aerogrid(description):
+    shm = attach_shared_memory(description['name'])
+    aerogrid = {'n': description['n']}
+    for key, shape, offset in description['layout']:
+        aerogrid[key] = np.ndarray(shape, dtype=float, buffer=shm.buf, offset=offset)
+    return shm, aerogrid
+
+
+def create_output(shape, dtype, out=None):
+    # The output array of run() and its description for the workers: the caller's out if it is a writable
+    # numpy.memmap of a whole file region (not a view), otherwise a temporary file in SHARED_DIRECTORY.
+    if isinstance(out, np.memmap) and isinstance(out.base, mmap.mmap) and out.mode in ['r+', 'w+'] \
+            and out.shape == tuple(shape) and out.dtype == np.dtype(dtype) and out.flags.c_contiguous:
+        return out, (out.filename, out.offset, out.shape, out.dtype.str)
+    fid, filename = tempfile.mkstemp(suffix='.bin', dir=SHARED_DIRECTORY)
+    os.close(fid)
+    output = np.memmap(filename, dtype=dtype, mode='w+', shape=tuple(shape))
+    return output, (filename, 0, output.shape, output.dtype.str)
+
+
+def init_worker(aerogrid_description, output_descriptions, parameters):
+    shm, aerogrid = attach_aerogrid(aerogrid_description)
+    WORKER_STATE['shared_memory'] = [shm]
+    WORKER_STATE['aerogrid'] = aerogrid
+    WORKER_STATE['outputs'] = [np.memmap(filename, dtype=dtype, mode='r+', offset=offset, shape=shape)
+                               for filename, offset, shape, dtype in output_descriptions]
+    WORKER_STATE['parameters'] = parameters
+    # Space for results a worker wants to re-use in subsequent tasks, e.g. the geometry.
+    WORKER_STATE['cache'] = {}
+
+
+def run_task(task, item):
+    task(WORKER_STATE, item)
+
+
+def run(task, items, aerogrid, outputs, n_workers, parameters):
+    """
+    Call task(state, item) for all items on a pool of n_workers processes. The state is a dictionary with
+    the aerogrid, the shared output arrays (in the order and with the shapes and dtypes given by outputs),
+    the parameters and a cache for each worker. The task function needs to be importable (defined at module
+    level) and writes its results into the output arrays.
+    outputs = list of (shape, dtype, out), out is an optional caller-supplied target: a numpy.memmap is written by
+              the workers directly, otherwise the results are written to a temporary memory mapped file
+    The output arrays are returned without copies: the caller's numpy.memmap or an array mapped to the (deleted)
+    temporary file. Other targets are not written, see VLM.write_results().
+    """
+    shm_aerogrid, aerogrid_description = share_aerogrid(aerogrid)
+    arrays = []
+    temporary_files = []
+    try:
+        output_descriptions = []
+        for shape, dtype, out in outputs:
+            array, description = create_output(shape, dtype, out)
+            arrays.append(array)
+            output_descriptions.append(description)
+            if array is not out:
+                temporary_files.append(description[0])
+        # The workers are started as new processes, forking a process which already runs threads (e.g. the thread
+        # pool of the compiled DLM backend) may deadlock.
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker,
+                                 initargs=(aerogrid_description, output_descriptions, parameters)) as executor:
+            # Iterate over the results to raise any exceptions of the workers.
+            for _ in executor.map(run_task, [task] * len(items), items):
+                pass
+        if os.name == 'nt':
+            # Open files can not be deleted on Windows, the temporary results are copied into memory.
+            arrays = [np.array(array) if array is not out else array for array, (_, _, out) in zip(arrays, outputs)]
+        # The temporary files remain mapped after they are deleted, plain arrays are returned.
+        outputs = [np.asarray(array) if array is not out else array for array, (_, _, out) in zip(arrays, outputs)]
+    finally:
+        shm_aerogrid.close()
+        shm_aerogrid.unlink()
+        del arrays
+        for filename in temporary_files:
+            os.unlink(filename)
+    return outputs
+
+
+def run_threads(task, items, n_threads=None):
+    """
+    Call task(item) for all items on a pool of n_threads threads, or one after the other if n_threads is None or 1.
+    This is used for the assembly of an AIC matrix in blocks of rows, where each task writes into its own slice of
+    the preallocated output. NumPy releases the GIL during the element-wise operations, so the threads run
+    concurrently. The tasks are run in a copy of the caller's context, e.g. with the same numpy error state.
+    """
+    if n_threads is None or n_threads <= 1:
+        for item in items:
+            task(item)
+        return
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        # Iterate over the results to raise any exceptions of the threads.
+        for _ in executor.map(lambda item: context.copy().run(task, item), items):
+            pass
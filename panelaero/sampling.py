@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adaptive sampling of the AIC matrices over Mach numbers and reduced frequencies, see calc_Qjjs_adaptive().
+Starting from a coarse set of reduced frequencies, each interval is bisected and the new sample is compared to the
+interpolation from the other samples. The interval is refined further only if the difference (the error estimate of
+the interpolation) exceeds the tolerance. The Mach numbers are refined in the same way, each Mach number with its own
+set of reduced frequencies. The interpolation uses local cubic Lagrange polynomials, first along the reduced
+frequencies, then along the Mach numbers, see Interpolator.
+"""
+import logging
+
+import numpy as np
+
+from panelaero import DLM, VLM
+
+# Maximum number of bisections of an initial interval
+MAX_REFINEMENTS = 6
+# Number of samples of the local interpolation polynomials (cubic)
+N_INTERPOLATION = 4
+
+
+class Interpolator():
+    """
+    The sampled database (Ma, k and values, with one set of reduced frequencies k[i] and values[i] per Mach number
+    Ma[i]) and the interpolation of the values at any Mach number and reduced frequency, interpolator(Ma, k).
+    """
+
+    def __init__(self, Ma, k, values):
+        self.Ma = np.asarray(Ma)
+        self.k = [np.asarray(k_i) for k_i in k]
+        self.values = [list(values_i) for values_i in values]
+
+    @property
+    def n_samples(self):
+        return sum(k_i.size for k_i in self.k)
+
+    def __call__(self, Ma, k):
+        if not (self.Ma[0] <= Ma <= self.Ma[-1] and self.k[0][0] <= k <= self.k[0][-1]):
+            logging.warning('Ma = {}, k = {} is outside of the sampled range, the values are extrapolated.'.format(
+                Ma, k))
+        return interpolate(self.Ma, [interpolate(k_i, values_i, k) for k_i, values_i in zip(self.k, self.values)],
+                           Ma)
+
+
+def calc_Qjjs_adaptive(aerogrid, Ma, k, tolerance=1e-3, quantity=None, xz_symmetry=False, method='parabolic',
+                       dtype='float64', max_refinements=MAX_REFINEMENTS, atol=0.0):
+    """
+    Adaptive sampling of Qjj = DLM.calc_Qjj() with error controlled interpolation, returns an Interpolator.
+    Ma, k = the initial (coarse) Mach numbers and reduced frequencies, which define the range of the sampling. With
+            only one Mach number, only the reduced frequencies are sampled.
+    tolerance = maximal relative error of the interpolation between the samples, estimated from the difference of
+                each new sample to the interpolation from the previous samples (maximum norm, relative to the maximum
+                of the sample)
+    quantity = optional function of Qjj, e.g. the projection Qhh = Phi.T.dot(Aj).dot(Qjj).dot(Phi), which is
+               sampled and interpolated instead of Qjj
+    max_refinements = maximal number of bisections of the initial intervals
+    atol = optional absolute tolerance, the interpolation is also accepted if the difference is below atol, e.g. for
+           samples which are (close to) zero
+    """
+    n_evaluations = [0]
+    # The geometry is calculated only once, the steady contributions only once per Mach number, the samples of the
+    # reduced frequencies are evaluated Mach number by Mach number (see DLM.calc_Qjjs_task()).
+    geometry_VLM = VLM.calc_geometry(aerogrid, xz_symmetry, dtype)
+    geometry_DLM = DLM.calc_geometry(aerogrid, method, xz_symmetry, dtype)
+    cache = {}
+    # the error relative to max(max|sample|, atol / tolerance) is below the tolerance if the difference is below
+    # max(tolerance * max|sample|, atol)
+    floor = atol / tolerance if tolerance > 0.0 else 0.0
+
+    def evaluate(Ma_i, k_i):
+        n_evaluations[0] += 1
+        if cache.get('Ma') != Ma_i:
+            cache['Ajj_VLM'], _ = VLM.calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, geometry=geometry_VLM,
+                                               xz_symmetry=xz_symmetry, dtype=dtype)
+            cache['Ma'] = Ma_i
+        if k_i == 0.0:
+            # no oscillatory / unsteady contributions at k=0.0
+            Ajj = cache['Ajj_VLM']
+        else:
+            Ajj = cache['Ajj_VLM'] + DLM.calc_Ajj(aerogrid=aerogrid, Ma=Ma_i, k=k_i, method=method,
+                                                  geometry=geometry_DLM, xz_symmetry=xz_symmetry, dtype=dtype)
+        Qjj = DLM.solve_Qjj(Ajj)
+        return Qjj if quantity is None else quantity(Qjj)
+
+    def sample_k(Ma_i):
+        return refine(lambda k_i: evaluate(Ma_i, k_i), k,
+                      lambda k, values, i: error_k(k, values, i, floor), tolerance, max_refinements)
+
+    Ma_samples, k_samples = refine(sample_k, Ma, lambda Ma, samples, i: error_Ma(Ma, samples, i, floor), tolerance,
+                                   max_refinements)
+    interpolator = Interpolator(Ma_samples, [k_i for k_i, _ in k_samples], [values_i for _, values_i in k_samples])
+    logging.info('Adaptive sampling with {} evaluations of Qjj at {} Mach numbers.'.format(
+        n_evaluations[0], len(Ma_samples)))
+    return interpolator
+
+
+def refine(evaluate, x, error, tolerance, max_refinements):
+    # Bisection of the intervals of the sorted samples x, until error(x, values, i) of the new sample i is less than
+    # the tolerance. Returns the samples and the values.
+    x = sorted(x)
+    values = [evaluate(x_i) for x_i in x]
+    intervals = [(x_a, x_b, 0) for x_a, x_b in zip(x[:-1], x[1:])]
+    while intervals:
+        x_a, x_b, level = intervals.pop()
+        x_new = 0.5 * (x_a + x_b)
+        i = np.searchsorted(x, x_new)
+        x.insert(i, x_new)
+        values.insert(i, evaluate(x_new))
+        if error(x, values, i) > tolerance:
+            if level + 1 < max_refinements:
+                intervals += [(x_a, x_new, level + 1), (x_new, x_b, level + 1)]
+            else:
+                logging.warning('Tolerance not reached between {} and {} after {} refinements.'.format(
+                    x_a, x_b, max_refinements))
+    return x, values
+
+
+def error_k(k, values, i, floor=0.0):
+    # Relative difference of the sample i to the interpolation from the other samples
+    others = [j for j in range(len(k)) if j != i]
+    estimate = interpolate([k[j] for j in others], [values[j] for j in others], k[i])
+    return relative_error(values[i], estimate, floor)
+
+
+def error_Ma(Ma, samples, i, floor=0.0):
+    # Same as error_k() for the Mach numbers, compared at the reduced frequencies of the sample i.
+    k_i, values_i = samples[i]
+    others = [j for j in range(len(Ma)) if j != i]
+    estimate = Interpolator([Ma[j] for j in others], [samples[j][0] for j in others], [samples[j][1] for j in others])
+    return max(relative_error(value, estimate(Ma[i], k_ij), floor) for k_ij, value in zip(k_i, values_i))
+
+
+def relative_error(value, estimate, floor=0.0):
+    # Maximum difference relative to the maximum of the value, but at least to the floor, which avoids the division
+    # by zero for vanishing values: zero if the estimate matches, infinite otherwise (without a floor).
+    difference = np.abs(value - estimate).max()
+    scale = max(np.abs(value).max(), floor)
+    if scale == 0.0:
+        return 0.0 if difference == 0.0 else np.inf
+    return difference / scale
+
+
+def interpolate(x, values, x_new):
+    # Local Lagrange interpolation with the N_INTERPOLATION samples next to x_new
+    x = np.asarray(x)
+    n = min(N_INTERPOLATION, x.size)
+    first = min(max(np.searchsorted(x, x_new) - n // 2, 0), x.size - n)
+    nodes = x[first:first + n]
+    result = 0.0
+    for j in range(n):
+        others = np.delete(nodes, j)
+        result = result + np.prod((x_new - others) / (nodes[j] - others)) * values[first + j]
+    return result
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matrix-free steady VLM for large aerogrids, see solve_Gamma(). Instead of the dense n x n matrices of
+VLM.calc_Gamma(), the induced velocities are evaluated with a treecode:
+The receiving points and the sending panels are sorted into trees of boxes. Close pairs of boxes (near field) are
+evaluated exactly with the formulas of Katz & Plotkin in VLM.calc_induced_velocities_block(). For well separated
+pairs (far field), the velocities induced by the sending panels are evaluated exactly at a few Chebyshev points of
+the receiving box and interpolated to the receiving points (cluster-particle treecode with barycentric Lagrange
+interpolation, see Wang, Tlupova and Krasny 2020). The trailing vortex lines of the horseshoes extend to infinity in
+x direction, therefore the boxes of the sending panels are extended to infinity in x direction for the separation.
+The interpolation error is controlled by the degree of the interpolation, which is selected from the tolerance.
+The circulation is found with GMRES (linalg.gmres) and a block Jacobi preconditioner from the near field.
+"""
+import logging
+
+import numpy as np
+
+from panelaero import VLM, linalg
+
+# A box of receiving points and a box of sending panels are well separated if the diameter of the receiving box is
+# less than THETA times the distance between the boxes.
+THETA = 1.0
+# Maximum number of points / panels in the leaves of the trees
+LEAF_SIZE = 32
+# Limits of the degree of the interpolation polynomials
+MIN_DEGREE = 2
+MAX_DEGREE = 12
+
+
+def solve_Gamma(aerogrid, Ma, wj, xz_symmetry=False, tolerance=1e-6, operator=None):
+    """
+    Matrix-free counterpart of VLM.calc_Gamma() for large aerogrids. Instead of the matrices Gamma and Q_ind, the
+    circulation Gamma_j = Gamma.dot(wj) for the downwash wj (vector (n) or matrix (n, m), one downwash per column)
+    and the velocities Q_ind.dot(Gamma_j) induced by the trailing vortex lines are returned, plus a dictionary
+    with the number of GMRES iterations and the relative residuals.
+    tolerance = relative tolerance of the far field interpolation and of the GMRES solution
+    operator = optional, the result of calc_operator() for the same Ma and xz_symmetry, e.g. to solve for more
+               downwash vectors
+    """
+    if operator is None:
+        operator = calc_operator(aerogrid, Ma, xz_symmetry, tolerance)
+    Gamma_j, info = linalg.gmres(lambda x: matvec(operator, x), -np.asarray(wj, dtype=float), tol=tolerance,
+                                 preconditioner=lambda r: precondition(operator, r))
+    logging.info('Treecode VLM solution with {} GMRES iterations.'.format(info['iterations']))
+    return Gamma_j, matvec(operator, Gamma_j, part='Q_ind'), info
+
+
+def calc_operator(aerogrid, Ma, xz_symmetry=False, tolerance=1e-6, theta=THETA, leaf_size=LEAF_SIZE):
+    # Set up the near field blocks, the far field interpolation and the preconditioner for the Mach number Ma.
+    # The memory is approximately proportional to n log(n) instead of n**2.
+    P0, P1, P3 = VLM.scale_points(aerogrid, Ma)
+    N = np.asarray(aerogrid['N'], dtype=float)
+    n = aerogrid['n']
+    sign = VLM.symmetry_sign(xz_symmetry)
+    if sign is not None:
+        # the mirrored sending panels follow the panels of the aerogrid, see matvec()
+        P1_mirror, P3_mirror = VLM.mirror_points(P1, P3)
+        P1 = np.vstack((P1, P1_mirror))
+        P3 = np.vstack((P3, P3_mirror))
+    degree = interpolation_degree(tolerance, theta)
+    targets = build_tree(P0, P0, P0, leaf_size)
+    sources = build_tree(0.5 * (P1 + P3), np.minimum(P1, P3), np.maximum(P1, P3), leaf_size)
+    near, far = interaction_lists(targets, sources, theta, degree)
+
+    operator = {'n': n, 'sign': sign, 'near': [], 'far': {}, 'preconditioner': []}
+    for T, S in near:
+        D1, D2, D3 = VLM.calc_induced_velocities_block(P0[T['index']], P1[S['index']], P3[S['index']], N[T['index']])
+        operator['near'].append((T['index'], S['index'], D1 + D2 + D3, D2 + D3))
+    for T, S in far:
+        if id(T) not in operator['far']:
+            proxies, L = interpolation(T, P0[T['index']], degree)
+            # The velocities in z and y direction are evaluated at the proxy points, the normal velocity at the
+            # receiving points follows after the interpolation.
+            operator['far'][id(T)] = {'targets': T['index'], 'L': L, 'N': N[T['index']], 'blocks': [],
+                                      'proxies': np.vstack((proxies, proxies)),
+                                      'directions': np.repeat(np.eye(3)[[2, 1]], proxies.shape[0], axis=0)}
+        far_T = operator['far'][id(T)]
+        # Proxy points on the extension of a bound vortex line are handled like in the near field (zero velocity).
+        with np.errstate(divide='ignore', invalid='ignore'):
+            D1, D2, D3 = VLM.calc_induced_velocities_block(far_T['proxies'], P1[S['index']], P3[S['index']],
+                                                           far_T['directions'])
+        far_T['blocks'].append((S['index'], D1 + D2 + D3, D2 + D3))
+
+    # Block Jacobi preconditioner, the inverted influence of the panels of each leaf onto themselves
+    for T in leaves(targets):
+        index = T['index']
+        D1, D2, D3 = VLM.calc_induced_velocities_xz_symmetry_block(P0[index], P1[index], P3[index], N[index],
+                                                                   sign=sign)
+        operator['preconditioner'].append((index, np.linalg.inv(D1 + D2 + D3)))
+
+    n_stored = sum(D.size for _, _, D, _ in operator['near']) \
+        + sum(D.size for far_T in operator['far'].values() for _, D, _ in far_T['blocks'])
+    logging.info('Treecode VLM with interpolation degree {}: {} near and {} far field blocks, {:.1%} of the dense '
+                 'matrix.'.format(degree, len(near), len(far), n_stored / (n * P1.shape[0])))
+    return operator
+
+
+def matvec(operator, Gamma, part='D'):
+    # The product D.dot(Gamma) or, with part='Q_ind', the product Q_ind.dot(Gamma) of the induced velocities due
+    # to the trailing vortex lines, see VLM.calc_induced_velocities_sums() and VLM.calc_Gamma().
+    i = 0 if part == 'D' else 1
+    if operator['sign'] is not None:
+        Gamma = np.concatenate((Gamma, operator['sign'] * Gamma))
+    w = np.zeros((operator['n'],) + Gamma.shape[1:])
+    for targets, sources, *D in operator['near']:
+        w[targets] += D[i].dot(Gamma[sources])
+    for far_T in operator['far'].values():
+        # sum of the velocities at the proxy points, interpolated to the receiving points
+        w_proxies = sum(D[i].dot(Gamma[sources]) for sources, *D in far_T['blocks'])
+        n_proxies = far_T['L'].shape[1]
+        normal = far_T['N'].reshape(far_T['N'].shape + (1,) * (Gamma.ndim - 1))
+        w[far_T['targets']] += normal[:, 2] * far_T['L'].dot(w_proxies[:n_proxies]) \
+            + normal[:, 1] * far_T['L'].dot(w_proxies[n_proxies:])
+    return w
+
+
+def precondition(operator, r):
+    x = np.empty_like(r)
+    for index, inverse in operator['preconditioner']:
+        x[index] = inverse.dot(r[index])
+    return x
+
+
+def interpolation_degree(tolerance, theta=THETA):
+    # The error bound of the interpolation decreases with (theta/2)**degree, but the observed error of the induced
+    # velocities is much smaller (about (theta/4)**degree for wings), which is used here.
+    degree = int(np.ceil(np.log(tolerance) / np.log(0.25 * theta)))
+    return min(max(degree, MIN_DEGREE), MAX_DEGREE)
+
+
+def build_tree(centers, lo, hi, leaf_size, index=None):
+    # Binary tree of boxes, each box is split at the median of the centers along its longest side.
+    # lo, hi = lower and upper bounds of the items, e.g. the corner points of the panels
+    if index is None:
+        index = np.arange(centers.shape[0])
+    node = {'index': index, 'lo': lo[index].min(axis=0), 'hi': hi[index].max(axis=0), 'children': []}
+    if index.size > leaf_size:
+        extent = centers[index].max(axis=0) - centers[index].min(axis=0)
+        order = np.argsort(centers[index, np.argmax(extent)], kind='stable')
+        half = index.size // 2
+        node['children'] = [build_tree(centers, lo, hi, leaf_size, index[order[:half]]),
+                            build_tree(centers, lo, hi, leaf_size, index[order[half:]])]
+    return node
+
+
+def leaves(node):
+    if not node['children']:
+        return [node]
+    return [leaf for child in node['children'] for leaf in leaves(child)]
+
+
+def diameter(node):
+    return np.linalg.norm(node['hi'] - node['lo'])
+
+
+def interaction_lists(targets, sources, theta, degree):
+    # Pairs of boxes of the near field and of the far field. A pair is only evaluated via the far field if the
+    # receiving box has more points than the interpolation, otherwise the direct evaluation is cheaper.
+    near = []
+    far = []
+    stack = [(targets, sources)]
+    while stack:
+        T, S = stack.pop()
+        if well_separated(T, S, theta):
+            if T['index'].size > 2 * n_proxies(T, degree):
+                far.append((T, S))
+            else:
+                near.append((T, S))
+        elif not T['children'] and not S['children']:
+            near.append((T, S))
+        elif not S['children'] or (T['children'] and diameter(T) >= diameter(S)):
+            stack += [(child, S) for child in T['children']]
+        else:
+            stack += [(T, child) for child in S['children']]
+    return near, far
+
+
+def well_separated(T, S, theta):
+    # The box of the sending panels is extended to infinity in x direction because of the trailing vortex lines.
+    hi = np.array([np.inf, S['hi'][1], S['hi'][2]])
+    gap = np.maximum(0.0, np.maximum(S['lo'] - T['hi'], T['lo'] - hi))
+    return diameter(T) < theta * np.linalg.norm(gap)
+
+
+def degrees(node, degree):
+    # The degree of the interpolation in x, y and z direction, reduced for thin boxes, e.g. no interpolation in
+    # z direction for a planar wing.
+    extent = node['hi'] - node['lo']
+    return [int(np.ceil(degree * e / extent.max())) if e > 1e-9 * extent.max() else 0 for e in extent]
+
+
+def n_proxies(node, degree):
+    return int(np.prod([d + 1 for d in degrees(node, degree)]))
+
+
+def interpolation(node, points, degree):
+    # Chebyshev points of the second kind in the box (proxy points) and the Lagrange polynomials evaluated at the
+    # points (dim: points x proxies), using the barycentric formula, Berrut and Trefethen 2004.
+    nodes_1d = []
+    basis_1d = []
+    for i, d in enumerate(degrees(node, degree)):
+        center = 0.5 * (node['lo'][i] + node['hi'][i])
+        if d == 0:
+            nodes_1d.append(np.array([center]))
+            basis_1d.append(np.ones((points.shape[0], 1)))
+            continue
+        nodes = center + 0.5 * (node['hi'][i] - node['lo'][i]) * np.cos(np.pi * np.arange(d + 1) / d)
+        weights = (-1.0) ** np.arange(d + 1)
+        weights[[0, -1]] *= 0.5
+        difference = points[:, i, None] - nodes
+        exact = difference == 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = weights / difference
+            basis = terms / terms.sum(axis=1, keepdims=True)
+        # points which coincide with a Chebyshev point
+        rows = exact.any(axis=1)
+        basis[rows] = exact[rows]
+        nodes_1d.append(nodes)
+        basis_1d.append(basis)
+    proxies = np.stack([grid.ravel() for grid in np.meshgrid(*nodes_1d, indexing='ij')], axis=1)
+    L = np.einsum('pi,pj,pk->pijk', *basis_1d).reshape(points.shape[0], -1)
+    return proxies, L
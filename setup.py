@@ -17,9 +17,12 @@ def my_setup():
           author_email='arne.voss@dlr.de',
           license='BSD 3-Clause License',
           packages=find_packages(),
-          python_requires='>=3.7',
+          python_requires='>=3.8',
           install_requires=['numpy'],
-          extras_require={'test': ['pytest',
+          extras_require={'performance': ['scipy',
+                                          'numba',
+                                          ],
+                          'test': ['pytest',
                                    'pytest-cov',
                                    ],
                           'tutorials': ['jupyter',
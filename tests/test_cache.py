@@ -0,0 +1,67 @@
+import glob
+import os
+import pickle
+
+import numpy as np
+
+from panelaero import VLM, DLM, jit
+from panelaero.cache import AICCache
+
+
+class TestCache():
+    # Load geometry
+    with open('./tests/reference_data/simplewing_aerogrid.pickle', 'rb') as fid:
+        aerogrid = pickle.load(fid)
+
+    def test_round_trip(self, tmp_path):
+        cache = AICCache(str(tmp_path))
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2], cache=cache)
+        assert len(glob.glob(os.path.join(str(tmp_path), '*.npz'))) == 1
+        # The second call reads the result from the cache
+        Qjjs_cached = DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2], cache=cache)
+        assert np.array_equal(Qjjs, Qjjs_cached), "Cached AIC does NOT match AIC"
+        Qjj, Bjj = VLM.calc_Qjjs(self.aerogrid, Ma=[0.3], cache=cache)
+        Qjj_cached, Bjj_cached = VLM.calc_Qjjs(self.aerogrid, Ma=[0.3], cache=cache)
+        assert np.array_equal(Qjj, Qjj_cached) and np.array_equal(Bjj, Bjj_cached), "Cached AIC does NOT match AIC"
+        # No temporary files are left behind
+        assert glob.glob(os.path.join(str(tmp_path), '*.tmp')) == []
+
+    def test_keys(self, tmp_path):
+        cache = AICCache(str(tmp_path))
+        key = cache.key('DLM.calc_Qjjs', self.aerogrid, Ma=[0.3], k=[0.2], xz_symmetry=None, method='parabolic')
+        assert key == cache.key('DLM.calc_Qjjs', self.aerogrid, Ma=np.array([0.3]), k=(0.2,), xz_symmetry=None,
+                                method='parabolic')
+        assert key != cache.key('DLM.calc_Qjjs', self.aerogrid, Ma=[0.3], k=[0.2], xz_symmetry=None, method='quartic')
+        assert key != cache.key('DLM.calc_Qjjs', self.aerogrid, Ma=[0.3], k=[0.3], xz_symmetry=None, method='parabolic')
+        aerogrid = dict(self.aerogrid, A=self.aerogrid['A'] * 2.0)
+        assert key != cache.key('DLM.calc_Qjjs', aerogrid, Ma=[0.3], k=[0.2], xz_symmetry=None, method='parabolic')
+        # The results of the numpy and the Numba backend are stored separately (without Numba, the numpy backend
+        # is used for both)
+        DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2], cache=cache)
+        DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2], cache=cache, backend='numba')
+        assert len(glob.glob(os.path.join(str(tmp_path), '*.npz'))) == (2 if jit.numba is not None else 1)
+
+    def test_eviction(self, tmp_path):
+        # The size limit allows only two entries, the least recently used entry is removed.
+        cache = AICCache(str(tmp_path), max_size=2.5 * 8e6)
+        arrays = [np.zeros(1000000)]
+        cache.store('a', arrays)
+        cache.store('b', arrays)
+        os.utime(cache.filename('a'), (0, 0))
+        os.utime(cache.filename('b'), (1, 1))
+        assert cache.load('a') is not None
+        cache.store('c', arrays)
+        assert cache.load('b') is None
+        assert cache.load('a') is not None and cache.load('c') is not None
+
+    def test_stale_temporary_files(self, tmp_path):
+        # Temporary files of killed processes are removed after STALE_AGE, younger files are kept
+        cache = AICCache(str(tmp_path))
+        stale = os.path.join(str(tmp_path), 'stale.tmp')
+        young = os.path.join(str(tmp_path), 'young.tmp')
+        for filename in [stale, young]:
+            with open(filename, 'wb') as fid:
+                fid.write(b'0')
+        os.utime(stale, (0, 0))
+        cache.store('a', [np.zeros(10)])
+        assert not os.path.exists(stale) and os.path.exists(young)
@@ -1,6 +1,11 @@
+import importlib.util
 import pickle
+import tracemalloc
 
-from panelaero import VLM, DLM
+import numpy as np
+import pytest
+
+from panelaero import VLM, DLM, cache, caero, grid, hmatrix, linalg, parallel, sampling, treecode
 from tests.helper_functions import HelperFunctions
 
 
@@ -36,6 +41,45 @@ class TestSimplewing(HelperFunctions):
             reference_data = pickle.load(fid)
         assert self.compare_AICs(Qjjs[0][1, :, :], reference_data[0], self.aerogrid['n']), "AIC does NOT match reference"
 
+    def test_VLM_tiled_assembly(self):
+        # Calculate the AIC matrix in one go and in small blocks of receiving panels
+        Qjj, Bjj = VLM.calc_Qjj(self.aerogrid, Ma=0.3)
+        Qjj_tiled, Bjj_tiled = VLM.calc_Qjj(self.aerogrid, Ma=0.3, max_memory=1e6)
+        # The results need to be identical, not only numerically equal
+        assert np.array_equal(Qjj, Qjj_tiled), "Tiled AIC does NOT match AIC"
+        assert np.array_equal(Bjj, Bjj_tiled), "Tiled AIC does NOT match AIC"
+
+    def test_VLM_mach_sweep(self):
+        # The sweep re-uses the Mach number independent geometry, this must not change the results
+        Qjjs, Bjjs = VLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3, 0.7])
+        for i, Ma in enumerate([0.0, 0.3, 0.7]):
+            Qjj, Bjj = VLM.calc_Qjj(self.aerogrid, Ma=Ma)
+            assert np.array_equal(Qjjs[i], Qjj), "AIC of Mach sweep does NOT match AIC"
+            assert np.array_equal(Bjjs[i], Bjj), "AIC of Mach sweep does NOT match AIC"
+
+    def test_VLM_mach_sweep_reference(self):
+        # The sweep matches the reference data, Bjj bit-identical. Qjj is compared with the tolerance, the inversion
+        # (LAPACK) is not bit-identical on all platforms. With a memory budget, the results are identical and the
+        # peak memory stays within the budget plus the outputs and the dense matrices of one Mach number (Ajj, Bjj,
+        # Qjj and the workspace of the inversion).
+        Qjjs, Bjjs = VLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3])
+        for i, name in enumerate(['Ma00', 'Ma03']):
+            with open('./tests/reference_data/simplewing_VLM_{}.pickle'.format(name), 'rb') as fid:
+                reference_data = pickle.load(fid)
+            assert self.compare_AICs(Qjjs[i], reference_data[0], self.aerogrid['n']), "AIC does NOT match reference"
+            assert np.array_equal(Bjjs[i], reference_data[1]), "AIC does NOT match reference"
+        max_memory = 1e6
+        tracemalloc.start()
+        try:
+            Qjjs_budget, Bjjs_budget = VLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3], max_memory=max_memory)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert np.array_equal(Qjjs_budget, Qjjs) and np.array_equal(Bjjs_budget, Bjjs), \
+            "AIC with memory budget does NOT match AIC"
+        n = self.aerogrid['n']
+        assert peak <= max_memory + Qjjs.nbytes + Bjjs.nbytes + 5 * n * n * 8, "Peak memory exceeds the budget"
+
     def test_DLM_Ma00_k02(self):
         # Calculate the AIC matrix
         Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.0, k=0.2)
@@ -71,3 +115,431 @@ class TestSimplewing(HelperFunctions):
         with open('./tests/reference_data/simplewing_DLM_Ma03_k02_quartic.pickle', 'rb') as fid:
             reference_data = pickle.load(fid)
         assert self.compare_AICs(Qjj, reference_data, self.aerogrid['n']), "AIC does NOT match reference"
+
+    def test_DLM_sequence_of_mach_numbers_and_frequencies(self):
+        # Calculate the AIC matrices, the geometry is re-used for all Mach numbers and frequencies
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2], method='quartic')
+        # Do the comparison
+        print('Comparing AIC with reference')
+        with open('./tests/reference_data/simplewing_DLM_Ma03_k02_quartic.pickle', 'rb') as fid:
+            reference_data = pickle.load(fid)
+        assert self.compare_AICs(Qjjs[1, 1], reference_data, self.aerogrid['n']), "AIC does NOT match reference"
+        # The steady case must be identical to the VLM
+        Qjj_VLM, _ = VLM.calc_Qjj(self.aerogrid, Ma=0.3)
+        assert self.compare_AICs(Qjjs[1, 0], Qjj_VLM, self.aerogrid['n']), "AIC does NOT match VLM"
+        # Only the relative coordinates are stored as n x n arrays, the quantities of the sending boxes per box
+        n = self.aerogrid['n']
+        geometry = DLM.calc_geometry(self.aerogrid, method='quartic')
+        assert sorted(key for key, value in geometry.items() if np.shape(value) == (n, n)) \
+            == ['gamma_sr', 'xsr', 'ybar', 'zbar']
+        assert all(np.shape(geometry[key]) == (n,) for key in ['tanLambda', 'e', 'e2', 'e3', 'e4', 'chord'])
+
+    def test_DLM_batched_frequencies(self):
+        # Evaluate several frequencies in one pass and compare with the evaluation one-by-one
+        k = [0.1, 0.2, 1.5]
+        for method in ['parabolic', 'quartic']:
+            Ajjs = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=np.array(k), method=method)
+            for i, k_i in enumerate(k):
+                Ajj = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=k_i, method=method)
+                assert self.compare_AICs(Ajjs[i], Ajj, self.aerogrid['n']), "Batched AIC does NOT match AIC"
+
+    def test_parallel_execution(self, tmp_path):
+        # Distribute the Mach numbers and frequencies to two worker processes, the results must be identical
+        Qjjs = VLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3])
+        Qjjs_parallel = VLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3], n_workers=2)
+        assert np.array_equal(Qjjs[0], Qjjs_parallel[0]), "Parallel AIC does NOT match AIC"
+        assert np.array_equal(Qjjs[1], Qjjs_parallel[1]), "Parallel AIC does NOT match AIC"
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.0, 0.2])
+        Qjjs_parallel = DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.0, 0.2], n_workers=2)
+        assert self.compare_AICs(Qjjs[0, 1], Qjjs_parallel[0, 1], self.aerogrid['n']), "Parallel AIC does NOT match AIC"
+        # The worker processes write directly into a memory mapped file supplied by the caller
+        n = self.aerogrid['n']
+        out = np.lib.format.open_memmap(str(tmp_path / 'Qjjs.npy'), mode='w+', dtype='complex', shape=(1, 2, n, n))
+        assert parallel.create_output(out.shape, out.dtype, out)[0] is out
+        assert DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.0, 0.2], n_workers=2, out=out) is out
+        assert np.array_equal(np.load(str(tmp_path / 'Qjjs.npy')), Qjjs_parallel), "Parallel AIC does NOT match AIC"
+
+    def test_threads(self):
+        # Assemble the blocks of rows on a pool of threads, the results must be identical
+        Ajj, Bjj = VLM.calc_Ajj(self.aerogrid, Ma=0.3)
+        Ajj_threads, Bjj_threads = VLM.calc_Ajj(self.aerogrid, Ma=0.3, n_threads=2)
+        assert np.array_equal(Ajj, Ajj_threads) and np.array_equal(Bjj, Bjj_threads), "Threaded AIC does NOT match AIC"
+        for backend in ['numpy', 'numba']:
+            Ajj = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=[0.2, 1.0], xz_symmetry=True, backend=backend)
+            Ajj_threads = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=[0.2, 1.0], xz_symmetry=True, backend=backend,
+                                       n_threads=2)
+            assert np.array_equal(Ajj, Ajj_threads), "Threaded AIC does NOT match AIC"
+
+    def test_factorization(self):
+        # Apply Qjj to some downwash vectors without forming Qjj and compare with the explicit AIC matrix
+        n = self.aerogrid['n']
+        wj = np.random.default_rng(0).standard_normal((n, 3))
+        Qjj, _ = VLM.calc_Qjj(self.aerogrid, Ma=0.3)
+        factorization, _ = VLM.calc_Qjj_factorization(self.aerogrid, Ma=0.3)
+        assert np.allclose(factorization.solve(wj), Qjj.dot(wj)), "Solution does NOT match AIC"
+        assert self.compare_AICs(factorization.Qjj, Qjj, n), "Factorization does NOT match AIC"
+        Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=0.2)
+        factorization = DLM.calc_Qjj_factorization(self.aerogrid, Ma=0.3, k=0.2)
+        assert np.allclose(factorization.solve(wj), Qjj.dot(wj)), "Solution does NOT match AIC"
+        cp = DLM.solve_Qjjs(self.aerogrid, Ma=[0.3], k=[0.0, 0.2], wj=wj)
+        assert np.allclose(cp[0, 1], Qjj.dot(wj)), "Solution does NOT match AIC"
+
+    def test_refinement_cost(self, monkeypatch):
+        # The iterative refinement costs O(n**2 m) per step for m right hand sides, it is only used for few right hand
+        # sides. Qjj (n right hand sides) is inverted in double precision instead, which is cheaper.
+        n = self.aerogrid['n']
+        rng = np.random.default_rng(0)
+        Ajj = rng.standard_normal((n, n)) + 1j * rng.standard_normal((n, n)) + n * np.eye(n)
+        refined = []
+        solve_Ajj_refined = linalg.Factorization.solve_Ajj_refined
+        monkeypatch.setattr(linalg.Factorization, 'solve_Ajj_refined',
+                            lambda self, rhs: refined.append(rhs.shape) or solve_Ajj_refined(self, rhs))
+        assert np.array_equal(linalg.invert(Ajj, refine=True), linalg.invert(Ajj))
+        factorization = linalg.Factorization(Ajj, refine=True)
+        assert np.array_equal(factorization.Qjj, linalg.invert(Ajj))
+        assert np.array_equal(factorization.solve(np.eye(n)), -np.linalg.solve(Ajj, np.eye(n)))
+        assert refined == [], "Refinement of all columns"
+        wj = rng.standard_normal((n, 3))
+        assert np.allclose(factorization.solve(wj), -np.linalg.solve(Ajj, wj), rtol=1e-12, atol=0.0)
+        assert refined == [(n, 3)], "No refinement of few columns"
+        # the residuals of a single precision matrix are calculated in double precision
+        factorization = linalg.Factorization(Ajj.astype('complex64'), refine=True)
+        assert factorization.Ajj.dtype == np.complex128 and factorization.dtype == np.complex64
+        assert factorization.solve(wj).dtype == np.complex128
+
+    def test_iterative_solution(self):
+        # GMRES with the re-used preconditioner and the warm start matches the direct solution of the sweep
+        wj = np.random.default_rng(0).standard_normal((self.aerogrid['n'], 3))
+        cp = DLM.solve_Qjjs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.1, 0.2], wj=wj)
+        cp_iterative, info = DLM.solve_Qjjs_iterative(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.1, 0.2], wj=wj,
+                                                      tolerance=1e-10)
+        assert np.allclose(cp_iterative, cp, rtol=1e-8, atol=1e-8 * np.abs(cp).max()), \
+            "Iterative solution does NOT match direct solution"
+        assert info['iterations'].shape == (2, 3, 3) and np.all(info['residuals'] <= 1e-10)
+        # the factorization at the first frequency is exact
+        assert np.all(info['iterations'][:, 0] <= 1)
+
+    def test_update(self):
+        # Deflect the trailing edge panels (like a control surface) and update the previous results instead of a
+        # new assembly and inversion
+        right = self.aerogrid['offset_j'][:, 1] > 0.0
+        half = VLM.select_panels(self.aerogrid, np.nonzero(right)[0])
+        for previous, xz_symmetry in [(self.aerogrid, False), (half, 'antisymmetric')]:
+            aerogrid = {key: np.array(value) for key, value in previous.items()}
+            panels = np.argsort(aerogrid['offset_j'][:, 0])[-8:]
+            aerogrid['N'][panels] = [np.sin(0.1), 0.0, np.cos(0.1)]
+            aerogrid['offset_j'][panels, 2] -= 0.001
+            wj = np.ones(aerogrid['n'])
+            Qjj, Bjj = VLM.calc_Qjj(previous, Ma=0.3, xz_symmetry=xz_symmetry)
+            Qjj_new, Bjj_new = VLM.calc_Qjj(aerogrid, Ma=0.3, xz_symmetry=xz_symmetry)
+            Qjj_update, Bjj_update = VLM.update_Qjj(aerogrid, previous, 0.3, panels, Qjj, Bjj, xz_symmetry)
+            assert np.allclose(Qjj_update, Qjj_new) and np.allclose(Bjj_update, Bjj_new), "Update does NOT match AIC"
+            factorization, Bjj = VLM.calc_Qjj_factorization(previous, Ma=0.3, xz_symmetry=xz_symmetry)
+            factorization, _ = VLM.update_Qjj_factorization(aerogrid, previous, 0.3, panels, factorization, Bjj,
+                                                            xz_symmetry)
+            assert np.allclose(factorization.solve(wj), Qjj_new.dot(wj)), "Update does NOT match AIC"
+            Qjj = DLM.calc_Qjj(previous, Ma=0.3, k=0.2, xz_symmetry=xz_symmetry)
+            Qjj_new = DLM.calc_Qjj(aerogrid, Ma=0.3, k=0.2, xz_symmetry=xz_symmetry)
+            Qjj_update = DLM.update_Qjj(aerogrid, previous, 0.3, 0.2, panels, Qjj, xz_symmetry=xz_symmetry)
+            assert np.allclose(Qjj_update, Qjj_new), "Update does NOT match AIC"
+            factorization = DLM.calc_Qjj_factorization(previous, Ma=0.3, k=0.2, xz_symmetry=xz_symmetry)
+            factorization = DLM.update_Qjj_factorization(aerogrid, previous, 0.3, 0.2, panels, factorization,
+                                                         xz_symmetry=xz_symmetry)
+            assert np.allclose(factorization.solve(wj), Qjj_new.dot(wj)), "Update does NOT match AIC"
+
+    def test_generalized_forces(self):
+        # The projection inside the sweep matches the projection of the full AIC matrices
+        n = self.aerogrid['n']
+        rng = np.random.default_rng(0)
+        left = rng.random((3, n))
+        right = rng.random((n, 4))
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2])
+        Qhhs = DLM.calc_Qhhs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2], left=left, right=right)
+        assert Qhhs.shape == (2, 2, 3, 4)
+        assert np.allclose(Qhhs, left.dot(Qjjs).dot(right).transpose(1, 2, 0, 3)), "Qhh does NOT match AIC"
+        Qhhs = DLM.calc_Qhhs(self.aerogrid, Ma=[0.3], k=[0.0, 0.2], left=left, right=lambda k: right + 1j * k * right)
+        assert np.allclose(Qhhs[0, 1], left.dot(Qjjs[1, 1]).dot(right + 0.2j * right)), "Qhh does NOT match AIC"
+
+    def test_adaptive_sampling(self):
+        # The interpolation between the adaptive samples matches the AIC matrices within the tolerance
+        wj = np.ones(self.aerogrid['n'])
+        interpolator = sampling.calc_Qjjs_adaptive(self.aerogrid, Ma=[0.3], k=[0.0, 0.5, 2.0], tolerance=1e-3,
+                                                   quantity=lambda Qjj: Qjj.dot(wj))
+        assert 3 < interpolator.n_samples < 20, "No adaptive refinement"
+        for k in interpolator.k[0]:
+            assert np.array_equal(interpolator(0.3, k), DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=k).dot(wj))
+        for k in [0.1, 0.7, 1.7]:
+            cp = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=k).dot(wj)
+            assert np.abs(interpolator(0.3, k) - cp).max() <= 1e-3 * np.abs(cp).max(), \
+                "Interpolation does NOT match AIC"
+        # Vanishing samples do not divide by zero, a difference above the absolute floor is an error
+        zeros = [np.zeros(3)] * 5
+        assert sampling.error_k([0.0, 0.5, 1.0, 1.5, 2.0], zeros, 2) == 0.0, "Error of zero samples is NOT zero"
+        values = [np.full(3, 1e-9)] * 2 + [np.zeros(3)] + [np.full(3, 1e-9)] * 2
+        assert sampling.error_k([0.0, 0.5, 1.0, 1.5, 2.0], values, 2) == np.inf
+        assert sampling.error_k([0.0, 0.5, 1.0, 1.5, 2.0], values, 2, floor=1e-3) < 1e-3
+
+    def test_aerogrid_read_only(self):
+        # The solvers neither modify nor copy the aerogrid, all arrays may be read-only
+        aerogrid = {key: np.array(value) for key, value in self.aerogrid.items()}
+        for value in aerogrid.values():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+        reference = {key: np.array(value) for key, value in aerogrid.items()}
+        VLM.calc_Qjj(aerogrid, Ma=0.3)
+        VLM.calc_Gamma(aerogrid, Ma=0.3, xz_symmetry='antisymmetric')
+        DLM.calc_Qjj(aerogrid, Ma=0.3, k=0.2, xz_symmetry='symmetric')
+        DLM.calc_Qjjs(aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2])
+        for key, value in reference.items():
+            assert np.array_equal(aerogrid[key], value), "Aerogrid was modified"
+
+    def test_aerogrid_class(self, tmp_path):
+        # The Aerogrid gives the same results as the dictionary, is immutable and can be sliced without copies
+        aerogrid = grid.Aerogrid(self.aerogrid)
+        assert aerogrid['n'] == self.aerogrid['n'] and np.array_equal(aerogrid['set_j'], self.aerogrid['set_j'])
+        with pytest.raises(AttributeError):
+            aerogrid.n = 1
+        with pytest.raises(ValueError):
+            aerogrid['offset_j'][0, 0] = 1.0
+        assert np.array_equal(VLM.calc_Qjj(aerogrid, Ma=0.3)[0], VLM.calc_Qjj(self.aerogrid, Ma=0.3)[0])
+        for backend in ['numpy', 'numba']:
+            assert np.array_equal(DLM.calc_Ajj(aerogrid, Ma=0.3, k=0.2, xz_symmetry='symmetric', backend=backend),
+                                  DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=0.2, xz_symmetry='symmetric', backend=backend))
+        component = aerogrid.select(slice(10, 50))
+        assert component['n'] == 40 and np.shares_memory(component['offset_j'], aerogrid['offset_j'])
+        assert np.array_equal(component['offset_j'], self.aerogrid['offset_j'][10:50])
+        assert np.array_equal(component['cornerpoint_panels'], self.aerogrid['cornerpoint_panels'][10:50])
+        right = self.aerogrid['offset_j'][:, 1] > 0.0
+        assert np.array_equal(DLM.calc_Qjj(aerogrid.select(right), Ma=0.3, k=0.2, xz_symmetry='antisymmetric'),
+                              DLM.calc_Qjj(VLM.select_panels(self.aerogrid, right), Ma=0.3, k=0.2,
+                                           xz_symmetry='antisymmetric'))
+        assert pickle.loads(pickle.dumps(aerogrid))['n'] == aerogrid['n']
+        aic_cache = cache.AICCache(str(tmp_path))
+        assert aic_cache.key('DLM.calc_Qjjs', aerogrid, Ma=[0.3]) == \
+            aic_cache.key('DLM.calc_Qjjs', self.aerogrid, Ma=[0.3])
+
+    def test_caero_reader(self, tmp_path):
+        # The aerogrid built from the CAERO1 card matches the aerogrid of the reference data, also with the card
+        # in large field, free field and CAERO7 format
+        aerogrid = caero.build_aerogrid('./doc/tutorials/simplewing/simplewing.CAERO1')
+        for key, value in self.aerogrid.items():
+            assert np.array_equal(aerogrid[key], value), "Aerogrid does NOT match reference"
+        large = [['6401001', '', '0', '40'], ['10', '', '', ''], ['0.0', '-0.552', '0.0', '0.1'],
+                 ['0.0', '0.552', '0.0', '1.-1']]
+        cards = {'large.bdf': ''.join((first.ljust(8) + ''.join(field.rjust(16) for field in fields) + '*\n')
+                                      for first, fields in zip(['CAERO1*', '*', '*', '*'], large)),
+                 'free.bdf': 'CAERO1,6401001,,0,40,10\n,0.0,-.552,0.0,0.1,0.0,+.552,0.0,0.1\n',
+                 'caero7.bdf': '$ ZAERO\nCAERO7   6401001   WING        0      41      11\n'
+                               '             0.0  -0.552     0.0     0.1\n'
+                               '             0.0  +0.552     0.0     0.1\n'}
+        for filename, card in cards.items():
+            (tmp_path / filename).write_text(card)
+            aerogrid = caero.build_aerogrid(str(tmp_path / filename))
+            for key in ['ID', 'offset_j', 'offset_P1', 'offset_P3', 'N', 'A', 'l', 'cornerpoint_panels']:
+                assert np.allclose(aerogrid[key], self.aerogrid[key]), "Aerogrid does NOT match reference"
+        # Nastran numbers with short exponent and double precision exponent
+        for field, value in [('1.5-3', 1.5e-3), ('-1.5+3', -1.5e3), ('1.5D+3', 1.5e3), ('-.5d-2', -0.5e-2),
+                             ('1.5D3', 1.5e3), (' 2. ', 2.0), ('', 0.0)]:
+            assert caero.to_float(field) == value, "Nastran number {} NOT converted".format(field)
+        with pytest.raises(ValueError):
+            caero.to_int('1.0')
+        # The wrapper of the tutorials keeps the former behaviour and returns the default instead of raising
+        spec = importlib.util.spec_from_file_location('build_aeromodel',
+                                                      './doc/tutorials/helper_functions/build_aeromodel.py')
+        build_aeromodel = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(build_aeromodel)
+        for field, value in [('12', 12), ('1.0', 0), ('junk', 0), ('', 0)]:
+            assert build_aeromodel.nastran_number_converter(field, 'ID') == value
+        assert build_aeromodel.nastran_number_converter('1.5-3', 'float') == 1.5e-3
+        assert build_aeromodel.nastran_number_converter('junk', 'float') is None
+
+    def test_xz_symmetry(self):
+        # The half model with symmetric / antisymmetric downwash must give the same pressure coefficients as the
+        # full model, the AIC matrices of the half model are assembled directly without mirroring the aerogrid.
+        right = self.aerogrid['offset_j'][:, 1] > 0.0
+        keys = ['offset_j', 'offset_k', 'offset_l', 'offset_P1', 'offset_P3', 'N', 'A', 'l']
+        half = {key: self.aerogrid[key][right] for key in keys}
+        half['n'] = int(np.sum(right))
+        wj = np.ones(self.aerogrid['n'])
+        wj_anti = np.sign(self.aerogrid['offset_j'][:, 1])
+        Qjj, _ = VLM.calc_Qjj(self.aerogrid, Ma=0.3)
+        Qjj_sym, _ = VLM.calc_Qjj(half, Ma=0.3, xz_symmetry='symmetric')
+        Qjj_anti, _ = VLM.calc_Qjj(half, Ma=0.3, xz_symmetry='antisymmetric')
+        assert np.allclose(Qjj_sym.dot(wj[right]), Qjj.dot(wj)[right]), "Symmetric solution does NOT match full model"
+        assert np.allclose(Qjj_anti.dot(wj_anti[right]), Qjj.dot(wj_anti)[right]), \
+            "Antisymmetric solution does NOT match full model"
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2])
+        Qjjs_sym = DLM.calc_Qjjs(half, Ma=[0.3], k=[0.2], xz_symmetry='symmetric')
+        Qjjs_anti = DLM.calc_Qjjs(half, Ma=[0.3], k=[0.2], xz_symmetry='antisymmetric')
+        assert np.allclose(Qjjs_sym[0, 0].dot(wj[right]), Qjjs[0, 0].dot(wj)[right]), \
+            "Symmetric solution does NOT match full model"
+        assert np.allclose(Qjjs_anti[0, 0].dot(wj_anti[right]), Qjjs[0, 0].dot(wj_anti)[right]), \
+            "Antisymmetric solution does NOT match full model"
+
+    def test_treecode(self):
+        # The matrix-free solution matches the dense VLM, small leaves force far field interactions
+        right = self.aerogrid['offset_j'][:, 1] > 0.0
+        keys = ['offset_j', 'offset_P1', 'offset_P3', 'N']
+        half = {key: self.aerogrid[key][right] for key in keys}
+        half['n'] = int(np.sum(right))
+        for aerogrid, xz_symmetry in [(self.aerogrid, False), (half, 'symmetric')]:
+            wj = np.stack([np.ones(aerogrid['n']), aerogrid['offset_j'][:, 0]], axis=1)
+            Gamma, Q_ind = VLM.calc_Gamma(aerogrid, Ma=0.3, xz_symmetry=xz_symmetry)
+            operator = treecode.calc_operator(aerogrid, Ma=0.3, xz_symmetry=xz_symmetry, tolerance=1e-4, leaf_size=8)
+            assert operator['far'], "No far field interactions"
+            Gamma_j, w_ind, info = treecode.solve_Gamma(aerogrid, 0.3, wj, xz_symmetry=xz_symmetry, tolerance=1e-4,
+                                                        operator=operator)
+            assert max(info['residuals']) <= 1e-4
+            assert np.allclose(Gamma_j, Gamma.dot(wj), rtol=1e-3, atol=1e-3 * np.abs(Gamma.dot(wj)).max()), \
+                "Treecode solution does NOT match VLM"
+            assert np.allclose(w_ind, Q_ind.dot(Gamma.dot(wj)), rtol=1e-3,
+                               atol=1e-3 * np.abs(Q_ind.dot(Gamma.dot(wj))).max()), \
+                "Treecode solution does NOT match VLM"
+
+    def test_hmatrix(self):
+        # The H-matrices match the AIC matrices, small leaves force low rank blocks
+        wj = np.stack([np.ones(self.aerogrid['n']), self.aerogrid['offset_j'][:, 0]], axis=1)
+        Ajj, _ = VLM.calc_Ajj(self.aerogrid, Ma=0.3)
+        Qjj, _ = VLM.calc_Qjj(self.aerogrid, Ma=0.3)
+        H = hmatrix.calc_Ajj_VLM(self.aerogrid, Ma=0.3, tolerance=1e-8, leaf_size=16)
+        assert H.lowrank and H.size < Ajj.size, "No compression"
+        assert np.allclose(H.toarray(), Ajj, rtol=1e-6, atol=1e-6 * np.abs(Ajj).max()), "H-matrix does NOT match AIC"
+        assert np.allclose(H.solve(wj), Qjj.dot(wj), rtol=1e-6, atol=1e-6 * np.abs(Qjj.dot(wj)).max()), \
+            "Solution does NOT match AIC"
+        Ajj = next(DLM.calc_Ajjs(self.aerogrid, [0.3], [0.2]))[2]
+        Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=0.2)
+        for backend in ['numpy', 'numba']:
+            H = hmatrix.calc_Ajj_DLM(self.aerogrid, Ma=0.3, k=0.2, tolerance=1e-8, leaf_size=16, backend=backend)
+            assert H.lowrank and H.size < Ajj.size, "No compression"
+            assert np.allclose(H.toarray(), Ajj, rtol=1e-6, atol=1e-6 * np.abs(Ajj).max()), \
+                "H-matrix does NOT match AIC"
+        assert np.allclose(H.solve(wj), Qjj.dot(wj), rtol=1e-6, atol=1e-6 * np.abs(Qjj.dot(wj)).max()), \
+            "Solution does NOT match AIC"
+
+    def test_generators(self):
+        # The generators yield the same matrices as the sweep functions, one after the other
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2])
+        points = [(Ma, k) for Ma in [0.0, 0.3] for k in [0.0, 0.2]]
+        for (Ma, k), (Ma_i, k_i, Qjj) in zip(points, DLM.iter_Qjjs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2])):
+            assert (Ma, k) == (Ma_i, k_i)
+            assert self.compare_AICs(Qjj, Qjjs[[0.0, 0.3].index(Ma), [0.0, 0.2].index(k)], self.aerogrid['n']), \
+                "AIC does NOT match AIC of the sweep"
+        # Without storing the geometry, the peak memory is a few matrices of one point, also with xz_symmetry
+        n = self.aerogrid['n']
+        tracemalloc.start()
+        try:
+            _, _, Qjj = next(DLM.iter_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2], xz_symmetry=True, n_threads=2))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 8 * n * n * 16, "Peak memory of the generator too high"
+        assert np.array_equal(Qjj, DLM.calc_Qjjs(self.aerogrid, Ma=[0.3], k=[0.2], xz_symmetry=True)[0, 0]), \
+            "AIC does NOT match AIC of the sweep"
+        Qjjs, Bjjs = VLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3])
+        for i, (Ma_i, Qjj, Bjj) in enumerate(VLM.iter_Qjjs(self.aerogrid, Ma=[0.0, 0.3])):
+            assert np.array_equal(Qjj, Qjjs[i]) and np.array_equal(Bjj, Bjjs[i]), "AIC does NOT match AIC of the sweep"
+
+    def test_output_to_memmap(self, tmp_path):
+        # Write the results directly into memory mapped .npy files, single matrices can be read back without
+        # loading the whole file.
+        n = self.aerogrid['n']
+        filename = str(tmp_path / 'Qjjs.npy')
+        out = np.lib.format.open_memmap(filename, mode='w+', dtype='complex', shape=(2, 2, n, n))
+        Qjjs = DLM.calc_Qjjs(self.aerogrid, Ma=[0.0, 0.3], k=[0.0, 0.2], out=out)
+        assert Qjjs is out
+        del out, Qjjs
+        Qjjs = np.load(filename, mmap_mode='r')
+        Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=0.2)
+        assert self.compare_AICs(Qjjs[1, 1], Qjj, n), "AIC does NOT match AIC"
+        out = (np.lib.format.open_memmap(str(tmp_path / 'Gamma.npy'), mode='w+', shape=(1, n, n)),
+               np.lib.format.open_memmap(str(tmp_path / 'Q_ind.npy'), mode='w+', shape=(1, n, n)))
+        VLM.calc_Gammas(self.aerogrid, Ma=[0.3], out=out)
+        Gamma, _ = VLM.calc_Gamma(self.aerogrid, Ma=0.3)
+        assert np.array_equal(np.load(str(tmp_path / 'Gamma.npy'), mmap_mode='r')[0], Gamma)
+
+    def test_output_to_memmap_peak_memory(self, tmp_path):
+        # Writing to a memmap, the peak memory (numpy arrays traced with tracemalloc, the memmap is not traced) is
+        # bounded by a few matrices of one point, independent of the number of points of the sweep
+        n = self.aerogrid['n']
+        peaks = []
+        for Ma, k in [([0.3], [0.2]), ([0.0, 0.3], [0.0, 0.2, 1.0])]:
+            out = np.lib.format.open_memmap(str(tmp_path / 'Qjjs_{}.npy'.format(len(k))), mode='w+', dtype='complex',
+                                            shape=(len(Ma), len(k), n, n))
+            tracemalloc.start()
+            try:
+                DLM.calc_Qjjs(self.aerogrid, Ma=Ma, k=k, xz_symmetry=True, out=out)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        assert peaks[0] < 8 * n * n * 16, "Peak memory too high"
+        assert peaks[1] < peaks[0] + n * n * 16 / 10, "Peak memory grows with the number of points"
+
+    def test_precision(self):
+        # Single precision assembly matches the reference to single precision, iterative refinement of a single
+        # precision factorization recovers double precision
+        with open('./tests/reference_data/simplewing_DLM_Ma03_k02.pickle', 'rb') as fid:
+            reference_data = pickle.load(fid)
+        Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=0.2, dtype='float32')
+        assert Qjj.dtype == np.complex64
+        assert np.allclose(Qjj, reference_data, rtol=1e-4, atol=1e-4), "AIC does NOT match reference"
+        Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=0.2, refine=True)
+        assert Qjj.dtype == np.complex128
+        assert self.compare_AICs(Qjj, reference_data, self.aerogrid['n']), "AIC does NOT match reference"
+        with open('./tests/reference_data/simplewing_VLM_Ma03.pickle', 'rb') as fid:
+            reference_data = pickle.load(fid)
+        Qjj, Bjj = VLM.calc_Qjj(self.aerogrid, Ma=0.3, dtype='float32')
+        assert Qjj.dtype == np.float32 and Bjj.dtype == np.float32
+        assert np.allclose(Qjj, reference_data[0], rtol=1e-4, atol=1e-4), "AIC does NOT match reference"
+        Qjj, _ = VLM.calc_Qjj(self.aerogrid, Ma=0.3, refine=True)
+        assert self.compare_AICs(Qjj, reference_data[0], self.aerogrid['n']), "AIC does NOT match reference"
+        Gamma, Q_ind = VLM.calc_Gamma(self.aerogrid, Ma=0.3)
+        Gammas, Q_inds = VLM.calc_Gammas(self.aerogrid, Ma=[0.3], dtype='float32')
+        assert Gammas.dtype == np.float32 and Q_inds.dtype == np.float32
+        assert np.allclose(Gammas[0], Gamma, rtol=1e-4, atol=1e-4 * np.abs(Gamma).max()) \
+            and np.allclose(Q_inds[0], Q_ind, rtol=1e-4, atol=1e-4 * np.abs(Q_ind).max()), "Gamma does NOT match"
+
+    def test_DLM_kernelfunction_offsets(self):
+        # The fused evaluation of several points along the bound vortex matches the evaluation point by point
+        geometry = DLM.calc_geometry(self.aerogrid, method='quartic')
+        args = [geometry[key] for key in ['xsr', 'ybar', 'zbar', 'gamma_sr', 'tanLambda']]
+        e = geometry['e']
+        P1, P2 = DLM.kernelfunction_offsets(*args, e, [-1.0, -0.5, 0.0], [0.2, 1.0], 0.3, method='Desmarais')
+        for i, factor in enumerate([-1.0, -0.5, 0.0]):
+            P1_i, P2_i = DLM.kernelfunction(*args, factor * e, [0.2, 1.0], 0.3, method='Desmarais')
+            assert np.allclose(P1[:, i], P1_i) and np.allclose(P2[:, i], P2_i), "Kernel does NOT match"
+
+    def test_DLM_backends(self, caplog):
+        # The numpy implementation is the default, the compiled backend is opt-in
+        assert DLM.select_backend() == 'numpy'
+        # The compiled backend matches the numpy implementation
+        pytest.importorskip('numba')
+        for method in ['parabolic', 'quartic']:
+            for k, xz_symmetry in [(0.2, False), (np.array([0.2, 1.0]), 'antisymmetric')]:
+                Ajj = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=k, method=method, xz_symmetry=xz_symmetry, backend='numba')
+                Ajj_numpy = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=k, method=method, xz_symmetry=xz_symmetry,
+                                         backend='numpy')
+                assert Ajj.shape == Ajj_numpy.shape
+                assert np.allclose(Ajj, Ajj_numpy, rtol=1e-10, atol=1e-12), "Compiled backend does NOT match numpy"
+        # The compiled backend evaluates the kernel in double precision and does not use a given geometry
+        geometry = DLM.calc_geometry(self.aerogrid, dtype='float32')
+        for kwargs in [{'dtype': 'float32'}, {'geometry': geometry}]:
+            caplog.clear()
+            Ajj = DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=0.2, backend='numba', **kwargs)
+            assert Ajj.dtype == np.complex64 and caplog.records, "No warning for the compiled backend"
+
+    def test_DLM_tabulated(self):
+        # The tabulated integrals match the Desmarais approximation within the tolerance (plus the rounding of the
+        # single precision tables), also outside of the table
+        rng = np.random.default_rng(0)
+        u1 = np.concatenate([rng.random(10000) ** 3.0 * 60.0, [0.0, 50.0, 100.0]])
+        k1 = np.concatenate([rng.random(10000) ** 2.0 * 60.0, [0.0, 50.0, 100.0]])
+        for I_tabulated, I_desmarais in zip(DLM.tabulated_approximation(u1, k1), DLM.desmarais_approximation(u1, k1)):
+            assert np.abs(I_tabulated - I_desmarais).max() <= DLM.TABULATED_TOLERANCE + 1e-6
+        # The AIC matrix matches the quartic method
+        Qjj = DLM.calc_Qjj(self.aerogrid, Ma=0.3, k=0.2, method='tabulated')
+        with open('./tests/reference_data/simplewing_DLM_Ma03_k02_quartic.pickle', 'rb') as fid:
+            reference_data = pickle.load(fid)
+        assert np.allclose(Qjj, reference_data, rtol=1e-4, atol=1e-4), "AIC does NOT match reference"
+        # The table is only implemented in numpy, the compiled backend falls back to the numpy implementation
+        assert np.array_equal(DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=0.2, method='tabulated', backend='numba'),
+                              DLM.calc_Ajj(self.aerogrid, Ma=0.3, k=0.2, method='tabulated', backend='numpy'))